@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Replay the golden-cross alerts over full price history.
+
+Backtests keep their own store of --years of history (the run cache only holds each run's
+window): the first run downloads it through the configured data source, later runs only
+download the candles after each symbol's stored tail, and --offline replays the store as is.
+
+Every bar of every symbol is classified with the live rules (technical_analysis.sma_cross_masks)
+and the should_send_notification cooldown is simulated with array operations, treating each
+bar's close as one evaluation. The result is a table of the alerts that would have fired,
+with forward returns.
+
+Usage:
+    python backtest.py --interval 4h --threshold 0.75 --cooldown 6 --csv alerts.csv
+    python backtest.py --interval 1d --years 10 --symbols AAPL MSFT --horizons 5 20
+"""
+
+import argparse
+import glob
+import logging
+import math
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from data_retrieval import INTRADAY_HISTORY_LIMIT_DAYS, get_multiple_stocks_data, is_intraday
+from ohlcv_cache import OHLCVCache
+from indicator_registry import sma_kernel
+from technical_analysis import sma_cross_masks
+
+DEFAULT_YEARS = 5
+DEFAULT_HISTORY_DIRNAME = "backtest_history"
+DEFAULT_WINDOWS = (50, 128)
+DEFAULT_HORIZONS = (6, 30)
+INVALID, NEUTRAL, NEAR, GOLDEN = -1, 0, 1, 2
+STATE_NAMES = {NEUTRAL: 'neutral', NEAR: 'near', GOLDEN: 'golden'}
+
+def cached_symbols(cache_directory, interval):
+    """
+    Symbols that have an OHLCV cache entry for an interval.
+    """
+    suffix = f"_{interval}.npy"
+    paths = glob.glob(os.path.join(cache_directory, f"*{suffix}"))
+    return sorted(os.path.basename(path)[:-len(suffix)] for path in paths)
+
+def history_window(interval, years=DEFAULT_YEARS, end=None):
+    """
+    (start, end) covering years of history, limited to how far back Yahoo serves an
+    intraday interval.
+    """
+    end = end or datetime.now()
+    start = end - timedelta(days=round(years * 365))
+    if is_intraday(interval):
+        start = max(start, end - timedelta(days=INTRADAY_HISTORY_LIMIT_DAYS[interval] - 1))
+    return start, end
+
+def load_history(symbols, interval, history_directory, years=DEFAULT_YEARS, batch_size=None, downloader=None):
+    """
+    Years of history for a backtest, kept in its own OHLCV store.
+
+    The run cache (data.cache_directory) is trimmed to each run's window, so it never holds
+    years of bars. The first call downloads the whole window through download_range; later
+    calls read the store and only download the candles after each symbol's stored tail.
+
+    Args:
+        symbols (list): Stock symbols
+        interval (str): Data interval
+        history_directory (str): Directory of the backtest's store
+        years (float): Years of history to replay
+        batch_size (int, optional): Number of symbols per bulk download
+        downloader (callable, optional): Source called like yf.download (yfinance by default)
+
+    Returns:
+        dict: Symbol -> price frame (symbols without data are skipped)
+    """
+    store = OHLCVCache(history_directory)
+    try:
+        return get_multiple_stocks_data(list(symbols), interval=interval, batch_size=batch_size,
+                                        downloader=downloader, cache=store, window=history_window(interval, years))
+    finally:
+        store.flush()
+
+def add_history_arguments(parser):
+    """
+    Command-line options choosing the history a replay runs over (shared with sweep.py).
+    """
+    parser.add_argument('--interval', help='Interval to replay (default: config interval)')
+    parser.add_argument('--symbols', nargs='+', help='Symbols to replay (default: config stocks)')
+    parser.add_argument('--years', type=float, default=DEFAULT_YEARS,
+                        help='Years of history (intraday intervals are limited to what Yahoo serves)')
+    parser.add_argument('--history-directory',
+                        help=f'Store of backtest history (default: <output directory>/{DEFAULT_HISTORY_DIRNAME})')
+    parser.add_argument('--offline', action='store_true', help='Replay the stored history without downloading')
+
+def history_from_args(args, config):
+    """
+    Load the history selected by add_history_arguments' options.
+
+    Returns:
+        tuple: (interval, dict of symbol -> price frame)
+    """
+    interval = args.interval or config.get('interval', '4h')
+    data_config = config.get('data', {})
+    history_directory = args.history_directory or os.path.join(
+        config.get('output', {}).get('directory', './output'), DEFAULT_HISTORY_DIRNAME)
+    if args.offline:
+        if not os.path.isdir(history_directory):
+            print(f"No backtest history at {history_directory}; run once without --offline first.")
+            sys.exit(1)
+        return interval, load_cached_history(history_directory, interval, args.symbols)
+
+    from data_sources import create_data_source
+    from fetch_executor import ResilientFetcher
+    symbols = args.symbols or config.get('stocks', [])
+    if not symbols:
+        print("No symbols to replay; pass --symbols or set stocks in the config.")
+        sys.exit(1)
+    downloader = ResilientFetcher.from_config(create_data_source(data_config), config.get('fetch', {}))
+    return interval, load_history(symbols, interval, history_directory, args.years,
+                                  int(data_config.get('batch_size', 50)), downloader)
+
+def load_cached_history(cache_directory, interval, symbols=None):
+    """
+    Read history from an OHLCV store without touching the network.
+
+    Args:
+        cache_directory (str): data.cache_directory
+        interval (str): Data interval
+        symbols (list, optional): Defaults to every cached symbol
+
+    Returns:
+        dict: Symbol -> price frame (symbols without a cache entry are skipped)
+    """
+    cache = OHLCVCache(cache_directory)
+    stock_data = {}
+    for symbol in symbols or cached_symbols(cache_directory, interval):
+        frame, _ = cache.load(symbol, interval)
+        if frame is not None and not frame.empty:
+            stock_data[symbol] = frame
+    return stock_data
+
+def build_history_panel(stock_data):
+    """
+    Stack close prices and bar times into right-aligned (time x symbol) arrays.
+
+    Returns:
+        tuple: (symbols, float64 closes padded with NaN, int64 UTC seconds padded with 0, timezone)
+    """
+    symbols = [symbol for symbol, frame in stock_data.items() if frame is not None and len(frame)]
+    length = max((len(stock_data[symbol]) for symbol in symbols), default=0)
+    closes = np.full((length, len(symbols)), np.nan)
+    seconds = np.zeros((length, len(symbols)), dtype=np.int64)
+    tz = None
+    for column, symbol in enumerate(symbols):
+        frame = stock_data[symbol]
+        index = pd.DatetimeIndex(frame.index)
+        if index.tz is not None:
+            tz = tz or index.tz
+            index = index.tz_convert('UTC')
+        closes[length - len(frame):, column] = frame['Close'].to_numpy(dtype=np.float64)
+        seconds[length - len(frame):, column] = index.asi8 // 1_000_000_000
+    return symbols, closes, seconds, tz
+
+def rolling_means(closes, windows):
+    """
+    Rolling mean of every column for each distinct window.
+
+    Uses the same kernel as add_indicators, so values match the live path exactly.
+    """
+    return sma_kernel(closes, windows)
+
+def classify_history(sma_fast, sma_slow, near_cross_threshold_pct=0.75):
+    """
+    Classify every bar of (time x symbol) SMA arrays.
+
+    Returns:
+        tuple: (int8 state codes with INVALID where a bar cannot be evaluated,
+                bool fresh-cross mask, float spread_pct)
+    """
+    prev_fast = np.vstack([np.full((1, sma_fast.shape[1]), np.nan), sma_fast[:-1]])
+    prev_slow = np.vstack([np.full((1, sma_slow.shape[1]), np.nan), sma_slow[:-1]])
+    valid, golden, near, fresh, spread_pct = sma_cross_masks(sma_fast, sma_slow, prev_fast, prev_slow,
+                                                             near_cross_threshold_pct)
+    codes = np.where(golden, GOLDEN, np.where(near, NEAR, NEUTRAL)).astype(np.int8)
+    codes[~valid] = INVALID
+    return codes, fresh & valid, spread_pct
+
+def notification_blocks(codes, fresh, seconds):
+    """
+    Order the evaluated bars symbol by symbol and split them into alert blocks.
+
+    A block starts at a symbol's first evaluated bar and wherever should_send_notification
+    sees a new state or a new fresh cross; a non-neutral block always alerts on its first
+    bar. The blocks do not depend on the cooldown, so they are shared across cooldowns.
+
+    Args:
+        codes (numpy.ndarray): (time x symbol) state codes from classify_history
+        fresh (numpy.ndarray): (time x symbol) fresh-cross mask
+        seconds (numpy.ndarray): (time x symbol) bar times in UTC seconds
+
+    Returns:
+        dict: 'flat' (positions in the symbol-major raveled panel), 'state', 'when', 'block'
+        and 'starts' (alerting block starts), one entry per evaluated bar
+    """
+    # Symbol-major order: each symbol's evaluated bars are contiguous and ascending in time
+    flat = np.flatnonzero(codes.T.ravel() >= 0)
+    symbol = flat // codes.shape[0]
+    state = codes.T.ravel()[flat]
+    is_fresh = fresh.T.ravel()[flat]
+    when = seconds.T.ravel()[flat]
+
+    reset = np.ones(flat.size, dtype=bool)
+    reset[1:] = (symbol[1:] != symbol[:-1]) | (state[1:] != state[:-1]) | (is_fresh[1:] & ~is_fresh[:-1])
+    return {
+        'flat': flat,
+        'state': state,
+        'when': when,
+        'block': np.cumsum(reset) - 1,
+        'starts': np.flatnonzero(reset & (state > NEUTRAL))
+    }
+
+def block_alerts(blocks, cooldown_hours):
+    """
+    Evaluated bars that alert for one cooldown.
+
+    Inside a block, the cooldown resends follow a "next bar at least cooldown later"
+    pointer, advanced for all blocks at once.
+
+    Returns:
+        numpy.ndarray: bool mask aligned with blocks['flat']
+    """
+    count = blocks['flat'].size
+    hits = np.zeros(count, dtype=bool)
+    frontier = blocks['starts']
+    cooldown_seconds = math.ceil(cooldown_hours * 3600) if cooldown_hours and cooldown_hours > 0 else 0
+    if not cooldown_seconds:
+        hits[frontier] = True
+        return hits
+
+    block, when = blocks['block'], blocks['when']
+    # Monotonic key: block-major, then time within the block
+    span = int(when.max() - when.min()) + cooldown_seconds + 1
+    key = block.astype(np.int64) * span + (when - when.min())
+    following = np.searchsorted(key, key + cooldown_seconds, side='left')
+    following[following >= count] = -1
+    inside = following >= 0
+    inside[inside] = block[following[inside]] == block[inside]
+    following[~inside] = -1
+
+    while frontier.size:
+        hits[frontier] = True
+        frontier = following[frontier]
+        frontier = frontier[frontier >= 0]
+    return hits
+
+def simulate_notifications(codes, fresh, seconds, cooldown_hours):
+    """
+    Bars on which should_send_notification would have fired.
+
+    Each evaluated bar is compared with the symbol's previous evaluated bar: a non-neutral
+    state alerts when it differs from the previous state, when it becomes a fresh cross, or
+    once the cooldown since the last alert has elapsed (see notification_blocks and block_alerts).
+
+    Args:
+        codes (numpy.ndarray): (time x symbol) state codes from classify_history
+        fresh (numpy.ndarray): (time x symbol) fresh-cross mask
+        seconds (numpy.ndarray): (time x symbol) bar times in UTC seconds
+        cooldown_hours (float): notifications.cooldown_hours
+
+    Returns:
+        numpy.ndarray: (time x symbol) bool mask of alerts
+    """
+    sends = np.zeros(codes.size, dtype=bool)
+    blocks = notification_blocks(codes, fresh, seconds)
+    if blocks['flat'].size:
+        sends[blocks['flat'][block_alerts(blocks, cooldown_hours)]] = True
+    return sends.reshape(codes.T.shape).T
+
+def forward_returns(closes, horizons):
+    """
+    Close-to-close return over the next h bars for every bar (NaN past the end).
+    """
+    returns = {}
+    for horizon in horizons:
+        ahead = np.full(closes.shape, np.nan)
+        if horizon < closes.shape[0]:
+            ahead[:-horizon] = closes[horizon:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns[horizon] = ahead / closes - 1
+    return returns
+
+def backtest_golden_cross(stock_data, near_cross_threshold_pct=0.75, cooldown_hours=6,
+                          windows=DEFAULT_WINDOWS, horizons=DEFAULT_HORIZONS):
+    """
+    Alerts the live rules would have sent over the full history of many symbols.
+
+    Args:
+        stock_data (dict): Symbol -> price frame with a 'Close' column
+        near_cross_threshold_pct (float): notifications.near_cross_threshold_pct
+        cooldown_hours (float): notifications.cooldown_hours
+        windows (tuple): (fast, slow) SMA windows
+        horizons (tuple): Bars ahead for the forward returns
+
+    Returns:
+        pandas.DataFrame: One row per alert (symbol, timestamp, state, is_fresh_cross,
+        spread_pct, close, sma_fast, sma_slow, fwd_return_<h>...), ordered by symbol and time
+    """
+    symbols, closes, seconds, tz = build_history_panel(stock_data)
+    fast, slow = windows
+    means = rolling_means(closes, windows)
+    codes, fresh, spread_pct = classify_history(means[fast], means[slow], near_cross_threshold_pct)
+    sends = simulate_notifications(codes, fresh, seconds, cooldown_hours)
+    return alert_table(symbols, closes, seconds, tz, sends, codes, fresh, spread_pct,
+                       means[fast], means[slow], horizons)
+
+def alert_table(symbols, closes, seconds, tz, sends, codes, fresh, spread_pct, sma_fast, sma_slow, horizons):
+    """
+    Gather the bars marked in sends into an alert table.
+    """
+    columns, rows = np.nonzero(sends.T)
+    timestamps = pd.to_datetime(seconds[rows, columns], unit='s', utc=True)
+    timestamps = timestamps.tz_convert(tz) if tz is not None else timestamps.tz_localize(None)
+    table = pd.DataFrame({
+        'symbol': np.asarray(symbols, dtype=object)[columns],
+        'timestamp': timestamps,
+        'state': pd.Series(codes[rows, columns]).map(STATE_NAMES).to_numpy(),
+        'is_fresh_cross': fresh[rows, columns],
+        'spread_pct': spread_pct[rows, columns],
+        'close': closes[rows, columns],
+        'sma_fast': sma_fast[rows, columns],
+        'sma_slow': sma_slow[rows, columns]
+    })
+    for horizon, values in forward_returns(closes, horizons).items():
+        table[f"fwd_return_{horizon}"] = values[rows, columns]
+    return table
+
+def summarize_alerts(alerts, horizons=DEFAULT_HORIZONS):
+    """
+    Alert counts, mean forward returns and hit rates (share of positive returns) per kind.
+
+    Returns:
+        pandas.DataFrame: One row per kind ('fresh', 'golden', 'near' and 'all')
+    """
+    kinds = {
+        'fresh': alerts['is_fresh_cross'],
+        'golden': (alerts['state'] == 'golden') & ~alerts['is_fresh_cross'],
+        'near': alerts['state'] == 'near',
+        'all': pd.Series(True, index=alerts.index)
+    }
+    rows = []
+    for kind, mask in kinds.items():
+        subset = alerts[mask]
+        row = {'kind': kind, 'alerts': len(subset)}
+        for horizon in horizons:
+            returns = subset[f"fwd_return_{horizon}"].dropna()
+            row[f"mean_return_{horizon}"] = returns.mean() if len(returns) else np.nan
+            row[f"hit_rate_{horizon}"] = (returns > 0).mean() if len(returns) else np.nan
+        rows.append(row)
+    return pd.DataFrame(rows).set_index('kind')
+
+def main():
+    from config_manager import load_config
+
+    parser = argparse.ArgumentParser(description='Backtest golden-cross alerts over years of history')
+    add_history_arguments(parser)
+    parser.add_argument('--threshold', type=float, help='near_cross_threshold_pct (default: config)')
+    parser.add_argument('--cooldown', type=float, help='cooldown_hours (default: config)')
+    parser.add_argument('--windows', type=int, nargs=2, default=list(DEFAULT_WINDOWS), help='Fast and slow SMA')
+    parser.add_argument('--horizons', type=int, nargs='+', default=list(DEFAULT_HORIZONS),
+                        help='Bars ahead for forward returns')
+    parser.add_argument('--csv', help='Write the alert table to this file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    config = load_config() or {}
+    notification_config = config.get('notifications', {})
+    threshold = args.threshold if args.threshold is not None else float(
+        notification_config.get('near_cross_threshold_pct', 0.75))
+    cooldown = args.cooldown if args.cooldown is not None else float(notification_config.get('cooldown_hours', 6))
+
+    start = time.perf_counter()
+    interval, stock_data = history_from_args(args, config)
+    loaded = time.perf_counter()
+    alerts = backtest_golden_cross(stock_data, threshold, cooldown, tuple(args.windows), tuple(args.horizons))
+    finished = time.perf_counter()
+
+    bars = sum(len(frame) for frame in stock_data.values())
+    print(f"{len(stock_data)} symbols, {bars} {interval} bars: loaded in {loaded - start:.2f}s, "
+          f"backtested in {finished - loaded:.2f}s")
+    print(f"SMA {args.windows[0]}/{args.windows[1]}, near <= {threshold:.2f}%, cooldown {cooldown:g}h")
+    print(summarize_alerts(alerts, args.horizons).to_string(float_format=lambda value: f"{value:.4f}"))
+    if args.csv:
+        alerts.to_csv(args.csv, index=False)
+        print(f"{len(alerts)} alerts written to {args.csv}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1080 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for Plotin's hot paths.
+
+Usage:
+    python benchmark.py charts --charts 48 --workers 1 2 4 8
+    python benchmark.py suite --symbols 50 500 --years 5 --json bench.json
+    python benchmark.py compare baseline.json bench.json --threshold 1.10
+    python benchmark.py memory --symbols 500 --years 5
+    python benchmark.py streaming --symbols 50 200 --max-in-flight 16
+    python benchmark.py startup --symbols 20
+    python benchmark.py logging --symbols 500 --scan-only
+    python benchmark.py fetch --symbols 200 --batch-sizes 1 50 --latency 0.02 --failure-rate 0.05 --hang-rate 0.02
+    python benchmark.py connections --requests 100 --connect-latency 0.05
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from datetime import datetime, timezone
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from chart_generation import ChartRenderPool, build_plot_frame, generate_chart
+from data_retrieval import get_multiple_stocks_data
+from notifications import save_signal_state, should_send_notification
+from signal_store import SignalStateStore
+from technical_analysis import add_indicators, analyze_golden_cross_state, scan_indicator_frames
+from telegram_bot import TelegramManager
+
+# Session start times of the bars a US listing gets from yfinance for each interval
+SESSION_BARS = {
+    '1d': ['00:00'],
+    '4h': ['09:30', '13:30'],
+    '1h': ['09:30', '10:30', '11:30', '12:30', '13:30', '14:30', '15:30']
+}
+DEFAULT_EPOCH = "2015-01-02"
+SUITE_SCHEMA_VERSION = 1
+
+@functools.lru_cache(maxsize=32)
+def synthetic_index(start, end, interval='4h'):
+    """
+    Trading-calendar timestamps between start and end (weekdays, regular session only).
+
+    Args:
+        start: First day
+        end: Last day (exclusive)
+        interval (str): '1d', '4h' or '1h'
+
+    Returns:
+        pandas.DatetimeIndex: Bar timestamps
+    """
+    days = pd.bdate_range(pd.Timestamp(start).normalize(), pd.Timestamp(end) - pd.Timedelta(days=1))
+    offsets = pd.to_timedelta([f"{bar}:00" for bar in SESSION_BARS.get(interval, SESSION_BARS['4h'])])
+    stamps = (days.values[:, None] + offsets.values[None, :]).ravel()
+    index = pd.DatetimeIndex(stamps)
+    return index[index < pd.Timestamp(end)]
+
+def synthetic_frame(index, seed=0):
+    """
+    Deterministic random-walk OHLCV frame over the given index.
+    """
+    periods = len(index)
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, periods)))
+    opens = np.concatenate([closes[:1], closes[:-1]])
+    spread = np.abs(rng.normal(0, 0.005, periods)) * closes
+    return pd.DataFrame({
+        'Open': opens,
+        'High': np.maximum(opens, closes) + spread,
+        'Low': np.minimum(opens, closes) - spread,
+        'Close': closes,
+        'Volume': rng.integers(100_000, 5_000_000, periods).astype(float)
+    }, index=index)
+
+def synthetic_ohlcv(periods=600, seed=0, freq='4h'):
+    """
+    Deterministic random-walk OHLCV frame for benchmarks.
+    """
+    return synthetic_frame(pd.date_range("2022-01-03 09:30", periods=periods, freq=freq), seed)
+
+def benchmark_chart_rendering(chart_count=48, worker_counts=(1, 2, 4), output_dir=None):
+    """
+    Time rendering chart_count 4h charts in-process and with render pools of various sizes.
+
+    Returns:
+        list: One dict per mode with seconds, charts per second and speedup over in-process rendering
+    """
+    output_dir = output_dir or tempfile.mkdtemp(prefix='plotin-bench-')
+    frames = [add_indicators(synthetic_ohlcv(seed=i)) for i in range(chart_count)]
+    symbols = [f"BENCH{i}" for i in range(chart_count)]
+
+    results = []
+    start = time.perf_counter()
+    for symbol, frame in zip(symbols, frames):
+        generate_chart(frame, symbol, output_dir, interval='4h')
+    serial_seconds = time.perf_counter() - start
+    results.append({'mode': 'in-process', 'workers': 1, 'seconds': serial_seconds})
+
+    for workers in worker_counts:
+        pool = ChartRenderPool(workers)
+        try:
+            async def render_all():
+                return await asyncio.gather(*(pool.render(frame, symbol, output_dir, interval='4h')
+                                              for symbol, frame in zip(symbols, frames)))
+            start = time.perf_counter()
+            rendered = asyncio.run(render_all())
+            seconds = time.perf_counter() - start
+        finally:
+            pool.shutdown()
+        if not all(success for _, success in rendered):
+            print(f"Warning: {sum(not success for _, success in rendered)} charts failed with {workers} workers")
+        results.append({'mode': 'pool', 'workers': workers, 'seconds': seconds})
+
+    for result in results:
+        result['charts_per_second'] = chart_count / result['seconds']
+        result['speedup'] = serial_seconds / result['seconds']
+    return results
+
+def symbol_seed(symbol):
+    """
+    Stable per-symbol seed (str hashes are randomized per process).
+    """
+    return zlib.crc32(symbol.encode())
+
+def synthetic_symbols(count):
+    """
+    Ticker-like names for a synthetic universe.
+    """
+    return [f"SYN{i:04d}" for i in range(count)]
+
+class StubDownloader:
+    """
+    Offline stand-in for yf.download serving synthetic history.
+
+    Every symbol gets one fixed random walk starting at epoch, so overlapping
+    requests (e.g. cache tail refreshes) see consistent prices.
+    """
+    def __init__(self, epoch=DEFAULT_EPOCH, latency=0.0):
+        """
+        Args:
+            epoch (str): First trading day of every synthetic series
+            latency (float): Seconds to sleep per call, to mimic network time
+        """
+        self.epoch = pd.Timestamp(epoch)
+        self.latency = latency
+        self.calls = 0
+        self.rows_served = 0
+
+    def history(self, symbol, interval, end):
+        """
+        Full synthetic history for a symbol up to end.
+        """
+        index = synthetic_index(self.epoch, pd.Timestamp(end), interval)
+        return synthetic_frame(index, symbol_seed(symbol))
+
+    def __call__(self, tickers, start=None, end=None, interval='1d', group_by=None, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        start = pd.Timestamp(start).tz_localize(None) if start is not None else self.epoch
+        end = pd.Timestamp(end).tz_localize(None) if end is not None else pd.Timestamp.now().normalize()
+
+        def window(symbol):
+            frame = self.history(symbol, interval, end)
+            frame = frame[frame.index >= start]
+            self.rows_served += len(frame)
+            return frame
+
+        if isinstance(tickers, str):
+            return window(tickers)
+        return pd.concat({symbol: window(symbol) for symbol in tickers}, axis=1)
+
+def synthetic_universe(symbol_count, years=5, interval='4h', end=None, epoch=None):
+    """
+    Synthetic history for a whole watchlist (the same prices StubDownloader serves).
+
+    Returns:
+        dict: Dictionary mapping symbols to OHLCV frames
+    """
+    end = pd.Timestamp(end or pd.Timestamp.now().normalize())
+    downloader = StubDownloader(epoch=epoch or end - pd.DateOffset(years=years))
+    return {symbol: downloader.history(symbol, interval, end) for symbol in synthetic_symbols(symbol_count)}
+
+class FakePhoto:
+    def __init__(self, file_id):
+        self.file_id = file_id
+
+class FakeMessage:
+    def __init__(self, file_id=None):
+        self.photo = (FakePhoto(file_id),) if file_id else ()
+
+class FakeTelegramBot:
+    """
+    Offline stand-in for telegram.Bot that records calls and sleeps for a fixed latency.
+    """
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.bytes_received = 0
+
+    async def _request(self, kwargs):
+        self.calls += 1
+        for value in [kwargs.get('photo')] + [getattr(item, 'media', None) for item in kwargs.get('media', [])]:
+            if isinstance(value, (bytes, bytearray)):
+                self.bytes_received += len(value)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.calls
+
+    async def send_message(self, **kwargs):
+        await self._request(kwargs)
+        return FakeMessage()
+
+    async def send_photo(self, **kwargs):
+        call = await self._request(kwargs)
+        return FakeMessage(f"file-{call}")
+
+    async def send_media_group(self, **kwargs):
+        call = await self._request(kwargs)
+        return [FakeMessage(f"file-{call}-{i}") for i in range(len(kwargs['media']))]
+
+def measure(func, repeat=1, measure_memory=True):
+    """
+    Time func and record its peak traced allocation.
+
+    Timing runs happen without tracemalloc (it slows allocation-heavy code
+    considerably); peak memory comes from one extra traced run.
+
+    Returns:
+        tuple: (result of the last call, seconds of the fastest run, peak MiB or None)
+    """
+    best = None
+    result = None
+    for _ in range(max(repeat, 1)):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    peak_mb = None
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            tracemalloc.reset_peak()
+            func()
+            peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        finally:
+            tracemalloc.stop()
+    return result, best, peak_mb
+
+def _fake_telegram_manager(bot):
+    # No throttling: the suite measures Plotin's own overhead, not Telegram's rate limits
+    delivery = {'global_rate_per_sec': 1_000_000, 'chat_rate_per_sec': 1_000_000, 'chat_burst': 1_000_000}
+    return TelegramManager('BENCHMARK', 'benchmark-chat', bot=bot, delivery_settings=delivery)
+
+def _benchmark_config(symbols, output_dir, render_workers=0, overrides=None):
+    from config_manager import validate_config
+    config = {
+        'stocks': list(symbols),
+        'time_period': 30,
+        'interval': '4h',
+        'output': {'directory': output_dir},
+        'data': {'cache_directory': os.path.join(output_dir, 'ohlcv_cache')},
+        'chart': {'render_workers': render_workers},
+        'notifications': {'enabled': True, 'state_file': os.path.join(output_dir, 'signal_state.json')},
+        'telegram': {'token': 'BENCHMARK', 'chat_id': 'benchmark-chat'}
+    }
+    for key, value in (overrides or {}).items():
+        if isinstance(value, dict):
+            config.setdefault(key, {}).update(value)
+        else:
+            config[key] = value
+    validate_config(config)
+    return config
+
+def run_pipeline_benchmark(symbols, output_dir, downloader, bot, render_workers=0, overrides=None, scan_only=False):
+    """
+    Run process_stocks end to end against the stub downloader and fake bot.
+
+    overrides are merged into the benchmark config section by section.
+
+    Returns:
+        bool: process_stocks' result
+    """
+    import main as plotin_main
+
+    config = _benchmark_config(symbols, output_dir, render_workers, overrides)
+    with mock.patch('yfinance.download', downloader), \
+            mock.patch.object(plotin_main, 'create_telegram_manager', lambda _config: _fake_telegram_manager(bot)):
+        return asyncio.run(plotin_main.process_stocks(config, send_to_telegram=True, scan_only=scan_only))
+
+def benchmark_universe(symbol_count, years=5, interval='4h', chart_sample=8, repeat=1,
+                       measure_memory=True, pipeline=False, output_dir=None):
+    """
+    Time every hot path for one watchlist size.
+
+    Args:
+        symbol_count (int): Number of symbols in the synthetic universe
+        years (int): Years of history per symbol
+        interval (str): Bar interval of the history
+        chart_sample (int): Charts rendered and delivered (rendering all symbols would dominate the run)
+        repeat (int): Timing runs per stage (the fastest is reported)
+        measure_memory (bool): Record peak traced memory per stage
+        pipeline (bool): Also run process_stocks end to end
+        output_dir (str, optional): Scratch directory
+
+    Returns:
+        list: One result dict per stage
+    """
+    output_dir = output_dir or tempfile.mkdtemp(prefix='plotin-bench-')
+    end = pd.Timestamp.now().normalize()
+    epoch = end - pd.DateOffset(years=years)
+    symbols = synthetic_symbols(symbol_count)
+    results = []
+
+    def record(stage, func, items):
+        value, seconds, peak_mb = measure(func, repeat, measure_memory)
+        results.append({
+            'symbols': symbol_count,
+            'years': years,
+            'interval': interval,
+            'stage': stage,
+            'items': items,
+            'seconds': seconds,
+            'per_item_ms': seconds / items * 1000 if items else None,
+            'peak_memory_mb': peak_mb
+        })
+        return value
+
+    universe = record('generate', lambda: synthetic_universe(symbol_count, years, interval, end, epoch), symbol_count)
+    bars = sum(len(frame) for frame in universe.values())
+
+    downloader = StubDownloader(epoch=epoch)
+    period_days = (end - epoch).days
+    record('download', lambda: get_multiple_stocks_data(symbols, period_days, interval, downloader=downloader),
+           symbol_count)
+
+    indicators = record('add_indicators', lambda: {symbol: add_indicators(frame) for symbol, frame in universe.items()},
+                        symbol_count)
+    signals = record('analyze_golden_cross_state',
+                     lambda: {symbol: analyze_golden_cross_state(frame) for symbol, frame in indicators.items()},
+                     symbol_count)
+    record('scan_indicator_frames', lambda: scan_indicator_frames(indicators), symbol_count)
+
+    # Half the previous states differ, half sit inside the cooldown
+    now = datetime.now(timezone.utc).isoformat()
+    previous = {symbol: dict(signal, state='neutral' if i % 2 else signal['state'], last_notified_at=now)
+                for i, (symbol, signal) in enumerate(signals.items()) if signal}
+    record('should_send_notification',
+           lambda: [should_send_notification(previous.get(symbol), signal, 6) for symbol, signal in signals.items()],
+           symbol_count)
+
+    state = {symbol: {'1d': signal, '4h': signal} for symbol, signal in previous.items()}
+    state_path = os.path.join(output_dir, 'signal_state.json')
+    record('save_signal_state', lambda: save_signal_state(state, state_path), symbol_count)
+
+    store = SignalStateStore(os.path.join(output_dir, 'signal_state.db'))
+
+    def commit_signal_store():
+        for symbol, timeframes in state.items():
+            for timeframe, info in timeframes.items():
+                store.update(symbol, timeframe, info)
+        return store.commit()
+    record('signal_store_commit', commit_signal_store, symbol_count)
+    store.close()
+
+    sample = [symbol for symbol in symbols if indicators.get(symbol) is not None][:chart_sample]
+    chart_dir = os.path.join(output_dir, 'charts')
+
+    def render_sample():
+        return [(os.path.join(chart_dir, f"{symbol}_4h_chart.png"), f"Benchmark chart for {symbol}")
+                for symbol in sample if generate_chart(indicators[symbol], symbol, chart_dir, interval='4h')]
+    charts = record('generate_chart', render_sample, len(sample))
+
+    def deliver_sample():
+        manager = _fake_telegram_manager(FakeTelegramBot())
+
+        async def send():
+            for path, caption in charts:
+                symbol = os.path.basename(path).split('_')[0]
+                manager.enqueue(symbol, manager.send_stock_analyses, symbol, [(path, caption)])
+            return await manager.flush()
+        return asyncio.run(send())
+    record('telegram_delivery', deliver_sample, len(charts))
+
+    if pipeline:
+        def run():
+            # A fresh output directory per run so every run is a cold start (no OHLCV, chart or file_id caches)
+            run_dir = tempfile.mkdtemp(prefix='pipeline-', dir=output_dir)
+            return run_pipeline_benchmark(symbols, run_dir, StubDownloader(epoch=epoch), FakeTelegramBot())
+        record('process_stocks', run, symbol_count)
+
+    for result in results:
+        result['bars'] = bars
+    return results
+
+def run_suite(universe_sizes=(50, 500), years=5, interval='4h', chart_sample=8, repeat=1,
+              measure_memory=True, pipeline=False):
+    """
+    Run benchmark_universe for every universe size.
+
+    Returns:
+        dict: JSON-serializable report with environment metadata and results
+    """
+    results = []
+    for size in universe_sizes:
+        results.extend(benchmark_universe(size, years, interval, chart_sample, repeat, measure_memory, pipeline))
+    return {
+        'schema': SUITE_SCHEMA_VERSION,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'settings': {
+            'universe_sizes': list(universe_sizes),
+            'years': years,
+            'interval': interval,
+            'chart_sample': chart_sample,
+            'repeat': repeat
+        },
+        'results': results
+    }
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except Exception:
+        return None
+
+def compare_reports(baseline, current, threshold=1.10):
+    """
+    Pair up stages present in both reports.
+
+    Args:
+        baseline (dict): Earlier run_suite report
+        current (dict): Later run_suite report
+        threshold (float): Time or memory ratio above which a stage counts as a regression
+
+    Returns:
+        list: One dict per shared (symbols, stage) with ratios and a regression flag
+    """
+    def keyed(report):
+        return {(result['symbols'], result['stage']): result for result in report.get('results', [])}
+
+    baseline_results = keyed(baseline)
+    rows = []
+    for key, result in keyed(current).items():
+        before = baseline_results.get(key)
+        if before is None:
+            continue
+        time_ratio = result['seconds'] / before['seconds'] if before['seconds'] else None
+        memory_ratio = None
+        if before.get('peak_memory_mb') and result.get('peak_memory_mb') is not None:
+            memory_ratio = result['peak_memory_mb'] / before['peak_memory_mb']
+        rows.append({
+            'symbols': key[0],
+            'stage': key[1],
+            'time_ratio': time_ratio,
+            'memory_ratio': memory_ratio,
+            'regression': any(ratio is not None and ratio > threshold for ratio in (time_ratio, memory_ratio))
+        })
+    return rows
+
+def _memory_probe(compact, symbol_count, years, interval):
+    """
+    Hold a universe's price and indicator frames the way a run does; runs in a fresh process.
+    """
+    logging.getLogger().setLevel(logging.ERROR)
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    end = pd.Timestamp.now().normalize()
+    downloader = StubDownloader(epoch=end - pd.DateOffset(years=years))
+    symbols = synthetic_symbols(symbol_count)
+    period_days = years * 365
+
+    start = time.perf_counter()
+    stock_data = {
+        '1d': get_multiple_stocks_data(symbols, period_days, '1d', batch_size=50, downloader=downloader, compact=compact),
+        interval: get_multiple_stocks_data(symbols, period_days, interval, batch_size=50, downloader=downloader,
+                                           compact=compact)
+    }
+    indicators = {timeframe: {symbol: add_indicators(frame) for symbol, frame in frames.items()}
+                  for timeframe, frames in stock_data.items()}
+    plot_frames = [build_plot_frame(frame, timeframe) for timeframe, frames in indicators.items()
+                   for frame in frames.values() if frame is not None]
+    seconds = time.perf_counter() - start
+
+    def frame_bytes(frames):
+        return sum(frame.memory_usage(deep=True).sum() for frame in frames.values() if frame is not None)
+
+    retained = sum(frame_bytes(frames) for frames in stock_data.values()) + \
+        sum(frame_bytes(frames) for frames in indicators.values())
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'mode': 'compact' if compact else 'default',
+        'symbols': symbol_count,
+        'years': years,
+        'interval': interval,
+        'charts': len(plot_frames),
+        'seconds': seconds,
+        'retained_frames_mb': retained / (1024 * 1024),
+        'peak_rss_mb': peak_kb / 1024,
+        'peak_rss_growth_mb': (peak_kb - baseline_kb) / 1024
+    }
+
+def benchmark_memory(symbol_count=500, years=5, interval='4h'):
+    """
+    Compare the default and compact frame representations, each in a fresh process.
+
+    Returns:
+        list: One dict per mode with retained frame size and peak RSS
+    """
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for compact in (False, True):
+        with context.Pool(1) as pool:
+            results.append(pool.apply(_memory_probe, (compact, symbol_count, years, interval)))
+    default = results[0]
+    for result in results:
+        result['retained_reduction'] = default['retained_frames_mb'] / result['retained_frames_mb']
+        result['rss_growth_reduction'] = default['peak_rss_growth_mb'] / max(result['peak_rss_growth_mb'], 1e-9)
+    return results
+
+def _streaming_probe(symbol_count, years, streaming, max_in_flight):
+    """
+    Run process_stocks once in a fresh process and report its peak RSS growth.
+    """
+    logging.getLogger().setLevel(logging.ERROR)
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    end = pd.Timestamp.now().normalize()
+    output_dir = tempfile.mkdtemp(prefix='plotin-streaming-')
+    overrides = {
+        'time_period': years * 365,
+        'pipeline': {'streaming': streaming, 'max_in_flight': max_in_flight}
+    }
+    start = time.perf_counter()
+    ok = run_pipeline_benchmark(synthetic_symbols(symbol_count), output_dir,
+                                StubDownloader(epoch=end - pd.DateOffset(years=years + 1)), FakeTelegramBot(),
+                                overrides=overrides)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'mode': 'streaming' if streaming else 'batched',
+        'symbols': symbol_count,
+        'years': years,
+        'max_in_flight': max_in_flight if streaming else None,
+        'ok': ok,
+        'seconds': time.perf_counter() - start,
+        'peak_rss_growth_mb': (peak_kb - baseline_kb) / 1024
+    }
+
+def benchmark_streaming(universe_sizes=(50, 200), years=5, max_in_flight=16, threshold=1.10):
+    """
+    Peak RSS growth of process_stocks per universe size, batched vs streaming.
+
+    Every run uses the default config (so the incremental indicator engine is on). A
+    streaming run whose growth is more than threshold times that of the smallest universe
+    is flagged as a regression: streaming memory must not scale with the watchlist.
+
+    Returns:
+        list: One dict per (mode, universe size)
+    """
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for streaming in (False, True):
+        for size in sorted(universe_sizes):
+            with context.Pool(1) as pool:
+                results.append(pool.apply(_streaming_probe, (size, years, streaming, max_in_flight)))
+    for mode in ('batched', 'streaming'):
+        runs = [result for result in results if result['mode'] == mode]
+        for result in runs:
+            result['growth_ratio'] = result['peak_rss_growth_mb'] / max(runs[0]['peak_rss_growth_mb'], 1.0)
+            result['regression'] = mode == 'streaming' and result['growth_ratio'] > threshold
+    return results
+
+STARTUP_MODES = ('import', 'schedule', 'scan-only', 'full')
+HEAVY_MODULES = ('pandas', 'numpy', 'yfinance', 'matplotlib', 'mplfinance', 'telegram', 'apscheduler')
+
+# Runs in a clean interpreter so that nothing but main.py's own imports is timed. Linux keeps
+# ru_maxrss across fork/exec, so the peak comes from VmHWM, which a new program starts afresh.
+_STARTUP_PROBE = """
+import json, resource, sys, time
+
+def peak_rss_mb():
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+heavy = %r
+start = time.perf_counter()
+import main
+result = {'import_seconds': time.perf_counter() - start, 'import_rss_mb': peak_rss_mb(),
+          'import_modules': [name for name in heavy if name in sys.modules], 'ok': True}
+mode = sys.argv[1]
+start = time.perf_counter()
+if mode == 'schedule':
+    # What --schedule holds while it waits for the first cron tick
+    from scheduler import ScheduleManager
+    ScheduleManager().shutdown()
+elif mode != 'import':
+    import benchmark
+    result['ok'] = benchmark._startup_run(*sys.argv[1:])
+result.update({'run_seconds': time.perf_counter() - start, 'peak_rss_mb': peak_rss_mb(),
+               'heavy_modules': [name for name in heavy if name in sys.modules]})
+print(json.dumps(result))
+""" % (HEAVY_MODULES,)
+
+def _startup_run(mode, symbol_count, years, output_dir):
+    """
+    Run process_stocks once for a startup probe (after it has imported main).
+
+    Returns:
+        bool: process_stocks' result
+    """
+    logging.getLogger().setLevel(logging.ERROR)
+    end = pd.Timestamp.now().normalize()
+    overrides = {'time_period': int(years) * 365}
+    return run_pipeline_benchmark(synthetic_symbols(int(symbol_count)), output_dir,
+                                  StubDownloader(epoch=end - pd.DateOffset(years=int(years) + 1)),
+                                  FakeTelegramBot(), overrides=overrides, scan_only=mode == 'scan-only')
+
+def benchmark_startup(symbol_count=20, years=1, modes=STARTUP_MODES):
+    """
+    Cold-start time and RSS of main.py per mode, each in a fresh interpreter.
+
+    'import' only imports main.py, 'schedule' also starts an idle scheduler, and
+    'scan-only' and 'full' run process_stocks once against synthetic data, without and
+    with charts. The heavy modules each mode loaded show which stages it paid for; the
+    run modes also load benchmark.py's synthetic data generator.
+
+    Returns:
+        list: One dict per mode
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for mode in modes:
+        with tempfile.TemporaryDirectory(prefix='plotin-startup-') as output_dir:
+            start = time.perf_counter()
+            completed = subprocess.run([sys.executable, '-c', _STARTUP_PROBE, mode, str(symbol_count), str(years),
+                                        output_dir], cwd=root, capture_output=True, text=True, check=True)
+            result = {'mode': mode, 'symbols': symbol_count if mode in ('scan-only', 'full') else 0,
+                      'process_seconds': time.perf_counter() - start}
+        result.update(json.loads(completed.stdout.strip().splitlines()[-1]))
+        results.append(result)
+    return results
+
+FETCH_MODES = ('plain', 'resilient')
+
+class TimedDownloader:
+    """
+    Records the duration of every call to a downloader (other attributes pass through).
+    """
+    def __init__(self, downloader):
+        self.downloader = downloader
+        self.seconds = []
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.downloader(*args, **kwargs)
+        finally:
+            self.seconds.append(time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self.downloader, name)
+
+def benchmark_fetch(symbol_count=200, years=1, interval='4h', batch_sizes=(1, 50), latency=0.02, jitter=0.0,
+                    failure_rate=0.0, hang_rate=0.0, hang_seconds=5.0, timeout=1.0, modes=FETCH_MODES, seed=0):
+    """
+    Fetch-layer throughput and tail latency against the local stand-in server.
+
+    The server serves StubDownloader's synthetic history over HTTP with seeded latency,
+    failures and hanging requests, so every run of the benchmark sees the same responses.
+    'plain' downloads straight from the server (waiting out hangs, no retries);
+    'resilient' goes through a ResilientFetcher with the given per-request timeout.
+
+    Returns:
+        list: One dict per (mode, batch size)
+    """
+    from data_sources import HTTPSource, StandInServer
+    from fetch_executor import ResilientFetcher
+    from metrics import METRICS
+
+    end = pd.Timestamp.now().normalize()
+    symbols = synthetic_symbols(symbol_count)
+    results = []
+    for mode in modes:
+        for batch_size in batch_sizes:
+            downloader = StubDownloader(epoch=end - pd.DateOffset(years=years + 1))
+            with StandInServer(downloader, latency=latency, jitter=jitter, failure_rate=failure_rate,
+                               hang_rate=hang_rate, hang_seconds=hang_seconds, seed=seed) as server:
+                if mode == 'resilient':
+                    # The breaker would stop the run on a bad enough server; this measures retries
+                    source = ResilientFetcher(HTTPSource(server.url, timeout=timeout), timeout=timeout,
+                                              deadline=max(10 * timeout, 30), breaker_threshold=1_000_000, seed=seed)
+                else:
+                    source = HTTPSource(server.url, timeout=hang_seconds + 5)
+                timed = TimedDownloader(source)
+                baseline = METRICS.begin_run()
+                start = time.perf_counter()
+                frames = get_multiple_stocks_data(symbols, years * 365, interval, batch_size=batch_size,
+                                                  downloader=timed)
+                seconds = time.perf_counter() - start
+                report = METRICS.run_report(baseline)
+            results.append({
+                'mode': mode,
+                'batch_size': batch_size,
+                'symbols': symbol_count,
+                'fetched': len(frames),
+                'seconds': seconds,
+                'symbols_per_second': len(frames) / seconds if seconds else None,
+                'requests': len(timed.seconds),
+                'p95_request_seconds': float(np.percentile(timed.seconds, 95)),
+                'max_request_seconds': max(timed.seconds),
+                'server_requests': server.requests,
+                'server_failures': server.failures,
+                'server_hangs': server.hangs,
+                'attempts': report['counters'].get('fetch_attempts_total', {}),
+                'peak_concurrency': source.limit.peak if mode == 'resilient' else 1
+            })
+    return results
+
+# Logging setups compared by benchmark_logging; 'sync-verbose' is the previous setup, which
+# wrote every per-symbol line from the thread that logged it
+LOGGING_MODES = {
+    'sync-verbose': {'queued': False, 'level': 'DEBUG', 'debug_sample_every': 1},
+    'sync': {'queued': False, 'level': 'INFO'},
+    'queued': {'queued': True, 'level': 'INFO'},
+    'queued-debug': {'queued': True, 'level': 'DEBUG', 'debug_sample_every': 20}
+}
+
+_LOGGING_PROBE = "import benchmark, json, sys; print(json.dumps(benchmark._logging_probe(*sys.argv[1:])))"
+
+def _logging_probe(mode, symbol_count, years, scan_only, write_delay_ms, output_dir):
+    """
+    Run process_stocks once under a logging mode (in a fresh interpreter, whose stderr is
+    a pipe read by the parent, like a service's captured console).
+
+    Returns:
+        dict: Run time, event loop lag from the run report, and log volume
+    """
+    from log_pipeline import setup_logging, stop_logging
+
+    write_delay = float(write_delay_ms) / 1000
+    if write_delay:
+        # Every record's flush waits, as on a network filesystem or a console that is slow to drain
+        flush = logging.StreamHandler.flush
+
+        def slow_flush(handler):
+            time.sleep(write_delay)
+            flush(handler)
+
+        logging.StreamHandler.flush = slow_flush
+
+    log_file = os.path.join(output_dir, 'plotin.log')
+    setup_logging(dict(LOGGING_MODES[mode], file=log_file, console=True))
+    end = pd.Timestamp.now().normalize()
+    start = time.perf_counter()
+    ok = run_pipeline_benchmark(synthetic_symbols(int(symbol_count)), output_dir,
+                                StubDownloader(epoch=end - pd.DateOffset(years=int(years) + 1)), FakeTelegramBot(),
+                                overrides={'time_period': int(years) * 365}, scan_only=scan_only == 'True')
+    seconds = time.perf_counter() - start
+    stop_logging()
+    with open(os.path.join(output_dir, 'run_report.json')) as handle:
+        loop = json.load(handle)['event_loop']
+    with open(log_file, 'rb') as handle:
+        log_lines = sum(1 for _ in handle)
+    return {
+        'mode': mode,
+        'symbols': int(symbol_count),
+        'ok': ok,
+        'seconds': seconds,
+        'log_lines': log_lines,
+        'log_bytes': os.path.getsize(log_file),
+        'loop_lag_seconds': loop['lag_seconds'],
+        'max_loop_lag_seconds': loop['max_lag_seconds'],
+        'stalls': loop['stalls'],
+        'stall_seconds': loop['stall_seconds']
+    }
+
+def benchmark_logging(symbol_count=500, years=2, scan_only=False, write_delay_ms=0, modes=tuple(LOGGING_MODES)):
+    """
+    Event loop lag of process_stocks per logging setup, each in a fresh interpreter.
+
+    write_delay_ms adds a wait to every log write, to see how each setup copes with a slow
+    disk or console.
+
+    Returns:
+        list: One dict per mode
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for mode in modes:
+        with tempfile.TemporaryDirectory(prefix='plotin-logging-') as output_dir:
+            completed = subprocess.run([sys.executable, '-c', _LOGGING_PROBE, mode, str(symbol_count), str(years),
+                                        str(scan_only), str(write_delay_ms), output_dir], cwd=root, capture_output=True, text=True,
+                                       check=True)
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        result['console_bytes'] = len(completed.stderr.encode())
+        results.append(result)
+    return results
+
+# Clients compared by benchmark_connections: (client, 'http' config overrides); 'curl-per-thread'
+# is yfinance's own session, which keeps one curl handle (and connection cache) per thread
+CONNECTION_MODES = {
+    'httpx-no-keepalive': ('httpx', {'keepalive_seconds': 0}),
+    'httpx-pooled': ('httpx', {}),
+    'curl-per-thread': ('curl', None),
+    'curl-pooled': ('curl', {})
+}
+
+def benchmark_connections(request_count=100, connect_latency=0.05, latency=0.0, modes=tuple(CONNECTION_MODES)):
+    """
+    Connections opened and time taken for sequential requests to the local stand-in server.
+
+    Every request runs on a new thread, as ResilientFetcher attempts and yf.download's worker
+    threads do. connect_latency stands in for the TCP and TLS handshakes of a remote host,
+    which the server charges once per new connection.
+
+    Returns:
+        list: One dict per mode
+    """
+    import http_pool
+    from data_sources import HTTPSource, StandInServer
+    from fetch_executor import ResilientFetcher
+    from metrics import METRICS
+
+    symbols = synthetic_symbols(request_count)
+    results = []
+    for mode in modes:
+        client, overrides = CONNECTION_MODES[mode]
+        http_pool.configure(overrides)
+        with StandInServer(StubDownloader(), latency=latency, connect_latency=connect_latency) as server:
+            if client == 'httpx':
+                fetcher = ResilientFetcher(HTTPSource(server.url), retries=0)
+
+                def request(symbol):
+                    fetcher(symbol, interval='1d')
+            else:
+                if overrides is None:
+                    from curl_cffi import requests as curl_requests
+                    session = curl_requests.Session(impersonate='chrome')
+                else:
+                    session = http_pool.yfinance_session()
+
+                def request(symbol):
+                    worker = threading.Thread(target=session.get, args=(f"{server.url}/download?symbols={symbol}",))
+                    worker.start()
+                    worker.join()
+
+            baseline = METRICS.begin_run()
+            start = time.perf_counter()
+            for symbol in symbols:
+                request(symbol)
+            seconds = time.perf_counter() - start
+            report = METRICS.run_report(baseline)
+            if overrides is None:
+                session.close()
+        results.append({
+            'mode': mode,
+            'requests': server.requests,
+            'connections': server.connections,
+            'seconds': seconds,
+            'ms_per_request': seconds / request_count * 1000,
+            'reuse_rate': report['cache_hit_rates']['http_connections']
+        })
+    http_pool.configure()
+    return results
+
+def print_suite(report):
+    print(f"commit={report['commit']} python={report['python']} cpus={report['cpu_count']}")
+    for result in report['results']:
+        memory = f"{result['peak_memory_mb']:9.1f} MiB" if result['peak_memory_mb'] is not None else " " * 13
+        per_item = f"{result['per_item_ms']:9.3f} ms/item" if result['per_item_ms'] is not None else ""
+        print(f"{result['symbols']:>5} symbols {result['stage']:<28} {result['seconds']:9.3f}s {memory} {per_item}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Plotin benchmarks')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    charts = subparsers.add_parser('charts', help='Chart rendering throughput')
+    charts.add_argument('--charts', type=int, default=48, help='Number of charts to render')
+    charts.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1],
+                        help='Render pool sizes to compare')
+
+    suite = subparsers.add_parser('suite', help='Time and peak memory of every hot path per universe size')
+    suite.add_argument('--symbols', type=int, nargs='+', default=[50, 500], help='Universe sizes')
+    suite.add_argument('--years', type=int, default=5, help='Years of history per symbol')
+    suite.add_argument('--interval', default='4h', choices=sorted(SESSION_BARS), help='Bar interval')
+    suite.add_argument('--chart-sample', type=int, default=8, help='Charts rendered and delivered per universe')
+    suite.add_argument('--repeat', type=int, default=1, help='Timing runs per stage (fastest is reported)')
+    suite.add_argument('--no-memory', action='store_true', help='Skip the traced peak-memory runs')
+    suite.add_argument('--pipeline', action='store_true', help='Also run process_stocks end to end')
+    suite.add_argument('--json', help='Write the report to this file')
+
+    memory = subparsers.add_parser('memory', help='Peak memory of the default vs compact frame representation')
+    memory.add_argument('--symbols', type=int, default=500, help='Universe size')
+    memory.add_argument('--years', type=int, default=5, help='Years of history per symbol')
+    memory.add_argument('--interval', default='4h', choices=sorted(SESSION_BARS), help='Bar interval')
+    memory.add_argument('--json', help='Write the results to this file')
+
+    streaming = subparsers.add_parser('streaming', help='Peak memory of process_stocks by watchlist size')
+    streaming.add_argument('--symbols', type=int, nargs='+', default=[50, 200], help='Universe sizes')
+    streaming.add_argument('--years', type=int, default=5, help='Years of history per symbol (time_period)')
+    streaming.add_argument('--max-in-flight', type=int, default=16, help='Streaming window')
+    streaming.add_argument('--threshold', type=float, default=1.10,
+                           help='Streaming growth ratio over the smallest universe that counts as a regression')
+    streaming.add_argument('--json', help='Write the results to this file')
+
+    startup = subparsers.add_parser('startup', help='Cold-start time and RSS of main.py per mode')
+    startup.add_argument('--symbols', type=int, default=20, help='Watchlist size for the scan-only and full runs')
+    startup.add_argument('--years', type=int, default=1, help='Years of history per symbol (time_period)')
+    startup.add_argument('--modes', nargs='+', choices=STARTUP_MODES, default=list(STARTUP_MODES),
+                         help='Modes to measure')
+    startup.add_argument('--json', help='Write the results to this file')
+
+    fetch = subparsers.add_parser('fetch', help='Fetch-layer throughput against the local stand-in server')
+    fetch.add_argument('--symbols', type=int, default=200, help='Watchlist size')
+    fetch.add_argument('--years', type=int, default=1, help='Years of history per symbol (time_period)')
+    fetch.add_argument('--interval', default='4h', choices=sorted(SESSION_BARS), help='Bar interval')
+    fetch.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 50], help='Symbols per request')
+    fetch.add_argument('--latency', type=float, default=0.02, help='Seconds the server adds to every response')
+    fetch.add_argument('--jitter', type=float, default=0.0, help='Random extra seconds per response (at most)')
+    fetch.add_argument('--failure-rate', type=float, default=0.0, help='Share of requests answered with 503')
+    fetch.add_argument('--hang-rate', type=float, default=0.0, help='Share of requests the server holds')
+    fetch.add_argument('--hang-seconds', type=float, default=5.0, help='How long a held request hangs')
+    fetch.add_argument('--timeout', type=float, default=1.0, help='Per-request timeout of the resilient mode')
+    fetch.add_argument('--modes', nargs='+', choices=FETCH_MODES, default=list(FETCH_MODES), help='Fetch layers to compare')
+    fetch.add_argument('--seed', type=int, default=0, help='Seed of the latency and failure draws')
+    fetch.add_argument('--json', help='Write the results to this file')
+
+    logging_parser = subparsers.add_parser('logging', help='Event loop lag of process_stocks per logging setup')
+    logging_parser.add_argument('--symbols', type=int, default=500, help='Watchlist size')
+    logging_parser.add_argument('--years', type=int, default=2, help='Years of history per symbol (time_period)')
+    logging_parser.add_argument('--scan-only', action='store_true', help='Skip chart rendering')
+    logging_parser.add_argument('--write-delay-ms', type=float, default=0,
+                                help='Simulated latency of every log write (slow disk or console)')
+    logging_parser.add_argument('--modes', nargs='+', choices=sorted(LOGGING_MODES), default=list(LOGGING_MODES),
+                                help='Logging setups to compare')
+    logging_parser.add_argument('--json', help='Write the results to this file')
+
+    connections = subparsers.add_parser('connections', help='Connection reuse of the HTTP clients against the stand-in server')
+    connections.add_argument('--requests', type=int, default=100, help='Sequential requests per client')
+    connections.add_argument('--connect-latency', type=float, default=0.05,
+                             help='Seconds the server charges per new connection (simulated handshakes)')
+    connections.add_argument('--latency', type=float, default=0.0, help='Seconds the server adds to every response')
+    connections.add_argument('--modes', nargs='+', choices=list(CONNECTION_MODES), default=list(CONNECTION_MODES),
+                             help='Clients to compare')
+    connections.add_argument('--json', help='Write the results to this file')
+
+    compare = subparsers.add_parser('compare', help='Compare two suite reports')
+    compare.add_argument('baseline', help='Report from the reference commit')
+    compare.add_argument('current', help='Report to check')
+    compare.add_argument('--threshold', type=float, default=1.10, help='Ratio that counts as a regression')
+    args = parser.parse_args()
+
+    # Per-symbol INFO logs would dominate the timings
+    logging.getLogger().setLevel(logging.ERROR)
+
+    if args.benchmark == 'charts':
+        print(f"Rendering {args.charts} charts (CPU count: {os.cpu_count()})")
+        for result in benchmark_chart_rendering(args.charts, sorted(set(args.workers))):
+            print(f"{result['mode']:>10} workers={result['workers']:<3} "
+                  f"{result['seconds']:7.2f}s {result['charts_per_second']:6.1f} charts/s "
+                  f"speedup x{result['speedup']:.2f}")
+    elif args.benchmark == 'suite':
+        report = run_suite(args.symbols, args.years, args.interval, args.chart_sample, args.repeat,
+                           not args.no_memory, args.pipeline)
+        print_suite(report)
+        if args.json:
+            with open(args.json, 'w') as handle:
+                json.dump(report, handle, indent=2)
+            print(f"Report written to {args.json}")
+    elif args.benchmark == 'memory':
+        results = benchmark_memory(args.symbols, args.years, args.interval)
+        for result in results:
+            print(f"{result['mode']:>8}: frames {result['retained_frames_mb']:8.1f} MiB (x{result['retained_reduction']:.2f} smaller)  "
+                  f"peak RSS {result['peak_rss_mb']:8.1f} MiB, +{result['peak_rss_growth_mb']:.1f} MiB over startup "
+                  f"(x{result['rss_growth_reduction']:.2f} smaller)  {result['seconds']:.2f}s")
+        if args.json:
+            with open(args.json, 'w') as handle:
+                json.dump(results, handle, indent=2)
+            print(f"Results written to {args.json}")
+    elif args.benchmark == 'streaming':
+        results = benchmark_streaming(sorted(set(args.symbols)), args.years, args.max_in_flight, args.threshold)
+        for result in results:
+            flag = "  REGRESSION" if result['regression'] else ""
+            print(f"{result['mode']:>9} {result['symbols']:>5} symbols: peak RSS +{result['peak_rss_growth_mb']:7.1f} MiB "
+                  f"over startup (x{result['growth_ratio']:.2f})  {result['seconds']:7.1f}s{flag}")
+        if args.json:
+            with open(args.json, 'w') as handle:
+                json.dump(results, handle, indent=2)
+            print(f"Results written to {args.json}")
+        if any(result['regression'] for result in results):
+            return 1
+    elif args.benchmark == 'startup':
+        results = benchmark_startup(args.symbols, args.years, args.modes)
+        for result in results:
+            print(f"{result['mode']:>9}: import main {result['import_seconds']:6.3f}s  RSS {result['import_rss_mb']:6.1f} MiB | "
+                  f"process {result['process_seconds']:6.2f}s  peak RSS {result['peak_rss_mb']:6.1f} MiB | "
+                  f"loaded: {', '.join(result['heavy_modules']) or '-'}")
+        if args.json:
+            with open(args.json, 'w') as handle:
+                json.dump(results, handle, indent=2)
+            print(f"Results written to {args.json}")
+    elif args.benchmark == 'fetch':
+        results = benchmark_fetch(args.symbols, args.years, args.interval, args.batch_sizes, args.latency,
+                                  args.jitter, args.failure_rate, args.hang_rate, args.hang_seconds, args.timeout,
+                                  args.modes, args.seed)
+        for result in results:
+            print(f"{result['mode']:>9} batch size {result['batch_size']:>4}: {result['fetched']}/{result['symbols']} "
+                  f"symbols in {result['seconds']:7.2f}s ({result['symbols_per_second']:7.1f}/s)  "
+                  f"p95 request {result['p95_request_seconds']:5.2f}s, slowest {result['max_request_seconds']:5.2f}s  "
+                  f"{result['server_requests']} server requests "
+                  f"({result['server_failures']} failed, {result['server_hangs']} held)  "
+                  f"peak concurrency {result['peak_concurrency']}")
+        if args.json:
+            with open(args.json, 'w') as handle:
+                json.dump(results, handle, indent=2)
+            print(f"Results written to {args.json}")
+    elif args.benchmark == 'logging':
+        results = benchmark_logging(args.symbols, args.years, args.scan_only, args.write_delay_ms, args.modes)
+        for result in results:
+            print(f"{result['mode']:>12}: {result['seconds']:7.2f}s  loop lag {result['loop_lag_seconds']:7.3f}s "
+                  f"(longest {result['max_loop_lag_seconds'] * 1000:6.1f} ms, {result['stalls']} stalls "
+                  f"= {result['stall_seconds']:6.3f}s)  {result['log_lines']} log lines")
+        if args.json:
+            with open(args.json, 'w') as handle:
+                json.dump(results, handle, indent=2)
+            print(f"Results written to {args.json}")
+    elif args.benchmark == 'connections':
+        results = benchmark_connections(args.requests, args.connect_latency, args.latency, args.modes)
+        for result in results:
+            print(f"{result['mode']:>18}: {result['requests']} requests on {result['connections']:>3} connections "
+                  f"in {result['seconds']:6.2f}s ({result['ms_per_request']:6.2f} ms/request)")
+        if args.json:
+            with open(args.json, 'w') as handle:
+                json.dump(results, handle, indent=2)
+            print(f"Results written to {args.json}")
+    elif args.benchmark == 'compare':
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+        with open(args.current) as handle:
+            current = json.load(handle)
+        if baseline.get('settings') != current.get('settings'):
+            print("Warning: the reports were produced with different suite settings")
+        rows = compare_reports(baseline, current, args.threshold)
+        for row in rows:
+            memory = f"x{row['memory_ratio']:.2f}" if row['memory_ratio'] is not None else "n/a"
+            time_ratio = f"x{row['time_ratio']:.2f}" if row['time_ratio'] is not None else "n/a"
+            flag = "  REGRESSION" if row['regression'] else ""
+            print(f"{row['symbols']:>5} symbols {row['stage']:<28} time {time_ratio:>7} memory {memory:>7}{flag}")
+        return 1 if any(row['regression'] for row in rows) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+DEFAULT_CHART_CACHE_FILENAME = "chart_cache.json"
+
+# Bump whenever plot_chart's styling changes so existing PNGs are re-rendered
+CHART_STYLE_VERSION = 2
+STYLE_KEYS = ('up_color', 'down_color', 'sma_50_color', 'sma_128_color')
+
+def chart_fingerprint(plot_frame, symbol, chart_config, interval, overlays=None):
+    """
+    Hash everything that determines a chart's pixels.
+
+    Args:
+        plot_frame (pandas.DataFrame): Rows actually drawn (see build_plot_frame)
+        symbol (str): Stock symbol (appears in the title)
+        chart_config (dict): Chart configuration (only the style keys are used)
+        interval (str): Data interval ('4h' or '1d')
+        overlays (list, optional): (column, color, panel) per indicator line
+
+    Returns:
+        str: Hex digest identifying the rendered image
+    """
+    digest = hashlib.sha256()
+    style = {key: chart_config.get(key) for key in STYLE_KEYS}
+    lines = [list(overlay) for overlay in overlays] if overlays is not None else None
+    digest.update(json.dumps([CHART_STYLE_VERSION, symbol, interval, style, lines], sort_keys=True).encode())
+    digest.update(plot_frame.index.asi8.tobytes())
+    digest.update(','.join(map(str, plot_frame.columns)).encode())
+    digest.update(np.ascontiguousarray(plot_frame.to_numpy(dtype=np.float64)).tobytes())
+    return digest.hexdigest()
+
+class ChartCache:
+    """
+    Tracks the fingerprint of every chart PNG in the output directory so unchanged
+    charts are not rendered again. (Telegram re-sends unchanged PNGs by file_id; see
+    TelegramManager, which keys uploads by image hash.)
+    """
+    def __init__(self, output_dir, filename=DEFAULT_CHART_CACHE_FILENAME):
+        """
+        Load the cache index.
+
+        Args:
+            output_dir (str): Directory holding the chart PNGs
+            filename (str): Name of the JSON index inside output_dir
+        """
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, filename)
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as handle:
+                    self.entries = json.load(handle)
+            except Exception as exc:
+                logging.error(f"Failed to load chart cache from {self.path}: {exc}. Starting fresh.")
+
+    @staticmethod
+    def _key(symbol, interval):
+        return f"{symbol}|{interval}"
+
+    def lookup(self, symbol, interval, fingerprint):
+        """
+        Return the cached chart path if the stored PNG matches the fingerprint.
+
+        Returns:
+            str or None: Path of the reusable PNG
+        """
+        entry = self.entries.get(self._key(symbol, interval))
+        if entry and entry.get('fingerprint') == fingerprint and os.path.exists(entry.get('path', '')):
+            self.hits += 1
+            return entry['path']
+        self.misses += 1
+        return None
+
+    def record(self, symbol, interval, fingerprint, path):
+        """
+        Remember a freshly rendered chart.
+        """
+        self.entries[self._key(symbol, interval)] = {
+            'symbol': symbol,
+            'interval': interval,
+            'fingerprint': fingerprint,
+            'path': path
+        }
+        self._dirty = True
+
+    def evict(self, active_symbols):
+        """
+        Drop entries (and their PNGs) for symbols no longer in the watchlist.
+
+        Args:
+            active_symbols (iterable): Symbols currently configured
+
+        Returns:
+            list: Evicted symbols
+        """
+        active = set(active_symbols)
+        evicted = set()
+        for key, entry in list(self.entries.items()):
+            if entry.get('symbol') in active:
+                continue
+            path = entry.get('path')
+            if path and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError as exc:
+                    logging.warning(f"Failed to remove stale chart {path}: {exc}")
+            del self.entries[key]
+            evicted.add(entry.get('symbol'))
+            self._dirty = True
+        if evicted:
+            logging.info(f"Evicted cached charts for removed symbols: {', '.join(sorted(evicted))}")
+        return sorted(evicted)
+
+    def save(self):
+        """
+        Persist the index if anything changed.
+        """
+        if not self._dirty:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        try:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, "w") as handle:
+                json.dump(self.entries, handle, indent=2)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except Exception as exc:
+            logging.error(f"Failed to persist chart cache to {self.path}: {exc}")
+
+    def begin_run(self):
+        """
+        Start a run: clear the hit/miss counts, so a long-lived cache reports each run alone.
+        """
+        self.hits = 0
+        self.misses = 0
+
+    def report(self):
+        """
+        Log hit/miss counts for the run.
+        """
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0.0
+        logging.info(f"Chart cache: {self.hits} hits, {self.misses} misses ({rate:.0f}% reused)")
@@ -1,10 +1,22 @@
-import mplfinance as mpf
 import pandas as pd
 import numpy as np
 import os
 import logging
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from chart_cache import chart_fingerprint
+from metrics import METRICS
+from indicator_registry import SIGNAL_INDICATORS, chart_overlays
 
-def generate_chart(data, symbol, output_dir, chart_config=None, interval='4h'):
+DEFAULT_CHART_CONFIG = {
+    'up_color': 'green',
+    'down_color': 'red',
+    'sma_50_color': 'blue',
+    'sma_128_color': 'orange'
+}
+
+def generate_chart(data, symbol, output_dir, chart_config=None, interval='4h', cache=None, indicators=None):
     """
     Generate a candlestick chart with technical indicators for a stock.
     
@@ -14,102 +26,53 @@ def generate_chart(data, symbol, output_dir, chart_config=None, interval='4h'):
         output_dir (str): Directory to save the chart
         chart_config (dict): Chart configuration
         interval (str): Data interval ('4h' or '1d')
+        cache (ChartCache, optional): Skip rendering when the existing PNG shows the same data
+        indicators (list, optional): IndicatorSpec list from the registry (defaults to SMA50 and SMA128)
         
     Returns:
         bool: True if successful, False otherwise
     """
     if chart_config is None:
-        chart_config = {
-            'up_color': 'green',
-            'down_color': 'red',
-            'sma_50_color': 'blue',
-            'sma_128_color': 'orange'
-        }
+        chart_config = DEFAULT_CHART_CONFIG
     
     try:
         # Ensure output directory exists
         os.makedirs(output_dir, exist_ok=True)
         
         # Define file path (include interval in filename)
-        filepath = os.path.join(output_dir, f"{symbol}_{interval}_chart.png")
+        filepath = chart_path(output_dir, symbol, interval)
         
         # Debug info
-        logging.info(f"Data shape: {data.shape}")
-        logging.info(f"Index type: {type(data.index)}")
+        logging.debug(f"Data shape: {data.shape}")
+        logging.debug(f"Index type: {type(data.index)}")
         
         # Convert index to datetime if not already
         if not isinstance(data.index, pd.DatetimeIndex):
-            logging.info("Converting index to DatetimeIndex")
+            logging.debug("Converting index to DatetimeIndex")
             data.index = pd.to_datetime(data.index)
         
-        # Create a new DataFrame with explicitly converted types to avoid mplfinance issues
-        new_data = pd.DataFrame(index=data.index)
-        new_data['Open'] = data['Open'].astype(np.float64)
-        new_data['High'] = data['High'].astype(np.float64)
-        new_data['Low'] = data['Low'].astype(np.float64)
-        new_data['Close'] = data['Close'].astype(np.float64)
-        new_data['Volume'] = data['Volume'].astype(np.float64)
-        new_data['SMA50'] = data['SMA50'].astype(np.float64)
-        new_data['SMA128'] = data['SMA128'].astype(np.float64)
-        
-        # Filter to visualize appropriate number of periods based on interval
-        if interval == '1d':
-            last_n_rows = min(30, len(new_data))  # 30 daily candles
-            background_color = '#262626'  # Slightly lighter background for daily charts
-            title_suffix = 'Daily Chart with SMAs'
-        else:  # 4h interval
-            last_n_rows = min(30 * 6, len(new_data))  # 6 4-hour candles per day
-            background_color = '#1f1f1f'  # Darker background for 4h charts
-            title_suffix = '4-Hour Chart with SMAs'
-            
-        data_to_plot = new_data.iloc[-last_n_rows:].copy()
+        overlays = chart_overlays(data, indicators or SIGNAL_INDICATORS, chart_config)
+        data_to_plot = build_plot_frame(data, interval, overlays)
         
-        logging.info(f"Plot data shape: {data_to_plot.shape}")
+        logging.debug(f"Plot data shape: {data_to_plot.shape}")
         
-        # Set colors
-        mc = mpf.make_marketcolors(
-            up=chart_config['up_color'],
-            down=chart_config['down_color'],
-            edge='inherit',
-            wick='inherit',
-            volume='inherit'
-        )
+        fingerprint = None
+        if cache is not None:
+            fingerprint = chart_fingerprint(data_to_plot, symbol, chart_config, interval, overlays)
+            if cache.lookup(symbol, interval, fingerprint):
+                METRICS.inc('chart_cache_hits_total', interval=interval)
+                logging.debug(f"{interval} chart for {symbol} is unchanged. Reusing {filepath}")
+                return True
+            METRICS.inc('chart_cache_misses_total', interval=interval)
         
-        # Set style with dark background - adjusted based on interval
-        s = mpf.make_mpf_style(
-            marketcolors=mc,
-            figcolor=background_color,    # Background varies by interval
-            facecolor='#2d2d2d',          # Dark plot area background
-            edgecolor='#444444',          # Edge color
-            gridcolor='#444444',          # Grid lines
-            gridstyle=':',                # Dotted grid
-            y_on_right=True,              # Price axis on right side
-            rc={'axes.labelcolor': 'white', 
-                'axes.edgecolor': 'white',
-                'xtick.color': 'white',
-                'ytick.color': 'white',
-                'text.color': 'white'}
-        )
+        with METRICS.timer('chart_render_seconds', symbol=symbol, interval=interval):
+            plot_chart(data_to_plot, symbol, filepath, chart_config, interval, overlays)
+        METRICS.inc('charts_rendered_total', interval=interval)
         
-        # Adjust line width based on interval
-        line_width = 2.0 if interval == '1d' else 2.5
-        
-        # Plot additional indicators
-        sma_50 = mpf.make_addplot(data_to_plot['SMA50'], color=chart_config['sma_50_color'], width=line_width)
-        sma_128 = mpf.make_addplot(data_to_plot['SMA128'], color=chart_config['sma_128_color'], width=line_width)
-        
-        # Create the plot
-        mpf.plot(
-            data_to_plot,
-            type='candle',
-            style=s,
-            title=f'{symbol} - {title_suffix}',
-            addplot=[sma_50, sma_128],
-            savefig=filepath,
-            figsize=(12, 8)
-        )
+        if cache is not None:
+            cache.record(symbol, interval, fingerprint, filepath)
         
-        logging.info(f"{interval} chart generated successfully for {symbol}. Saved to {filepath}")
+        logging.debug(f"{interval} chart generated successfully for {symbol}. Saved to {filepath}")
         return True
         
     except Exception as e:
@@ -119,4 +82,245 @@ def generate_chart(data, symbol, output_dir, chart_config=None, interval='4h'):
                 non_float = [x for x in data[col] if not isinstance(x, (float, int))]
                 if non_float:
                     logging.error(f"Non-numeric values in {col}: {non_float[:5]}")
-        return False 
\ No newline at end of file
+        return False
+
+def chart_window_rows(interval):
+    """
+    Number of candles shown on a chart for the given interval.
+    """
+    if interval == '1d':
+        return 30  # 30 daily candles
+    return 30 * 6  # 6 4-hour candles per day
+
+def build_plot_frame(data, interval, overlays=None):
+    """
+    Slice the rows that are actually drawn and convert them to the float64 columns mplfinance expects.
+    
+    Args:
+        data (pandas.DataFrame): Stock data with indicators
+        interval (str): Data interval ('4h' or '1d')
+        overlays (list, optional): (column, color, panel) per indicator line (defaults to SMA50 and SMA128)
+        
+    Returns:
+        pandas.DataFrame: Plot-ready frame with OHLCV and indicator columns
+    """
+    # Filter to visualize appropriate number of periods based on interval
+    window = data.iloc[-min(chart_window_rows(interval), len(data)):]
+    
+    # One float64 block of just the drawn rows (compact float32 inputs are only widened here)
+    indicator_columns = [column for column, _, _ in overlays] if overlays is not None else ['SMA50', 'SMA128']
+    columns = ['Open', 'High', 'Low', 'Close', 'Volume'] + indicator_columns
+    return pd.DataFrame(window[columns].to_numpy(dtype=np.float64), index=window.index, columns=columns, copy=False)
+
+def plot_chart(data_to_plot, symbol, filepath, chart_config, interval='4h', overlays=None):
+    """
+    Render a plot-ready frame to a PNG file.
+    
+    Args:
+        data_to_plot (pandas.DataFrame): Frame returned by build_plot_frame
+        symbol (str): Stock symbol
+        filepath (str): Destination PNG path
+        chart_config (dict): Chart configuration
+        interval (str): Data interval ('4h' or '1d')
+        overlays (list, optional): (column, color, panel) per indicator line (defaults to SMA50 and SMA128)
+    """
+    # The plotting stack is loaded by the first chart, so runs without charts never pay for it
+    import mplfinance as mpf
+    
+    if interval == '1d':
+        background_color = '#262626'  # Slightly lighter background for daily charts
+        title_suffix = 'Daily Chart with SMAs'
+    else:  # 4h interval
+        background_color = '#1f1f1f'  # Darker background for 4h charts
+        title_suffix = '4-Hour Chart with SMAs'
+    
+    # Set colors
+    mc = mpf.make_marketcolors(
+        up=chart_config['up_color'],
+        down=chart_config['down_color'],
+        edge='inherit',
+        wick='inherit',
+        volume='inherit'
+    )
+    
+    # Set style with dark background - adjusted based on interval
+    s = mpf.make_mpf_style(
+        marketcolors=mc,
+        figcolor=background_color,    # Background varies by interval
+        facecolor='#2d2d2d',          # Dark plot area background
+        edgecolor='#444444',          # Edge color
+        gridcolor='#444444',          # Grid lines
+        gridstyle=':',                # Dotted grid
+        y_on_right=True,              # Price axis on right side
+        rc={'axes.labelcolor': 'white', 
+            'axes.edgecolor': 'white',
+            'xtick.color': 'white',
+            'ytick.color': 'white',
+            'text.color': 'white'}
+    )
+    
+    # Adjust line width based on interval
+    line_width = 2.0 if interval == '1d' else 2.5
+    
+    # Plot additional indicators
+    if overlays is None:
+        overlays = [('SMA50', chart_config['sma_50_color'], 0), ('SMA128', chart_config['sma_128_color'], 0)]
+    addplots = [mpf.make_addplot(data_to_plot[column], color=color, width=line_width, panel=panel)
+                for column, color, panel in overlays]
+    
+    # Create the plot
+    mpf.plot(
+        data_to_plot,
+        type='candle',
+        style=s,
+        title=f'{symbol} - {title_suffix}',
+        addplot=addplots,
+        savefig=filepath,
+        figsize=(12, 8)
+    )
+
+def chart_path(output_dir, symbol, interval):
+    """
+    Path of the PNG written for a symbol and interval.
+    """
+    return os.path.join(output_dir, f"{symbol}_{interval}_chart.png")
+
+def build_chart_payload(data, symbol, output_dir, chart_config=None, interval='4h', indicators=None):
+    """
+    Package the rows actually drawn (not the full buffered history) for a render worker.
+    
+    Args:
+        data (pandas.DataFrame): Stock data with indicators
+        symbol (str): Stock symbol
+        output_dir (str): Directory to save the chart
+        chart_config (dict): Chart configuration
+        interval (str): Data interval ('4h' or '1d')
+        indicators (list, optional): IndicatorSpec list from the registry (defaults to SMA50 and SMA128)
+        
+    Returns:
+        dict: Picklable payload for render_chart_payload
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if not isinstance(data.index, pd.DatetimeIndex):
+        data = data.set_axis(pd.to_datetime(data.index))
+    chart_config = dict(chart_config or DEFAULT_CHART_CONFIG)
+    overlays = chart_overlays(data, indicators or SIGNAL_INDICATORS, chart_config)
+    return {
+        'data': build_plot_frame(data, interval, overlays),
+        'symbol': symbol,
+        'filepath': chart_path(output_dir, symbol, interval),
+        'chart_config': chart_config,
+        'interval': interval,
+        'overlays': overlays
+    }
+
+def render_chart_payload(payload):
+    """
+    Render a payload built by build_chart_payload. Runs inside render worker processes.
+    
+    Returns:
+        tuple: (chart path, True if the chart was written)
+    """
+    try:
+        plot_chart(payload['data'], payload['symbol'], payload['filepath'],
+                   payload['chart_config'], payload['interval'], payload.get('overlays'))
+        return payload['filepath'], True
+    except Exception as e:
+        logging.error(f"Error generating {payload['interval']} chart for {payload['symbol']}: {str(e)}")
+        return payload['filepath'], False
+
+def _warm_render_worker():
+    # Load the plotting stack once per worker instead of on the first chart
+    import matplotlib
+    matplotlib.use('Agg')
+    import mplfinance  # noqa: F401
+
+def start_render_thread():
+    """
+    A single thread that renders charts in-process without blocking the event loop.
+    
+    matplotlib is not thread-safe, so in-process charts are drawn one at a time.
+    
+    Returns:
+        concurrent.futures.ThreadPoolExecutor: The render thread
+    """
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix='render', initializer=_warm_render_worker)
+
+def _worker_ready():
+    return os.getpid()
+
+class ChartRenderPool:
+    """
+    Renders charts in a pool of worker processes so all cores are used.
+    """
+    def __init__(self, workers=None):
+        """
+        Start the worker processes with the plotting stack already imported.
+        
+        Args:
+            workers (int, optional): Number of worker processes (defaults to the CPU count)
+        """
+        self.workers = workers or os.cpu_count() or 1
+        # Spawn rather than fork: the parent may already run background threads
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_warm_render_worker
+        )
+        # Workers are spawned on demand: submitting one no-op per slot before any of them can
+        # finish starts every worker, and waiting for the results means all have imported mplfinance
+        ready = [self._executor.submit(_worker_ready) for _ in range(self.workers)]
+        for future in ready:
+            future.result()
+        logging.info(f"Chart render pool started with {self.workers} workers")
+    
+    async def render(self, data, symbol, output_dir, chart_config=None, interval='4h', cache=None, indicators=None):
+        """
+        Render a chart in a worker process without blocking the event loop.
+        
+        Args:
+            data (pandas.DataFrame): Stock data with indicators
+            symbol (str): Stock symbol
+            output_dir (str): Directory to save the chart
+            chart_config (dict): Chart configuration
+            interval (str): Data interval ('4h' or '1d')
+            cache (ChartCache, optional): Skip rendering when the existing PNG shows the same data
+            indicators (list, optional): IndicatorSpec list from the registry
+            
+        Returns:
+            tuple: (chart path, True if the chart was written)
+        """
+        try:
+            payload = build_chart_payload(data, symbol, output_dir, chart_config, interval, indicators)
+        except Exception as e:
+            logging.error(f"Error preparing {interval} chart for {symbol}: {str(e)}")
+            return chart_path(output_dir, symbol, interval), False
+        
+        fingerprint = None
+        if cache is not None:
+            fingerprint = chart_fingerprint(payload['data'], symbol, payload['chart_config'], interval,
+                                            payload['overlays'])
+            if cache.lookup(symbol, interval, fingerprint):
+                METRICS.inc('chart_cache_hits_total', interval=interval)
+                logging.debug(f"{interval} chart for {symbol} is unchanged. Reusing {payload['filepath']}")
+                return payload['filepath'], True
+            METRICS.inc('chart_cache_misses_total', interval=interval)
+        
+        loop = asyncio.get_running_loop()
+        # Timed from the parent, so it includes waiting for a free worker
+        with METRICS.timer('chart_render_seconds', symbol=symbol, interval=interval):
+            filepath, success = await loop.run_in_executor(self._executor, render_chart_payload, payload)
+        if success:
+            METRICS.inc('charts_rendered_total', interval=interval)
+        if success and cache is not None:
+            cache.record(symbol, interval, fingerprint, filepath)
+        if success:
+            logging.debug(f"{interval} chart generated successfully for {symbol}. Saved to {filepath}")
+        return filepath, success
+    
+    def shutdown(self):
+        """
+        Stop the worker processes.
+        """
+        self._executor.shutdown(wait=True)
+
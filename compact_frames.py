@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+# The only price columns any stage reads
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+COMPACT_DTYPE = np.float32
+
+def is_compact(data):
+    """
+    Whether a frame uses the compact representation (every column float32).
+    """
+    return data is not None and len(data.columns) > 0 and all(dtype == COMPACT_DTYPE for dtype in data.dtypes)
+
+def compact_ohlcv(data):
+    """
+    Keep only the OHLCV columns, stored as one contiguous float32 block.
+
+    Volume is stored as float32 too: int32 overflows for the busiest tickers, and
+    float32's 24-bit mantissa is far more precise than a volume bar can show.
+
+    Args:
+        data (pandas.DataFrame): Downloaded OHLCV history
+
+    Returns:
+        pandas.DataFrame: Compact frame (the input itself if it is already compact)
+    """
+    if data is None or is_compact(data) and list(data.columns) == [c for c in PRICE_COLUMNS if c in data.columns]:
+        return data
+    columns = [column for column in PRICE_COLUMNS if column in data.columns]
+    block = np.ascontiguousarray(data[columns].to_numpy(dtype=COMPACT_DTYPE))
+    return pd.DataFrame(block, index=data.index, columns=columns, copy=False)
+
+def compact_indicator_frame(data, indicators):
+    """
+    Join compact OHLCV rows and indicator columns into one float32 block.
+
+    Rows with a gap in any column (the indicator warm-up) are left out before the
+    block is allocated, so only the rows that are kept are copied.
+
+    Args:
+        data (pandas.DataFrame): Compact OHLCV frame
+        indicators (dict): Column name -> values aligned with data's rows
+
+    Returns:
+        pandas.DataFrame: Compact frame with the OHLCV and indicator columns
+    """
+    columns = [column for column in PRICE_COLUMNS if column in data.columns]
+    prices = data[columns].to_numpy()
+    values = [np.asarray(series, dtype=np.float64) for series in indicators.values()]
+
+    valid = ~np.isnan(prices).any(axis=1)
+    for series in values:
+        valid &= ~np.isnan(series)
+
+    block = np.empty((int(valid.sum()), len(columns) + len(values)), dtype=COMPACT_DTYPE)
+    block[:, :len(columns)] = prices[valid]
+    for offset, series in enumerate(values):
+        block[:, len(columns) + offset] = series[valid]
+    return pd.DataFrame(block, index=data.index[valid], columns=columns + list(indicators), copy=False)
@@ -100,13 +100,38 @@ def validate_config(config):
         'up_color': 'green',
         'down_color': 'red',
         'sma_50_color': 'blue',
-        'sma_128_color': 'orange'
+        'sma_128_color': 'orange',
+        'only_active_signals': False,
+        'render_workers': 0,
+        'cache_enabled': True
     }
     
     for key, default_value in chart_defaults.items():
         if key not in config['chart']:
             config['chart'][key] = default_value
     
+    if 'data' not in config:
+        config['data'] = {}
+    
+    data_defaults = {
+        'batch_size': 50,
+        'cache_enabled': True,
+        'derive_daily': False,
+        'compact': False,
+        'source': 'yfinance',
+        'replay_directory': './recordings',
+        'source_url': 'http://127.0.0.1:8765',
+        'source_timeout': 30,
+        'record_directory': ''
+    }
+    
+    for key, default_value in data_defaults.items():
+        if key not in config['data']:
+            config['data'][key] = default_value
+    
+    if not config['data'].get('cache_directory'):
+        config['data']['cache_directory'] = os.path.join(config['output']['directory'], 'ohlcv_cache')
+    
     if 'notifications' not in config:
         config['notifications'] = {}
     
@@ -114,7 +139,10 @@ def validate_config(config):
         'enabled': True,
         'near_cross_threshold_pct': 0.75,
         'cooldown_hours': 6,
-        'alignment_enabled': True
+        'alignment_enabled': True,
+        'state_backend': 'sqlite',
+        'history_enabled': True,
+        'history_retention_days': 365
     }
     
     for key, default_value in notifications_defaults.items():
@@ -124,3 +152,117 @@ def validate_config(config):
     if not config['notifications'].get('state_file'):
         output_dir = config['output']['directory']
         config['notifications']['state_file'] = os.path.join(output_dir, 'signal_state.json')
+    
+    if not config['notifications'].get('state_db'):
+        # An existing state_file is imported into the database on first use
+        state_dir = os.path.dirname(config['notifications']['state_file'])
+        config['notifications']['state_db'] = os.path.join(state_dir, 'signal_state.db')
+    
+    if not config['notifications'].get('history_db'):
+        state_dir = os.path.dirname(config['notifications']['state_db'])
+        config['notifications']['history_db'] = os.path.join(state_dir, 'signal_history.db')
+    
+    if 'indicators' not in config:
+        config['indicators'] = {}
+    
+    if 'incremental' not in config['indicators']:
+        config['indicators']['incremental'] = True
+    
+    if not config['indicators'].get('definitions'):
+        # Checked when the indicator registry is built; SMA50/SMA128 are always added for the signals
+        config['indicators']['definitions'] = {
+            'default': [
+                {'name': 'SMA50', 'kind': 'sma', 'window': 50},
+                {'name': 'SMA128', 'kind': 'sma', 'window': 128}
+            ]
+        }
+    
+    if not config['indicators'].get('state_file'):
+        # Kept next to the signal state so both are restored together
+        state_dir = os.path.dirname(config['notifications']['state_file'])
+        config['indicators']['state_file'] = os.path.join(state_dir, 'indicator_state.npz')
+    
+    if 'pipeline' not in config:
+        config['pipeline'] = {}
+    
+    pipeline_defaults = {
+        # yfinance downloads share module-level state, so fetches run one at a time
+        'fetch_concurrency': 1,
+        'analyze_concurrency': 1,
+        'render_concurrency': 0,
+        'deliver_concurrency': 1,
+        'queue_size': 8,
+        'streaming': False,
+        'max_in_flight': 16
+    }
+    
+    for key, default_value in pipeline_defaults.items():
+        if key not in config['pipeline']:
+            config['pipeline'][key] = default_value
+    
+    if 'fetch' not in config:
+        config['fetch'] = {}
+    
+    fetch_defaults = {
+        'timeout': 20,
+        'deadline': 60,
+        'retries': 2,
+        'backoff_base': 0.5,
+        'backoff_max': 8,
+        'breaker_threshold': 5,
+        'breaker_reset': 60,
+        'max_concurrency': 8,
+        'latency_target': 5
+    }
+    
+    for key, default_value in fetch_defaults.items():
+        if key not in config['fetch']:
+            config['fetch'][key] = default_value
+    
+    if 'http' not in config:
+        config['http'] = {}
+    
+    http_defaults = {
+        'pool_size': 16,
+        'keepalive_seconds': 60,
+        'http2': True
+    }
+    
+    for key, default_value in http_defaults.items():
+        if key not in config['http']:
+            config['http'][key] = default_value
+    
+    if 'metrics' not in config:
+        config['metrics'] = {}
+    
+    metrics_defaults = {
+        'report_enabled': True,
+        # The endpoint only serves --schedule runs and listens on localhost unless told otherwise
+        'http_enabled': False,
+        'http_host': '127.0.0.1',
+        'http_port': 9108
+    }
+    
+    for key, default_value in metrics_defaults.items():
+        if key not in config['metrics']:
+            config['metrics'][key] = default_value
+    
+    if not config['metrics'].get('report_file'):
+        config['metrics']['report_file'] = os.path.join(config['output']['directory'], 'run_report.json')
+    
+    if 'logging' not in config:
+        config['logging'] = {}
+    
+    logging_defaults = {
+        'level': 'INFO',
+        'debug_sample_every': 20,
+        'file': 'plotin.log',
+        'max_bytes': 10 * 1024 * 1024,
+        'backup_count': 5,
+        'console': True,
+        'queued': True
+    }
+    
+    for key, default_value in logging_defaults.items():
+        if key not in config['logging']:
+            config['logging'][key] = default_value
@@ -1,64 +1,408 @@
-import yfinance as yf
+import functools
 import pandas as pd
 import logging
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+from time import perf_counter
+from ohlcv_cache import merge_history, align_timestamp
+from compact_frames import compact_ohlcv
+from metrics import METRICS
 
-# Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+DEFAULT_BATCH_SIZE = 50
 
-def get_stock_data(symbol, period_days=30, interval='4h'):
+# How far back Yahoo serves each intraday interval (days)
+INTRADAY_HISTORY_LIMIT_DAYS = {
+    '1m': 7, '2m': 60, '5m': 60, '15m': 60, '30m': 60, '90m': 60,
+    '60m': 730, '1h': 730, '4h': 730
+}
+
+# Column aggregations used when building coarser bars
+OHLCV_AGGREGATIONS = {
+    'Open': 'first',
+    'High': 'max',
+    'Low': 'min',
+    'Close': 'last',
+    'Adj Close': 'last',
+    'Volume': 'sum'
+}
+
+# Weekend plus a market holiday: a derived daily series starting this many days after the
+# daily window start still counts as reaching back far enough
+DAILY_COVERAGE_SLACK_DAYS = 4
+
+def get_history_window(period_days, interval):
     """
-    Retrieve historical stock data using yfinance.
+    Compute the download window for an interval, including the indicator buffer.
     
     Args:
-        symbol (str): Stock symbol (e.g., 'AAPL')
         period_days (int): Number of days of historical data to retrieve
-        interval (str): Data interval (e.g., '4h' for 4-hour intervals)
+        interval (str): Data interval (e.g., '4h' or '1d')
         
     Returns:
-        pandas.DataFrame: Historical stock data or None if retrieval fails
+        tuple: (start datetime including buffer, end datetime)
     """
-    try:
-        # Calculate start and end dates
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=period_days)
+    # Calculate start and end dates
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=period_days)
+    
+    # Add extra days to ensure we have enough data for indicators
+    # For daily charts: need at least 128 days of history for the 128 SMA
+    # For 4h charts: need at least 128 periods (roughly 21 days, but add extra for weekends/gaps)
+    if interval == '1d':
+        # For daily data, ensure we have at least 200 days of history (128 + buffer)
+        buffer_days = 200  
+    else:
+        # For 4h data, add 150 days buffer (was already working well)
+        buffer_days = 150
         
-        # Add extra days to ensure we have enough data for indicators
-        # For daily charts: need at least 128 days of history for the 128 SMA
-        # For 4h charts: need at least 128 periods (roughly 21 days, but add extra for weekends/gaps)
-        if interval == '1d':
-            # For daily data, ensure we have at least 200 days of history (128 + buffer)
-            buffer_days = 200  
-        else:
-            # For 4h data, add 150 days buffer (was already working well)
-            buffer_days = 150
-            
-        buffer_start_date = start_date - timedelta(days=buffer_days)
+    return start_date - timedelta(days=buffer_days), end_date
+
+def is_intraday(interval):
+    """
+    Whether an interval is finer than one session.
+    """
+    return interval in INTRADAY_HISTORY_LIMIT_DAYS
+
+def resample_ohlcv(data, interval='1d'):
+    """
+    Aggregate OHLCV bars into coarser bars without letting a bar span two sessions.
+    
+    Bars are grouped by their session date in the index's own (exchange) timezone.
+    Intraday targets such as '4h' from '1h' are anchored at each session's first bar,
+    the same way Yahoo aligns its own intraday bars.
+    
+    Args:
+        data (pandas.DataFrame): Finer-grained OHLCV history
+        interval (str): Target interval ('1d', '1wk' or an intraday interval like '4h')
+        
+    Returns:
+        pandas.DataFrame: Resampled history (daily and weekly bars use a tz-naive date index,
+            like a direct yfinance download)
+    """
+    if data is None or data.empty:
+        return data
+    
+    data = data.dropna(how='all')
+    index = data.index
+    local = index.tz_localize(None) if index.tz is not None else index
+    sessions = local.normalize()
+    
+    if interval == '1d':
+        keys = sessions
+    elif interval == '1wk':
+        # Yahoo labels weekly bars with the Monday of the week
+        keys = sessions - pd.to_timedelta(sessions.dayofweek, unit='D')
+    else:
+        step = pd.Timedelta(interval)
+        session_open = pd.DatetimeIndex(pd.Series(index).groupby(sessions.values).transform('min'))
+        keys = session_open + ((index - session_open) // step) * step
+    
+    aggregations = {column: how for column, how in OHLCV_AGGREGATIONS.items() if column in data.columns}
+    resampled = data.groupby(keys).agg(aggregations)
+    resampled.index.name = 'Date' if interval in ('1d', '1wk') else index.name
+    return resampled[[column for column in data.columns if column in aggregations]]
+
+def validate_resampled(resampled, direct, tolerance_pct=0.5, columns=('Open', 'High', 'Low', 'Close')):
+    """
+    Compare derived daily bars with bars downloaded directly at the daily interval.
+    
+    Volume is not compared by default: Yahoo's daily volume includes auction prints
+    that never appear in intraday bars.
+    
+    Args:
+        resampled (pandas.DataFrame): Output of resample_ohlcv
+        direct (pandas.DataFrame): Daily bars from the data source
+        tolerance_pct (float): Largest acceptable relative difference per price
+        columns (tuple): Columns to compare
         
-        logging.info(f"Retrieving {interval} data for {symbol} from {buffer_start_date.date()} to {end_date.date()}")
+    Returns:
+        dict: Sessions compared, sessions missing from either side, worst deviation per column
+            (in percent) and an overall 'ok' flag
+    """
+    direct_index = direct.index.tz_localize(None) if direct.index.tz is not None else direct.index
+    direct = direct.set_axis(direct_index.normalize())
+    common = resampled.index.intersection(direct.index)
+    
+    deviations = {}
+    for column in columns:
+        if column not in resampled.columns or column not in direct.columns:
+            continue
+        expected = direct.loc[common, column].astype(float)
+        derived = resampled.loc[common, column].astype(float)
+        deviation = ((derived - expected).abs() / expected.abs()).max() * 100 if len(common) else 0.0
+        deviations[column] = float(deviation)
+    
+    # The daily download may include a session the intraday window starts after (and vice versa)
+    missing_derived = direct.index.difference(resampled.index)
+    missing_direct = resampled.index.difference(direct.index)
+    return {
+        'sessions': len(common),
+        'missing_from_resampled': [str(date.date()) for date in missing_derived],
+        'missing_from_direct': [str(date.date()) for date in missing_direct],
+        'max_deviation_pct': deviations,
+        'ok': bool(len(common)) and all(value <= tolerance_pct for value in deviations.values())
+    }
+
+def normalize_columns(data):
+    """
+    Drop the ticker level that recent yfinance releases add to single-symbol downloads.
+    
+    Args:
+        data (pandas.DataFrame): Downloaded history
         
-        # Download data
-        data = yf.download(
+    Returns:
+        pandas.DataFrame: History with flat column names
+    """
+    if isinstance(data.columns, pd.MultiIndex) and data.columns.nlevels == 2:
+        for level in (1, 0):
+            if len(data.columns.get_level_values(level).unique()) == 1 and \
+                    'Close' not in data.columns.get_level_values(level):
+                return data.droplevel(level, axis=1)
+    return data
+
+def _yfinance_download():
+    # yfinance is imported on the first download rather than at startup
+    import yfinance as yf
+    from http_pool import yfinance_session
+    # Every download goes through the process-wide connection pool (see http_pool)
+    session = yfinance_session()
+    return functools.partial(yf.download, session=session) if session is not None else yf.download
+
+def _record_download(interval, mode, start, data=None, failed=False):
+    # Bytes are those of the decoded frame; yfinance does not expose the response size
+    METRICS.observe('fetch_seconds', perf_counter() - start, interval=interval, mode=mode)
+    METRICS.inc('fetch_requests_total', interval=interval, mode=mode)
+    if failed:
+        METRICS.inc('fetch_errors_total', interval=interval, mode=mode)
+    elif data is not None and not data.empty:
+        METRICS.inc('fetch_rows_total', len(data), interval=interval)
+        METRICS.inc('fetch_bytes_total', int(data.memory_usage(index=True).sum()), interval=interval)
+
+def download_symbol(symbol, start, end, interval, downloader=None):
+    """
+    Download one symbol's history between two dates.
+    
+    Args:
+        symbol (str): Stock symbol
+        start (datetime): First date to request
+        end (datetime): Last date to request
+        interval (str): Data interval
+        downloader (callable, optional): Source called like yf.download (see data_sources; yfinance by default)
+        
+    Returns:
+        pandas.DataFrame: Downloaded history or None if nothing was returned
+    """
+    downloader = downloader or _yfinance_download()
+    request_start = perf_counter()
+    try:
+        data = downloader(
             symbol,
-            start=buffer_start_date,
-            end=end_date,
+            start=start,
+            end=end,
             interval=interval,
             progress=False
         )
-        
-        if data.empty:
-            logging.error(f"No data found for {symbol}")
-            return None
-            
-        logging.info(f"Successfully retrieved {len(data)} data points for {symbol}")
-        return data
-        
     except Exception as e:
+        _record_download(interval, 'single', request_start, failed=True)
         logging.error(f"Error retrieving data for {symbol}: {str(e)}")
         return None
+    _record_download(interval, 'single', request_start, data)
+    
+    if data is None or data.empty:
+        return None
+    return normalize_columns(data)
+
+def get_stock_data(symbol, period_days=30, interval='4h', downloader=None, cache=None):
+    """
+    Retrieve historical stock data from yfinance or another data source.
+    
+    Args:
+        symbol (str): Stock symbol (e.g., 'AAPL')
+        period_days (int): Number of days of historical data to retrieve
+        interval (str): Data interval (e.g., '4h' for 4-hour intervals)
+        downloader (callable, optional): Source called like yf.download (see data_sources; yfinance by default)
+        cache (OHLCVCache, optional): Local store to read first and top up incrementally
+        
+    Returns:
+        pandas.DataFrame: Historical stock data or None if retrieval fails
+    """
+    return get_multiple_stocks_data([symbol], period_days, interval, downloader=downloader, cache=cache).get(symbol)
+
+
+def split_batch_frame(data, symbols):
+    """
+    Split a multi-ticker download into one frame per symbol.
+    
+    Args:
+        data (pandas.DataFrame): Result of a bulk download (ticker/field column MultiIndex)
+        symbols (list): Symbols requested in the batch
+        
+    Returns:
+        dict: Dictionary mapping symbols to their non-empty data frames
+    """
+    frames = {}
+    if data is None or data.empty:
+        return frames
+    
+    if not isinstance(data.columns, pd.MultiIndex):
+        # Older yfinance releases return flat columns for a single ticker
+        if len(symbols) == 1:
+            frame = data.dropna(how='all')
+            if not frame.empty:
+                frames[symbols[0]] = frame
+        return frames
+    
+    # Locate the level holding the tickers (group_by='ticker' puts it first)
+    ticker_level = 0 if set(symbols) & set(data.columns.get_level_values(0)) else 1
+    available = set(data.columns.get_level_values(ticker_level))
+    
+    for symbol in symbols:
+        if symbol not in available:
+            continue
+        frame = data.xs(symbol, axis=1, level=ticker_level)
+        # Tickers trading on different calendars leave all-NaN rows in the shared index
+        frame = frame.dropna(how='all')
+        if not frame.empty:
+            frames[symbol] = frame
+    
+    return frames
+
+def download_batch(symbols, start, end, interval, downloader=None):
+    """
+    Download several symbols' history with a single bulk request.
+    
+    Args:
+        symbols (list): List of stock symbols
+        start (datetime): First date to request
+        end (datetime): Last date to request
+        interval (str): Data interval
+        downloader (callable, optional): Source called like yf.download (see data_sources; yfinance by default)
+        
+    Returns:
+        dict: Dictionary mapping symbols to their data frames (symbols without data are omitted)
+    """
+    downloader = downloader or _yfinance_download()
+    request_start = perf_counter()
+    try:
+        data = downloader(
+            list(symbols),
+            start=start,
+            end=end,
+            interval=interval,
+            group_by='ticker',
+            progress=False
+        )
+        _record_download(interval, 'batch', request_start, data)
+        return split_batch_frame(data, list(symbols))
+    except Exception as e:
+        _record_download(interval, 'batch', request_start, failed=True)
+        logging.error(f"Error retrieving batch data for {', '.join(symbols)}: {str(e)}")
+        return {}
+
+def download_range(symbols, start, end, interval, batch_size=None, downloader=None):
+    """
+    Download history for many symbols between two dates.
+    
+    When batch_size is greater than one, symbols are fetched in bulk downloads of
+    up to batch_size tickers each, and only the tickers that come back empty are
+    retried individually.
+    
+    Returns:
+        dict: Dictionary mapping symbols to their data frames (symbols without data are omitted)
+    """
+    stock_data = {}
+    
+    if batch_size and batch_size > 1 and len(symbols) > 1:
+        batches = [symbols[offset:offset + batch_size] for offset in range(0, len(symbols), batch_size)]
+        for frames in _map_requests(lambda batch: download_batch(batch, start, end, interval, downloader),
+                                    batches, downloader):
+            stock_data.update(frames)
+        
+        missing = [symbol for symbol in symbols if symbol not in stock_data]
+        if missing:
+            logging.warning(f"Bulk download returned no {interval} data for {', '.join(missing)}. Retrying individually.")
+    else:
+        missing = list(symbols)
+    
+    skipped = []
+    
+    def fetch_symbol(symbol):
+        # Once the source's circuit opens, the rest of the watchlist is not requested
+        if getattr(downloader, 'circuit_open', False):
+            skipped.append(symbol)
+            return None
+        return download_symbol(symbol, start, end, interval, downloader)
+    
+    for symbol, data in zip(missing, _map_requests(fetch_symbol, missing, downloader)):
+        if data is not None:
+            stock_data[symbol] = data
+    if skipped:
+        logging.warning(f"Skipped {len(skipped)} {interval} downloads: the data source's circuit is open")
+    
+    return stock_data
 
+def _map_requests(request, items, downloader):
+    """
+    Run request over items, several at a time when the downloader allows it.
+    
+    A ResilientFetcher over a thread-safe source advertises max_concurrency and keeps the
+    requests actually in flight under its adaptive limit; other downloaders run serially.
+    
+    Returns:
+        list: Results in the order of items
+    """
+    workers = min(int(getattr(downloader, 'max_concurrency', 1) or 1), len(items))
+    if workers <= 1:
+        return [request(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fetch-request') as pool:
+        return list(pool.map(request, items))
 
-def get_multiple_stocks_data(symbols, period_days=30, interval='4h'):
+def _refresh_from_cache(symbols, start, end, interval, batch_size, downloader, cache):
+    """
+    Serve symbols from the local cache, downloading only the candles after each cached tail.
+    
+    Returns:
+        tuple: (dict of refreshed frames, list of symbols that need a full download)
+    """
+    cached_frames = {}
+    cold = []
+    for symbol in symbols:
+        cached, covered_start = cache.load(symbol, interval)
+        if cached is None or cached.empty or covered_start > pd.Timestamp(start):
+            cold.append(symbol)
+        else:
+            cached_frames[symbol] = cached
+    
+    METRICS.inc('ohlcv_cache_hits_total', len(cached_frames), interval=interval)
+    METRICS.inc('ohlcv_cache_misses_total', len(cold), interval=interval)
+    if not cached_frames:
+        return {}, cold
+    
+    # Re-request each symbol from its own cached tail (minus a day of overlap) so the last,
+    # possibly still-forming candle is replaced by its final values. Symbols whose tails
+    # fall on the same day share a download; a stale symbol does not widen the others'.
+    groups = {}
+    for symbol, frame in cached_frames.items():
+        tail = pd.Timestamp(frame.index[-1])
+        tail = tail.tz_convert(None) if tail.tzinfo else tail
+        groups.setdefault((tail - timedelta(days=1)).normalize(), []).append(symbol)
+    
+    fresh = {}
+    for tail_start, group in sorted(groups.items()):
+        logging.info(f"Cache hit for {len(group)} {interval} symbols. Fetching candles since {tail_start.date()}")
+        fresh.update(download_range(group, tail_start.to_pydatetime(), end, interval, batch_size, downloader))
+    
+    refreshed = {}
+    for symbol, cached in cached_frames.items():
+        # Candles before this run's window (time_period plus the indicator buffer) are dropped
+        merged = merge_history(cached, fresh.get(symbol), start)
+        if symbol in fresh or len(merged) < len(cached):
+            cache.store_async(symbol, interval, merged, start)
+        refreshed[symbol] = merged
+    return refreshed, cold
+
+def get_multiple_stocks_data(symbols, period_days=30, interval='4h', batch_size=None, downloader=None, cache=None,
+                            window=None, compact=False):
     """
     Retrieve data for multiple stock symbols.
     
@@ -66,15 +410,143 @@ def get_multiple_stocks_data(symbols, period_days=30, interval='4h'):
         symbols (list): List of stock symbols
         period_days (int): Number of days of historical data to retrieve
         interval (str): Data interval
+        batch_size (int, optional): Number of symbols per bulk download
+        downloader (callable, optional): Source called like yf.download (see data_sources; yfinance by default)
+        cache (OHLCVCache, optional): Local store to read first and top up incrementally
+        window (tuple, optional): (start, end) overriding get_history_window
+        compact (bool): Return only the OHLCV columns as float32 blocks (see compact_frames)
         
     Returns:
         dict: Dictionary mapping symbols to their respective data frames
     """
+    buffer_start_date, end_date = window or get_history_window(period_days, interval)
     stock_data = {}
+    pending = list(symbols)
+    
+    if cache is not None:
+        stock_data, pending = _refresh_from_cache(pending, buffer_start_date, end_date, interval,
+                                                  batch_size, downloader, cache)
+    
+    if pending:
+        logging.info(f"Retrieving {interval} data for {len(pending)} symbols from {buffer_start_date.date()} to {end_date.date()}")
+        downloaded = download_range(pending, buffer_start_date, end_date, interval, batch_size, downloader)
+        for symbol, data in downloaded.items():
+            logging.debug(f"Successfully retrieved {len(data)} data points for {symbol}")
+            if cache is not None:
+                # Cold entries are written by the background writer so delivery is not held up
+                cache.store_async(symbol, interval, data, buffer_start_date)
+        stock_data.update(downloaded)
     
+    result = {}
     for symbol in symbols:
-        data = get_stock_data(symbol, period_days, interval)
-        if data is not None:
-            stock_data[symbol] = data
+        if symbol not in stock_data:
+            logging.error(f"No data found for {symbol}")
+            continue
+        data = stock_data[symbol]
+        if cache is not None:
+            # Cached history may reach further back than this run's window
+            data = data[data.index >= align_timestamp(buffer_start_date, data.index)]
+        result[symbol] = compact_ohlcv(data) if compact else data
+    return result
+
+def get_daily_and_intraday_data(symbols, period_days=30, interval='4h', batch_size=None, downloader=None, cache=None,
+                                compact=False):
+    """
+    Retrieve intraday history once and derive the daily series from it.
     
-    return stock_data 
\ No newline at end of file
+    The intraday download is stretched to cover the daily window (as far as Yahoo
+    serves that interval), and daily bars are resampled from it. A daily download is
+    only made for symbols whose intraday history does not reach back to the start of
+    the daily window (recent listings, or intervals Yahoo keeps for 60 days only),
+    and it only covers the sessions before the intraday history begins.
+    
+    Args:
+        symbols (list): List of stock symbols
+        period_days (int): Number of days of historical data to retrieve
+        interval (str): Intraday data interval
+        batch_size (int, optional): Number of symbols per bulk download
+        downloader (callable, optional): Source called like yf.download (see data_sources; yfinance by default)
+        cache (OHLCVCache, optional): Local store for the intraday history
+        compact (bool): Return only the OHLCV columns as float32 blocks (see compact_frames)
+        
+    Returns:
+        tuple: (dict of daily frames, dict of intraday frames), both keyed by symbol
+    """
+    if not is_intraday(interval):
+        daily_data = get_multiple_stocks_data(symbols, period_days, '1d', batch_size, downloader, cache, compact=compact)
+        return daily_data, get_multiple_stocks_data(symbols, period_days, interval, batch_size, downloader, cache,
+                                                    compact=compact)
+    
+    daily_start, end_date = get_history_window(period_days, '1d')
+    intraday_start, _ = get_history_window(period_days, interval)
+    oldest_served = end_date - timedelta(days=INTRADAY_HISTORY_LIMIT_DAYS[interval] - 1)
+    # Start at midnight so the first session is not cut in half
+    fetch_start = datetime.combine(min(max(daily_start, oldest_served), intraday_start).date(), time())
+    
+    history = get_multiple_stocks_data(symbols, period_days, interval, batch_size, downloader, cache,
+                                       window=(fetch_start, end_date), compact=compact)
+    
+    daily_data = {}
+    intraday_data = {}
+    for symbol, data in history.items():
+        intraday_data[symbol] = data[data.index >= align_timestamp(intraday_start, data.index)]
+        daily_data[symbol] = resample_ohlcv(data, '1d')
+    
+    coverage_limit = pd.Timestamp(daily_start.date()) + timedelta(days=DAILY_COVERAGE_SLACK_DAYS)
+    short = {symbol: daily_data[symbol].index[0] if symbol in daily_data else pd.Timestamp(end_date)
+             for symbol in symbols
+             if symbol not in daily_data or daily_data[symbol].index[0] > coverage_limit}
+    logging.info(f"Derived daily bars for {len(daily_data)} symbols from {interval} history")
+    
+    if short:
+        topup_end = max(short.values()).to_pydatetime()
+        logging.info(f"Topping up daily history for {len(short)} symbols from {daily_start.date()} to {topup_end.date()}")
+        topup = download_range(list(short), daily_start, topup_end, '1d', batch_size, downloader)
+        for symbol, first_session in short.items():
+            older = topup.get(symbol)
+            if older is None:
+                continue
+            older = older[older.index.tz_localize(None) < first_session] if older.index.tz is not None \
+                else older[older.index < first_session]
+            if symbol in daily_data:
+                daily_data[symbol] = pd.concat([older[daily_data[symbol].columns.intersection(older.columns)],
+                                                daily_data[symbol]])
+            elif not older.empty:
+                daily_data[symbol] = older
+            if compact and symbol in daily_data:
+                daily_data[symbol] = compact_ohlcv(daily_data[symbol])
+    
+    return ({symbol: daily_data[symbol] for symbol in symbols if symbol in daily_data},
+            {symbol: intraday_data[symbol] for symbol in symbols if symbol in intraday_data})
+
+def validate_daily_resampling(symbols, period_days=30, interval='4h', tolerance_pct=0.5, downloader=None):
+    """
+    Check daily bars derived from intraday history against a direct daily download.
+    
+    Args:
+        symbols (list): List of stock symbols
+        period_days (int): Number of days of historical data to compare
+        interval (str): Intraday interval to resample from
+        tolerance_pct (float): Largest acceptable relative price difference
+        downloader (callable, optional): Source called like yf.download (see data_sources; yfinance by default)
+        
+    Returns:
+        dict: Dictionary mapping symbols to validate_resampled reports
+    """
+    start, end = get_history_window(period_days, interval)
+    start = datetime.combine(start.date(), time())
+    intraday = download_range(symbols, start, end, interval, downloader=downloader)
+    direct = download_range(symbols, start, end, '1d', downloader=downloader)
+    
+    reports = {}
+    for symbol in symbols:
+        if symbol not in intraday or symbol not in direct:
+            logging.error(f"Cannot validate {symbol}: missing {interval if symbol not in intraday else 'daily'} data")
+            continue
+        report = validate_resampled(resample_ohlcv(intraday[symbol], '1d'), direct[symbol], tolerance_pct)
+        if report['ok']:
+            logging.debug(f"Derived daily bars for {symbol} match the daily download over {report['sessions']} sessions")
+        else:
+            logging.warning(f"Derived daily bars for {symbol} deviate from the daily download: {report}")
+        reports[symbol] = report
+    return reports
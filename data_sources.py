@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""
+Pluggable sources of price history, a record/replay pair and a local HTTP stand-in for Yahoo.
+
+Every source is called like yf.download and returns a frame shaped like its result, so it
+can be passed wherever data_retrieval takes a downloader.
+
+Usage:
+    python data_sources.py serve --directory ./recordings --latency 0.05 --failure-rate 0.02
+"""
+
+import abc
+import argparse
+import io
+import json
+import logging
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from data_retrieval import _yfinance_download, normalize_columns, split_batch_frame
+from http_pool import client as http_client
+from ohlcv_cache import TIMESTAMP_FIELD, align_timestamp, merge_history
+
+DATA_SOURCES = ('yfinance', 'replay', 'http')
+DEFAULT_RECORDING_DIRECTORY = "./recordings"
+DEFAULT_SERVER_PORT = 8765
+DEFAULT_SOURCE_TIMEOUT = 30.0
+RECORDING_SUFFIX = '.npz'
+
+def encode_frames(frames):
+    """
+    Pack per-symbol frames into compressed bytes (the recording and wire format).
+
+    Each frame becomes a structured array of int64 UTC timestamps and its columns, as in
+    the OHLCV cache, so nothing is pickled.
+
+    Args:
+        frames (dict): Dictionary mapping symbols to frames with a DatetimeIndex and flat columns
+
+    Returns:
+        bytes: np.savez_compressed archive
+    """
+    arrays = {}
+    meta = {'symbols': [], 'frames': []}
+    for position, (symbol, frame) in enumerate(frames.items()):
+        index = pd.DatetimeIndex(frame.index)
+        tz = str(index.tz) if index.tz is not None else None
+        utc_index = index.tz_convert('UTC') if tz else index
+        dtype = [(TIMESTAMP_FIELD, '<i8')] + [(str(column), frame[column].dtype.str) for column in frame.columns]
+        records = np.empty(len(frame), dtype=dtype)
+        records[TIMESTAMP_FIELD] = utc_index.asi8
+        for column in frame.columns:
+            records[str(column)] = frame[column].to_numpy()
+        arrays[f"frame_{position}"] = records
+        meta['symbols'].append(symbol)
+        meta['frames'].append({'tz': tz, 'index_name': index.name})
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, meta=np.array(json.dumps(meta)), **arrays)
+    return buffer.getvalue()
+
+def decode_frames(payload):
+    """
+    Unpack the frames written by encode_frames.
+
+    Returns:
+        dict: Dictionary mapping symbols to frames
+    """
+    frames = {}
+    with np.load(io.BytesIO(payload), allow_pickle=False) as archive:
+        meta = json.loads(str(archive['meta']))
+        for position, (symbol, frame_meta) in enumerate(zip(meta['symbols'], meta['frames'])):
+            records = archive[f"frame_{position}"]
+            index = pd.to_datetime(records[TIMESTAMP_FIELD], utc=True)
+            index = index.tz_convert(frame_meta['tz']) if frame_meta['tz'] else index.tz_localize(None)
+            index.name = frame_meta['index_name']
+            columns = [name for name in records.dtype.names if name != TIMESTAMP_FIELD]
+            frames[symbol] = pd.DataFrame({name: records[name] for name in columns}, index=index)
+    return frames
+
+def assemble_download(frames, tickers, group_by='column'):
+    """
+    Shape per-symbol frames like the result of yf.download(tickers, group_by=...).
+
+    A single ticker passed as a string gets flat columns; a list gets (ticker, field)
+    columns with group_by='ticker' and (field, ticker) otherwise. Symbols without data
+    are left out, and an empty frame is returned when none has any.
+    """
+    if isinstance(tickers, str):
+        frame = frames.get(tickers)
+        return frame if frame is not None else pd.DataFrame()
+    present = {symbol: frames[symbol] for symbol in tickers if symbol in frames}
+    if not present:
+        return pd.DataFrame()
+    data = pd.concat(present, axis=1)
+    if group_by != 'ticker':
+        data = data.swaplevel(0, 1, axis=1)
+    return data
+
+def fetch_frames(source, symbols, start=None, end=None, interval='1d'):
+    """
+    Per-symbol frames from any source, including plain yf.download-compatible callables.
+
+    Returns:
+        dict: Dictionary mapping symbols to their non-empty frames
+    """
+    if isinstance(source, DataSource):
+        return source.fetch(list(symbols), start, end, interval)
+    data = source(list(symbols), start=start, end=end, interval=interval, group_by='ticker', progress=False)
+    return split_batch_frame(data, list(symbols))
+
+def _slice(frame, start, end):
+    if start is not None:
+        frame = frame[frame.index >= align_timestamp(start, frame.index)]
+    if end is not None:
+        frame = frame[frame.index < align_timestamp(end, frame.index)]
+    return frame
+
+class DataSource(abc.ABC):
+    """
+    Base class of the price history sources.
+
+    Subclasses implement fetch(); calling the source adapts it to yf.download's signature
+    and result shape, which is what data_retrieval expects from a downloader. thread_safe
+    tells the fetch layer whether requests may overlap.
+    """
+    name = 'source'
+    thread_safe = True
+
+    @abc.abstractmethod
+    def fetch(self, symbols, start, end, interval):
+        """
+        Download history for several symbols.
+
+        Args:
+            symbols (list): Stock symbols
+            start (datetime): First date to request (None for all available history)
+            end (datetime): Date to stop before (None for up to now)
+            interval (str): Data interval
+
+        Returns:
+            dict: Dictionary mapping symbols to their frames (symbols without data are omitted)
+        """
+
+    def __call__(self, tickers, start=None, end=None, interval='1d', group_by='column', **kwargs):
+        symbols = [tickers] if isinstance(tickers, str) else list(tickers)
+        return assemble_download(self.fetch(symbols, start, end, interval), tickers, group_by)
+
+class EmptyDownloadError(Exception):
+    """
+    A download came back without data for any of the requested symbols.
+    """
+
+class _ErrorRecords(logging.Handler):
+    # Collects the per-ticker errors yf.download logs instead of raising
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+class YFinanceSource(DataSource):
+    """
+    Yahoo Finance through yfinance (the default source).
+    """
+    name = 'yfinance'
+    # yf.download collects each download's results in module globals
+    thread_safe = False
+
+    def fetch(self, symbols, start, end, interval):
+        data = self(list(symbols), start=start, end=end, interval=interval, group_by='ticker', progress=False)
+        return split_batch_frame(data, list(symbols))
+
+    def __call__(self, tickers, **kwargs):
+        """
+        Call yf.download, raising EmptyDownloadError when no requested symbol has data.
+
+        yf.download catches each ticker's exception and returns empty columns for it, so a
+        failed request would otherwise look like a symbol without data and the fetch layer's
+        retries and circuit breaker would never see it.
+        """
+        errors = _ErrorRecords()
+        logger = logging.getLogger('yfinance')
+        logger.addHandler(errors)
+        try:
+            data = _yfinance_download()(tickers, **kwargs)
+        finally:
+            logger.removeHandler(errors)
+        if data is None or data.dropna(how='all').empty:
+            detail = '; '.join(errors.messages) or 'empty response'
+            raise EmptyDownloadError(f"yfinance returned no data for {tickers}: {detail}")
+        return data
+
+class RecordingSource(DataSource):
+    """
+    Passes requests to another source and records every response.
+
+    Responses are kept per symbol and interval, one compressed file each. Later responses
+    are merged into the file, so a recording grows to cover every window that was requested.
+    """
+    name = 'recording'
+
+    def __init__(self, source, directory=DEFAULT_RECORDING_DIRECTORY):
+        """
+        Args:
+            source (callable): Source whose responses are recorded
+            directory (str): Directory holding the recordings
+        """
+        self.source = source
+        self.directory = directory
+        self.thread_safe = getattr(source, 'thread_safe', False)
+        self.recorded = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def fetch(self, symbols, start, end, interval):
+        frames = fetch_frames(self.source, symbols, start, end, interval)
+        self.record(frames, interval)
+        return frames
+
+    def __call__(self, tickers, start=None, end=None, interval='1d', group_by='column', **kwargs):
+        # Hand back the upstream response untouched; only the recording goes through fetch_frames
+        data = self.source(tickers, start=start, end=end, interval=interval, group_by=group_by, **kwargs)
+        if isinstance(tickers, str):
+            frames = {tickers: normalize_columns(data)} if data is not None and not data.empty else {}
+        else:
+            frames = split_batch_frame(data, list(tickers))
+        self.record(frames, interval)
+        return data
+
+    def record(self, frames, interval):
+        """
+        Merge frames into their symbols' recordings.
+        """
+        with self._lock:
+            for symbol, frame in frames.items():
+                path = recording_path(self.directory, symbol, interval)
+                try:
+                    if os.path.exists(path):
+                        with open(path, 'rb') as handle:
+                            frame = merge_history(decode_frames(handle.read())[symbol], frame)
+                    with open(path + '.tmp', 'wb') as handle:
+                        handle.write(encode_frames({symbol: frame}))
+                    os.replace(path + '.tmp', path)
+                    self.recorded += 1
+                except Exception as e:
+                    logging.error(f"Failed to record {interval} data for {symbol}: {str(e)}")
+
+def recording_path(directory, symbol, interval):
+    return os.path.join(directory, f"{symbol.replace('/', '_')}_{interval}{RECORDING_SUFFIX}")
+
+class ReplaySource(DataSource):
+    """
+    Serves recorded responses, cut to each request's window, without touching the network.
+    """
+    name = 'replay'
+
+    def __init__(self, directory=DEFAULT_RECORDING_DIRECTORY):
+        """
+        Args:
+            directory (str): Directory holding the recordings
+        """
+        self.directory = directory
+        self.misses = 0
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def load(self, symbol, interval):
+        """
+        The full recording for a symbol, or None if there is none.
+        """
+        key = (symbol, interval)
+        with self._lock:
+            if key not in self._frames:
+                path = recording_path(self.directory, symbol, interval)
+                frame = None
+                if os.path.exists(path):
+                    with open(path, 'rb') as handle:
+                        frame = decode_frames(handle.read()).get(symbol)
+                self._frames[key] = frame
+            return self._frames[key]
+
+    def fetch(self, symbols, start, end, interval):
+        frames = {}
+        for symbol in symbols:
+            frame = self.load(symbol, interval)
+            frame = _slice(frame, start, end) if frame is not None else None
+            if frame is None or frame.empty:
+                self.misses += 1
+                continue
+            frames[symbol] = frame
+        return frames
+
+class HTTPSource(DataSource):
+    """
+    Downloads from a StandInServer (or anything speaking its /download protocol).
+    """
+    name = 'http'
+
+    def __init__(self, base_url, timeout=DEFAULT_SOURCE_TIMEOUT):
+        """
+        Args:
+            base_url (str): Server address, e.g. http://127.0.0.1:8765
+            timeout (float): Seconds to wait for a response
+        """
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def fetch(self, symbols, start, end, interval):
+        params = {'symbols': ','.join(symbols), 'interval': interval}
+        if start is not None:
+            params['start'] = pd.Timestamp(start).isoformat()
+        if end is not None:
+            params['end'] = pd.Timestamp(end).isoformat()
+        # Requests share the process-wide keep-alive pool; HTTP errors and timeouts raise,
+        # as yf.download does on a failed request
+        response = http_client('http').get(f"{self.base_url}/download?{urlencode(params)}", timeout=self.timeout)
+        response.raise_for_status()
+        return decode_frames(response.content)
+
+def create_data_source(data_config):
+    """
+    Build the source described by the 'data' config section.
+
+    Args:
+        data_config (dict): source ('yfinance', 'replay' or 'http'), replay_directory,
+            source_url, source_timeout and record_directory
+
+    Returns:
+        DataSource: The configured source, wrapped in a RecordingSource when record_directory is set
+    """
+    kind = data_config.get('source') or 'yfinance'
+    if kind == 'replay':
+        source = ReplaySource(data_config.get('replay_directory') or DEFAULT_RECORDING_DIRECTORY)
+    elif kind == 'http':
+        source = HTTPSource(data_config.get('source_url') or f"http://127.0.0.1:{DEFAULT_SERVER_PORT}",
+                            float(data_config.get('source_timeout', DEFAULT_SOURCE_TIMEOUT)))
+    else:
+        if kind != 'yfinance':
+            logging.warning(f"Unknown data source '{kind}'. Using yfinance.")
+        source = YFinanceSource()
+    if data_config.get('record_directory'):
+        source = RecordingSource(source, data_config['record_directory'])
+    return source
+
+class StandInServer:
+    """
+    Local HTTP stand-in for Yahoo serving another source's data (usually a ReplaySource).
+
+    Every request can be delayed, failed with a 503 or left hanging, at configurable rates
+    drawn from a seeded generator, so the fetch layer's throughput, retries and concurrency
+    can be measured the same way on every run.
+    """
+    def __init__(self, source, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, failure_rate=0.0,
+                 hang_rate=0.0, hang_seconds=30.0, seed=0, connect_latency=0.0):
+        """
+        Args:
+            source (callable): Source whose data is served
+            host (str): Interface to listen on
+            port (int): Port to listen on (0 picks a free one)
+            latency (float): Seconds added to every response
+            jitter (float): Up to this many extra seconds, drawn per request
+            failure_rate (float): Share of requests answered with 503 Service Unavailable
+            hang_rate (float): Share of requests held for hang_seconds before the response
+            hang_seconds (float): How long a hanging request is held
+            seed (int): Seed of the latency and failure draws
+            connect_latency (float): Seconds added once per new connection (the TCP and TLS
+                handshakes of a remote server)
+        """
+        self.source = source
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.connect_latency = connect_latency
+        self.requests = 0
+        self.failures = 0
+        self.hangs = 0
+        self.connections = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _draw(self):
+        with self._lock:
+            self.requests += 1
+            roll = self._random.random()
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            if roll < self.failure_rate:
+                self.failures += 1
+                return 'fail', delay
+            if roll < self.failure_rate + self.hang_rate:
+                self.hangs += 1
+                return 'hang', delay + self.hang_seconds
+            return 'ok', delay
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep connections open between requests, as Yahoo does
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+                if server.connect_latency:
+                    time.sleep(server.connect_latency)
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path != '/download':
+                    self._respond(404, b'not found\n', 'text/plain')
+                    return
+                outcome, delay = server._draw()
+                if delay:
+                    time.sleep(delay)
+                if outcome == 'fail':
+                    self._respond(503, b'unavailable\n', 'text/plain')
+                    return
+                query = {name: values[0] for name, values in parse_qs(url.query).items()}
+                try:
+                    frames = fetch_frames(server.source, [symbol for symbol in query.get('symbols', '').split(',') if symbol],
+                                          query.get('start'), query.get('end'), query.get('interval', '1d'))
+                    self._respond(200, encode_frames(frames), 'application/octet-stream')
+                except Exception as e:
+                    logging.error(f"Stand-in server failed to serve {self.path}: {str(e)}")
+                    self._respond(500, b'error\n', 'text/plain')
+
+            def _respond(self, status, body, content_type):
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', content_type)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up on a slow response
+                    pass
+
+            def log_message(self, format, *args):
+                logging.debug(f"Stand-in server: {format % args}")
+
+        return Handler
+
+    def start(self):
+        """
+        Serve in a background thread.
+
+        Returns:
+            StandInServer: self, for chaining
+        """
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='stand-in-server', daemon=True)
+        self._thread.start()
+        logging.info(f"Stand-in data server listening on {self.url}")
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description='Plotin data sources')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve = subparsers.add_parser('serve', help='Serve recorded price history over HTTP')
+    serve.add_argument('--directory', default=DEFAULT_RECORDING_DIRECTORY, help='Recordings to serve')
+    serve.add_argument('--host', default='127.0.0.1', help='Interface to listen on')
+    serve.add_argument('--port', type=int, default=DEFAULT_SERVER_PORT, help='Port to listen on')
+    serve.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    serve.add_argument('--jitter', type=float, default=0.0, help='Random extra seconds per response (at most)')
+    serve.add_argument('--failure-rate', type=float, default=0.0, help='Share of requests answered with 503')
+    serve.add_argument('--hang-rate', type=float, default=0.0, help='Share of requests held for --hang-seconds')
+    serve.add_argument('--hang-seconds', type=float, default=30.0, help='How long a hanging request is held')
+    serve.add_argument('--seed', type=int, default=0, help='Seed of the latency and failure draws')
+    serve.add_argument('--connect-latency', type=float, default=0.0,
+                       help='Seconds added once per new connection (simulated handshakes)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = StandInServer(ReplaySource(args.directory), args.host, args.port, args.latency, args.jitter,
+                           args.failure_rate, args.hang_rate, args.hang_seconds, args.seed, args.connect_latency)
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        logging.info(f"Served {server.requests} requests on {server.connections} connections "
+                     f"({server.failures} failed, {server.hangs} held)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+import logging
+import random
+import threading
+import time
+
+from metrics import METRICS
+
+class FetchTimeout(Exception):
+    """
+    A request did not finish within its timeout or the download's deadline.
+    """
+
+class CircuitOpenError(Exception):
+    """
+    A request was refused because the source's circuit breaker is open.
+    """
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a source that keeps failing.
+
+    After failure_threshold consecutive failures the circuit opens and every request is
+    refused at once. Once reset_seconds have passed, one trial request is let through
+    (half-open): its success closes the circuit, its failure opens it again.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, reset_seconds=60.0, clock=time.monotonic):
+        """
+        Args:
+            name (str): Source name used in logs and metrics
+            failure_threshold (int): Consecutive failures that open the circuit
+            reset_seconds (float): Seconds an open circuit waits before a trial request
+            clock (callable): Monotonic time source (replaced by tests)
+        """
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._trial_pending = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        """
+        True while requests are refused without a trial.
+        """
+        with self._lock:
+            return self.state == self.OPEN and self.clock() - self.opened_at < self.reset_seconds
+
+    def allow(self):
+        """
+        Whether a request may be sent now (in half-open state, only the trial request is).
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                if self.clock() - self.opened_at < self.reset_seconds:
+                    return False
+                self._transition(self.HALF_OPEN)
+                self._trial_pending = True
+                return True
+            if self.state == self.HALF_OPEN:
+                if self._trial_pending:
+                    return False
+                self._trial_pending = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial_pending = False
+            if self.state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_pending = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self.opened_at = self.clock()
+                self._transition(self.OPEN)
+
+    def _transition(self, state):
+        self.state = state
+        METRICS.inc('fetch_circuit_transitions_total', source=self.name, state=state)
+        METRICS.set('fetch_circuit_open', int(state == self.OPEN), source=self.name)
+        if state == self.OPEN:
+            logging.warning(f"Circuit for {self.name} opened after {self.failures} consecutive failures. "
+                            f"Pausing requests for {self.reset_seconds:.0f}s.")
+        else:
+            logging.info(f"Circuit for {self.name} is {state.replace('_', '-')}")
+
+class AdaptiveLimit:
+    """
+    Concurrency limit adjusted AIMD-style from each request's outcome.
+
+    A request that succeeds within latency_target raises the limit by increase / limit
+    (about one slot per limit's worth of good responses). A failure, a timeout or a slow
+    response multiplies it by decrease. Requests wait for a free slot below the limit.
+    """
+    def __init__(self, name, initial=2, minimum=1, maximum=8, latency_target=5.0, increase=1.0, decrease=0.5):
+        """
+        Args:
+            name (str): Source name used in metrics
+            initial (int): Starting limit
+            minimum (int): Lowest limit
+            maximum (int): Highest limit
+            latency_target (float): Seconds above which a successful response counts as congestion
+            increase (float): Additive increase per limit's worth of good responses
+            decrease (float): Multiplicative decrease on congestion
+        """
+        self.name = name
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum))
+        self.limit = float(min(max(int(initial), self.minimum), self.maximum))
+        self.latency_target = latency_target
+        self.increase = increase
+        self.decrease = decrease
+        self.in_flight = 0
+        self.peak = 0
+        self._condition = threading.Condition()
+        METRICS.set('fetch_concurrency_limit', int(self.limit), source=name)
+
+    def acquire(self, timeout=None):
+        """
+        Wait for a slot below the limit.
+
+        Returns:
+            bool: False if timeout passed first
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.in_flight < int(self.limit), timeout):
+                return False
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            return True
+
+    def cancel(self):
+        """
+        Free a slot whose request was never sent.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def release(self, seconds, ok):
+        """
+        Free a slot and adjust the limit from the request's outcome.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            self._adjust(ok and seconds <= self.latency_target)
+            self._condition.notify_all()
+
+    def congested(self):
+        """
+        Shrink the limit without freeing a slot (an abandoned request keeps its slot until it returns).
+        """
+        with self._condition:
+            self._adjust(False)
+
+    def _adjust(self, good):
+        if good:
+            self.limit = min(self.maximum, self.limit + self.increase / max(self.limit, 1.0))
+        else:
+            self.limit = max(self.minimum, self.limit * self.decrease)
+        METRICS.set('fetch_concurrency_limit', int(self.limit), source=self.name)
+
+class ResilientFetcher:
+    """
+    Wraps a data source with timeouts, retries, a circuit breaker and an adaptive
+    concurrency limit, keeping its yf.download-style call signature.
+
+    Each attempt runs in its own daemon thread and is abandoned once its timeout passes,
+    so one hanging response costs at most the timeout. An abandoned request keeps its
+    concurrency slot until it actually returns, so the limit counts every request still
+    running. Failed attempts are retried with full-jitter exponential backoff while the
+    download's deadline allows; a timed-out attempt of a source that is not thread-safe is
+    not retried, since the retry would overlap the request still running. Every outcome is
+    counted in fetch_attempts_total.
+    """
+    def __init__(self, source, name=None, timeout=20.0, deadline=60.0, retries=2, backoff_base=0.5, backoff_max=8.0,
+                 breaker_threshold=5, breaker_reset=60.0, max_concurrency=8, latency_target=5.0, seed=None):
+        """
+        Args:
+            source (callable): Data source called like yf.download
+            name (str, optional): Source name for logs and metrics (defaults to the source's name)
+            timeout (float): Seconds one attempt may take
+            deadline (float): Seconds a download may take across attempts and backoff
+            retries (int): Attempts after the first
+            backoff_base (float): Upper bound of the first backoff, doubled per retry
+            backoff_max (float): Largest backoff bound
+            breaker_threshold (int): Consecutive failures that open the circuit
+            breaker_reset (float): Seconds before an open circuit lets a trial through
+            max_concurrency (int): Highest concurrency limit (1 for sources that are not thread-safe)
+            latency_target (float): Response time above which the limit shrinks
+            seed (int, optional): Seed of the backoff jitter
+        """
+        self.source = source
+        self.name = name or getattr(source, 'name', None) or 'source'
+        self.timeout = float(timeout)
+        self.deadline = float(deadline)
+        self.retries = max(0, int(retries))
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+        self.breaker = CircuitBreaker(self.name, breaker_threshold, breaker_reset)
+        # yfinance keeps per-download state in module globals, so its requests must not overlap
+        self.thread_safe = getattr(source, 'thread_safe', False)
+        self.max_concurrency = max(1, int(max_concurrency)) if self.thread_safe else 1
+        self.limit = AdaptiveLimit(self.name, initial=min(2, self.max_concurrency), maximum=self.max_concurrency,
+                                   latency_target=latency_target)
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, source, fetch_config):
+        """
+        Wrap a source with the settings of the 'fetch' config section.
+        """
+        return cls(source,
+                   timeout=fetch_config.get('timeout', 20),
+                   deadline=fetch_config.get('deadline', 60),
+                   retries=fetch_config.get('retries', 2),
+                   backoff_base=fetch_config.get('backoff_base', 0.5),
+                   backoff_max=fetch_config.get('backoff_max', 8),
+                   breaker_threshold=fetch_config.get('breaker_threshold', 5),
+                   breaker_reset=fetch_config.get('breaker_reset', 60),
+                   max_concurrency=fetch_config.get('max_concurrency', 8),
+                   latency_target=fetch_config.get('latency_target', 5))
+
+    @property
+    def circuit_open(self):
+        return self.breaker.is_open
+
+    def backoff(self, attempt):
+        """
+        Seconds to wait before retry number attempt + 1 (full jitter).
+        """
+        with self._random_lock:
+            return self._random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _attempt(self, tickers, kwargs, timeout):
+        """
+        Run one request in a worker thread holding an acquired slot; the worker frees the
+        slot when the request returns, even after the attempt was abandoned.
+        """
+        outcome = {}
+        lock = threading.Lock()
+
+        def run():
+            start = time.perf_counter()
+            try:
+                outcome['data'] = self.source(tickers, **kwargs)
+            except Exception as e:
+                outcome['error'] = e
+            finally:
+                with lock:
+                    if outcome.get('abandoned'):
+                        self.limit.cancel()
+                    else:
+                        self.limit.release(time.perf_counter() - start, 'error' not in outcome)
+                    outcome['done'] = True
+
+        worker = threading.Thread(target=run, name=f"fetch-{self.name}", daemon=True)
+        worker.start()
+        worker.join(timeout)
+        with lock:
+            if not outcome.get('done'):
+                outcome['abandoned'] = True
+                self.limit.congested()
+                raise FetchTimeout(f"{self.name} request timed out after {timeout:.1f}s")
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['data']
+
+    def __call__(self, tickers, **kwargs):
+        deadline_at = time.perf_counter() + self.deadline
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if self.breaker.is_open:
+                METRICS.inc('fetch_attempts_total', source=self.name, outcome='rejected')
+                raise CircuitOpenError(f"{self.name} circuit is open")
+            remaining = deadline_at - time.perf_counter()
+            if remaining <= 0 or not self.limit.acquire(timeout=remaining):
+                METRICS.inc('fetch_attempts_total', source=self.name, outcome='deadline')
+                raise FetchTimeout(f"{self.name} download missed its {self.deadline:.0f}s deadline")
+            if not self.breaker.allow():
+                # Another request is the half-open trial
+                self.limit.cancel()
+                METRICS.inc('fetch_attempts_total', source=self.name, outcome='rejected')
+                raise CircuitOpenError(f"{self.name} circuit is open")
+
+            start = time.perf_counter()
+            ok = False
+            try:
+                data = self._attempt(tickers, kwargs, min(self.timeout, deadline_at - start))
+                ok = True
+                outcome = 'ok'
+            except FetchTimeout as e:
+                last_error, outcome = e, 'timeout'
+            except Exception as e:
+                last_error, outcome = e, 'error'
+            elapsed = time.perf_counter() - start
+            METRICS.inc('fetch_attempts_total', source=self.name, outcome=outcome)
+            METRICS.observe('fetch_attempt_seconds', elapsed, source=self.name, outcome=outcome)
+
+            if ok:
+                self.breaker.record_success()
+                return data
+            self.breaker.record_failure()
+            if attempt == self.retries or (outcome == 'timeout' and not self.thread_safe):
+                # A source that is not thread-safe must not be called again while the
+                # abandoned request is still running
+                break
+            delay = self.backoff(attempt)
+            if time.perf_counter() + delay >= deadline_at:
+                break
+            METRICS.inc('fetch_retries_total', source=self.name)
+            logging.debug(f"Retrying {self.name} request in {delay:.2f}s after: {last_error}")
+            time.sleep(delay)
+        raise last_error or FetchTimeout(f"{self.name} download missed its {self.deadline:.0f}s deadline")
@@ -0,0 +1,259 @@
+import atexit
+import importlib.util
+import logging
+import threading
+from urllib.parse import urlsplit
+
+from metrics import METRICS
+
+DEFAULT_HTTP_SETTINGS = {
+    'pool_size': 16,           # Connections kept per client (and curl handles for yfinance)
+    'keepalive_seconds': 60,   # Idle time before a pooled connection is closed (0 disables reuse)
+    'http2': True              # Negotiate HTTP/2 where the server and installed packages support it
+}
+
+_settings = dict(DEFAULT_HTTP_SETTINGS)
+_lock = threading.Lock()
+_clients = {}
+_telegram_request = None
+_yfinance_session = None
+
+def configure(settings=None):
+    """
+    Apply the 'http' config section to the process-wide pools.
+
+    Pools already created are closed, so every client made afterwards uses the new settings.
+
+    Args:
+        settings (dict, optional): pool_size, keepalive_seconds and http2
+    """
+    global _telegram_request
+    with _lock:
+        _settings.clear()
+        _settings.update(DEFAULT_HTTP_SETTINGS)
+        _settings.update({key: value for key, value in (settings or {}).items() if value is not None})
+        # The Telegram client belongs to the event loop that used it and is dropped, not closed
+        _telegram_request = None
+    close()
+
+def http2_available():
+    """
+    Whether httpx can speak HTTP/2 (it needs the optional h2 package).
+    """
+    return importlib.util.find_spec('h2') is not None
+
+def use_http2():
+    return bool(_settings['http2']) and http2_available()
+
+def record_request(client, url, opened, tls=False):
+    """
+    Count a request against its host, and whether it opened a connection or reused one.
+
+    Args:
+        client (str): Pool the request went through ('http', 'telegram' or 'yfinance')
+        url (str): Request URL
+        opened (bool): A new connection was made for the request
+        tls (bool): The new connection did a TLS handshake
+    """
+    host = urlsplit(str(url)).hostname or 'unknown'
+    METRICS.inc('http_requests_total', client=client, host=host)
+    if opened:
+        METRICS.inc('http_connections_opened_total', client=client, host=host)
+        if tls:
+            METRICS.inc('http_tls_handshakes_total', client=client, host=host)
+    else:
+        METRICS.inc('http_connections_reused_total', client=client, host=host)
+
+class _ConnectionTrace:
+    """
+    httpcore trace callback noting whether a request connected and did a TLS handshake.
+    """
+    def __init__(self):
+        self.opened = False
+        self.tls = False
+
+    def note(self, name):
+        if name == 'connection.connect_tcp.complete':
+            self.opened = True
+        elif name == 'connection.start_tls.complete':
+            self.tls = True
+
+    def __call__(self, name, info):
+        self.note(name)
+
+class _AsyncConnectionTrace(_ConnectionTrace):
+    async def __call__(self, name, info):
+        self.note(name)
+
+def _event_hooks(client, asynchronous=False):
+    # httpcore reports connection events through the request's 'trace' extension
+    def attach(request):
+        request.extensions['trace'] = _AsyncConnectionTrace() if asynchronous else _ConnectionTrace()
+
+    def count(response):
+        trace = response.request.extensions.get('trace')
+        if isinstance(trace, _ConnectionTrace):
+            record_request(client, response.request.url, trace.opened, trace.tls)
+
+    if not asynchronous:
+        return {'request': [attach], 'response': [count]}
+
+    async def attach_async(request):
+        attach(request)
+
+    async def count_async(response):
+        count(response)
+
+    return {'request': [attach_async], 'response': [count_async]}
+
+def _limits():
+    import httpx
+    pool_size = max(1, int(_settings['pool_size']))
+    return httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size,
+                        keepalive_expiry=float(_settings['keepalive_seconds']))
+
+def client(name='http'):
+    """
+    The shared keep-alive httpx client of a pool, created on first use.
+
+    httpx.Client is thread-safe, so every fetch thread of the process sends through the
+    same connections.
+
+    Args:
+        name (str): Pool name, used as the client label of the metrics
+
+    Returns:
+        httpx.Client: The pooled client
+    """
+    with _lock:
+        pooled = _clients.get(name)
+        if pooled is None:
+            import httpx
+            pooled = _clients[name] = httpx.Client(limits=_limits(), http2=use_http2(),
+                                                   event_hooks=_event_hooks(name))
+        return pooled
+
+def telegram_request():
+    """
+    The shared python-telegram-bot request object, so every Bot the process creates
+    reuses the same connections (and TLS sessions) to api.telegram.org.
+
+    Its connections belong to the event loop that opened them; the process sends all of
+    its messages from one loop.
+
+    Returns:
+        telegram.request.HTTPXRequest: The pooled request
+    """
+    global _telegram_request
+    with _lock:
+        if _telegram_request is None:
+            from telegram.request import HTTPXRequest
+            _telegram_request = HTTPXRequest(connection_pool_size=max(1, int(_settings['pool_size'])),
+                                             http_version='2' if use_http2() else '1.1',
+                                             httpx_kwargs={'limits': _limits(),
+                                                           'event_hooks': _event_hooks('telegram', asynchronous=True)})
+        return _telegram_request
+
+def yfinance_session():
+    """
+    The shared curl_cffi session passed to yf.download (None without curl_cffi, in which
+    case yfinance uses its own session).
+
+    Returns:
+        curl_cffi.requests.Session: The pooled session
+    """
+    global _yfinance_session
+    with _lock:
+        if _yfinance_session is None:
+            try:
+                _yfinance_session = _pooled_curl_session(max(1, int(_settings['pool_size'])),
+                                                         float(_settings['keepalive_seconds']),
+                                                         bool(_settings['http2']))
+            except ImportError:
+                logging.debug("curl_cffi is not installed; yfinance keeps its own session")
+                return None
+        return _yfinance_session
+
+def _pooled_curl_session(pool_size, keepalive_seconds, http2):
+    from curl_cffi import Curl, CurlHttpVersion, CurlInfo, CurlOpt
+    from curl_cffi.requests import Session
+
+    class PooledCurlSession(Session):
+        """
+        curl_cffi session whose requests borrow curl handles from a shared pool.
+
+        A curl handle owns its connection cache. curl_cffi gives every thread its own handle,
+        and yf.download and the fetch timeouts run each request on a new thread, so each
+        download would connect (and handshake) again. Borrowing from a pool lets any thread
+        reuse a warm connection.
+        """
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self._idle = []
+            self._idle_lock = threading.Lock()
+            self._borrowed = threading.local()
+
+        @property
+        def curl(self):
+            handle = getattr(self._borrowed, 'handle', None)
+            if handle is None:
+                handle = self._borrowed.handle = self._checkout()
+            return handle
+
+        def _checkout(self):
+            with self._idle_lock:
+                if self._idle:
+                    return self._idle.pop()
+            return Curl(debug=self.debug)
+
+        def _checkin(self):
+            handle = getattr(self._borrowed, 'handle', None)
+            self._borrowed.handle = None
+            if handle is None:
+                return
+            with self._idle_lock:
+                if len(self._idle) < pool_size:
+                    self._idle.append(handle)
+                    return
+            handle.close()
+
+        def request(self, method, url, *args, **kwargs):
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            finally:
+                self._checkin()
+            record_request('yfinance', url, bool(response.infos.get(CurlInfo.NUM_CONNECTS)),
+                           urlsplit(str(url)).scheme == 'https')
+            return response
+
+        def close(self):
+            self._closed = True
+            with self._idle_lock:
+                idle, self._idle = self._idle, []
+            for handle in idle:
+                handle.close()
+
+    curl_options = {CurlOpt.MAXCONNECTS: pool_size}
+    if keepalive_seconds > 0:
+        curl_options[CurlOpt.MAXAGE_CONN] = int(keepalive_seconds)
+    else:
+        curl_options[CurlOpt.FORBID_REUSE] = 1
+    # yfinance needs the browser impersonation its own session uses
+    return PooledCurlSession(impersonate='chrome', curl_infos=[CurlInfo.NUM_CONNECTS], curl_options=curl_options,
+                             http_version=None if http2 else CurlHttpVersion.V1_1)
+
+def close():
+    """
+    Close the pooled synchronous clients (their connections end).
+    """
+    global _yfinance_session
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+        session, _yfinance_session = _yfinance_session, None
+    for pooled in clients:
+        pooled.close()
+    if session is not None:
+        session.close()
+
+atexit.register(close)
@@ -0,0 +1,409 @@
+import logging
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from compact_frames import compact_indicator_frame, is_compact
+
+DEFAULT_SMA_PERIODS = (50, 128)
+DEFAULT_HISTORY_LENGTH = 180  # Enough rows for the widest chart (30 days of 4h candles)
+DEFAULT_INDICATOR_STATE_FILENAME = "indicator_state.npz"
+NO_CANDLE = np.iinfo(np.int64).min  # Stored last_committed of a series with nothing committed (NaT's value)
+
+class RollingMean:
+    """
+    Running simple moving average over a fixed window, updated in constant time per value.
+
+    The summation mirrors pandas' rolling mean (Kahan-compensated add and remove with the
+    same ordering), so a kernel fed the same sequence as ``Series.rolling(window).mean()``
+    produces bit-identical values. The window's observations are kept in a float64 ring
+    buffer.
+    """
+    def __init__(self, window):
+        """
+        Initialize the kernel.
+
+        Args:
+            window (int): Number of observations in the window
+        """
+        self.window = window
+        self.values = np.empty(window, dtype=np.float64)
+        self.size = 0
+        self.head = 0  # Position of the oldest observation once the window is full
+        self.sum = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.nobs = 0
+        self.neg_ct = 0
+        self.same_count = 0
+        self.prev_value = None
+        self.count = 0
+
+    @staticmethod
+    def _add(value, total, compensation):
+        y = value - compensation
+        t = total + y
+        return t, t - total - y
+
+    def _mean(self, total, nobs, neg_ct, same_count, prev_value):
+        if nobs < self.window or nobs == 0:
+            return float('nan')
+        if same_count >= nobs:
+            return prev_value
+        result = total / nobs
+        if neg_ct == 0 and result < 0:
+            return 0.0
+        if neg_ct == nobs and result > 0:
+            return 0.0
+        return result
+
+    def _step(self, value):
+        """
+        Compute the state after appending value without mutating the kernel.
+        """
+        total, comp_add, comp_remove = self.sum, self.compensation_add, self.compensation_remove
+        nobs, neg_ct, same_count = self.nobs, self.neg_ct, self.same_count
+        prev_value = value if self.prev_value is None else self.prev_value
+
+        if self.size == self.window:
+            leaving = float(self.values[self.head])
+            if not math.isnan(leaving):
+                nobs -= 1
+                total, comp_remove = self._add(-leaving, total, comp_remove)
+                if math.copysign(1.0, leaving) < 0:
+                    neg_ct -= 1
+
+        if not math.isnan(value):
+            nobs += 1
+            total, comp_add = self._add(value, total, comp_add)
+            if math.copysign(1.0, value) < 0:
+                neg_ct += 1
+            same_count = same_count + 1 if value == prev_value else 1
+            prev_value = value
+
+        return total, comp_add, comp_remove, nobs, neg_ct, same_count, prev_value
+
+    def update(self, value):
+        """
+        Append a value to the window.
+
+        Args:
+            value (float): Next observation (NaN is skipped like pandas does)
+
+        Returns:
+            float: Mean of the current window, or NaN until the window is full
+        """
+        value = float(value)
+        (self.sum, self.compensation_add, self.compensation_remove,
+         self.nobs, self.neg_ct, self.same_count, self.prev_value) = self._step(value)
+        if self.size < self.window:
+            self.values[self.size] = value
+            self.size += 1
+        else:
+            self.values[self.head] = value
+            self.head = (self.head + 1) % self.window
+        self.count += 1
+        return self._mean(self.sum, self.nobs, self.neg_ct, self.same_count, self.prev_value)
+
+    def peek(self, value):
+        """
+        Mean the window would have after appending value, leaving the kernel unchanged.
+        """
+        total, _, _, nobs, neg_ct, same_count, prev_value = self._step(float(value))
+        return self._mean(total, nobs, neg_ct, same_count, prev_value)
+
+    def window_values(self):
+        """
+        The window's observations, oldest first.
+        """
+        return np.concatenate((self.values[self.head:self.size], self.values[:self.head]))
+
+    def sums(self):
+        """
+        Float part of the kernel state: sum, both compensations and the previous value (NaN for none).
+        """
+        prev_value = float('nan') if self.prev_value is None else self.prev_value
+        return [self.sum, self.compensation_add, self.compensation_remove, prev_value]
+
+    def counts(self):
+        """
+        Integer part of the kernel state: observations, negatives, repeats and values fed.
+        """
+        return [self.nobs, self.neg_ct, self.same_count, self.count]
+
+    @classmethod
+    def restore(cls, window, values, sums, counts):
+        """
+        Rebuild a kernel from window_values(), sums() and counts().
+        """
+        kernel = cls(int(window))
+        kernel.size = len(values)
+        kernel.values[:kernel.size] = values
+        kernel.head = 0
+        kernel.sum, kernel.compensation_add, kernel.compensation_remove, prev_value = (float(value) for value in sums)
+        kernel.prev_value = None if math.isnan(prev_value) else prev_value
+        kernel.nobs, kernel.neg_ct, kernel.same_count, kernel.count = (int(value) for value in counts)
+        return kernel
+
+def _nanoseconds(index):
+    # Epoch nanoseconds (UTC for timezone-aware indexes) whatever the index's unit
+    return np.asarray(index.values).astype('datetime64[ns]').view(np.int64)
+
+def _datetime_index(nanoseconds, tz):
+    index = pd.DatetimeIndex(np.asarray(nanoseconds, dtype=np.int64).view('datetime64[ns]'))
+    return index.tz_localize('UTC').tz_convert(tz) if tz else index
+
+class SymbolIndicatorState:
+    """
+    SMA kernels and the recent indicator history for one (symbol, interval) series.
+
+    Only candles before the latest one are committed to the kernels: the latest candle
+    may still be forming, so its SMA values are computed with ``peek`` and it is fed
+    again (with its final prices) on the next update. The history (timestamps as epoch
+    nanoseconds, closes and SMA values) is kept in numpy arrays.
+    """
+    def __init__(self, periods=DEFAULT_SMA_PERIODS, history_length=DEFAULT_HISTORY_LENGTH):
+        self.periods = tuple(periods)
+        self.history_length = history_length
+        self.kernels = {period: RollingMean(period) for period in self.periods}
+        self.tz = None
+        self.last_committed = None  # Epoch nanoseconds of the last committed candle
+        self.history_index = np.empty(0, dtype=np.int64)
+        self.history_close = np.empty(0, dtype=np.float64)
+        self.history = {period: np.empty(0, dtype=np.float64) for period in self.periods}
+
+    def joins(self, stamps, values):
+        """
+        Whether fetched candles continue this state: they must include the last committed
+        candle, and the closes of the stored candles they overlap must be unchanged (Yahoo
+        rewrites past closes of auto-adjusted history after splits and dividends).
+
+        Args:
+            stamps (numpy.ndarray): Epoch nanoseconds of the fetched candles, ascending
+            values (numpy.ndarray): Their closes
+        """
+        if self.last_committed is None:
+            return True
+        position = np.searchsorted(stamps, self.last_committed)
+        if position == len(stamps) or stamps[position] != self.last_committed:
+            return False
+        positions = np.searchsorted(stamps, self.history_index)
+        found = positions < len(stamps)
+        found[found] = stamps[positions[found]] == self.history_index[found]
+        return bool(np.allclose(values[positions[found]], self.history_close[found], rtol=1e-9, atol=0.0,
+                                equal_nan=True))
+
+    def _recent(self, stored, fresh):
+        # A copy, since a slice would keep the whole fetched history alive
+        return np.concatenate((stored, fresh))[-self.history_length:].copy()
+
+    def update(self, closes):
+        """
+        Feed the candles after the last committed timestamp.
+
+        Args:
+            closes (pandas.Series): Close prices indexed by timestamp
+
+        Returns:
+            dict: period -> SMA value for the latest candle
+        """
+        stamps = _nanoseconds(closes.index)
+        values = closes.to_numpy(dtype=np.float64)
+        if self.last_committed is not None:
+            fresh = stamps > self.last_committed
+            stamps, values = stamps[fresh], values[fresh]
+        if not len(values):
+            return None
+
+        self.tz = str(closes.index.tz) if getattr(closes.index, 'tz', None) is not None else None
+        committed = values[:-1]
+        if len(committed):
+            self.history_index = self._recent(self.history_index, stamps[:-1])
+            self.history_close = self._recent(self.history_close, committed)
+            for period in self.periods:
+                kernel = self.kernels[period]
+                means = np.fromiter((kernel.update(value) for value in committed), dtype=np.float64, count=len(committed))
+                self.history[period] = self._recent(self.history[period], means)
+            self.last_committed = int(stamps[-2])
+
+        return {period: self.kernels[period].peek(values[-1]) for period in self.periods}
+
+class IndicatorEngine:
+    """
+    Maintains SMA state per (symbol, interval) so each run only processes new candles.
+    """
+    def __init__(self, periods=DEFAULT_SMA_PERIODS, history_length=DEFAULT_HISTORY_LENGTH):
+        """
+        Initialize the engine.
+
+        Args:
+            periods (tuple): SMA periods to maintain
+            history_length (int): Number of recent rows returned with indicator values
+        """
+        self.periods = tuple(periods)
+        self.history_length = history_length
+        self.states = {}
+
+    def _state_for(self, symbol, interval, closes):
+        key = f"{symbol}|{interval}"
+        state = self.states.get(key)
+        if state is not None and not state.joins(_nanoseconds(closes.index), closes.to_numpy(dtype=np.float64)):
+            # Restart when the new data no longer joins up with the stored state, or when
+            # past closes were rewritten (split or dividend adjustments)
+            logging.info(f"Indicator state for {symbol} {interval} is stale. Rebuilding from {len(closes)} candles.")
+            state = None
+        if state is None:
+            state = SymbolIndicatorState(self.periods, self.history_length)
+            self.states[key] = state
+        return state
+
+    def add_indicators(self, symbol, interval, data):
+        """
+        Incremental counterpart of technical_analysis.add_indicators.
+
+        Args:
+            symbol (str): Stock symbol
+            interval (str): Data interval
+            data (pandas.DataFrame): Stock price data
+
+        Returns:
+            pandas.DataFrame: The most recent rows (up to history_length) with SMA columns,
+            or None if there is not enough history for the longest SMA
+        """
+        if data is None or data.empty:
+            return None
+
+        try:
+            closes = data['Close'].astype(float)
+            state = self._state_for(symbol, interval, closes)
+            latest = state.update(closes)
+
+            longest = max(self.periods)
+            if state.kernels[longest].count + 1 < longest:
+                logging.warning(f"Insufficient data for {longest}-period SMA. Data length: {len(data)}, need at least {longest} data points.")
+                return None
+
+            index = _datetime_index(state.history_index, state.tz)
+            columns = {f"SMA{period}": state.history[period] for period in self.periods}
+            if latest is not None:
+                index = index.append(closes.index[-1:])
+                columns = {f"SMA{period}": np.append(columns[f"SMA{period}"], latest[period]) for period in self.periods}
+
+            indicators = pd.DataFrame(columns, index=index).iloc[-self.history_length:]
+            recent = data.loc[data.index.isin(indicators.index)]
+            if is_compact(data):
+                return compact_indicator_frame(recent, {
+                    column: indicators[column].reindex(recent.index).to_numpy() for column in indicators.columns
+                })
+            recent = recent.copy()
+            for col in ['Open', 'High', 'Low', 'Close', 'Volume']:
+                if col in recent.columns:
+                    recent[col] = recent[col].astype(float)
+            for column in indicators.columns:
+                recent[column] = indicators[column].reindex(recent.index).to_numpy()
+
+            return recent.dropna()
+        except Exception as e:
+            logging.error(f"Error adding indicators for {symbol} {interval}: {str(e)}")
+            return None
+
+    def to_arrays(self):
+        """
+        The state of every series as flat numpy arrays (one row per series, variable-length
+        parts concatenated with offsets), as stored by save().
+        """
+        keys = list(self.states)
+        states = [self.states[key] for key in keys]
+
+        def offsets(lengths):
+            return np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+
+        def concat(parts, dtype):
+            return np.concatenate(parts).astype(dtype) if parts else np.empty(0, dtype=dtype)
+
+        arrays = {
+            'keys': np.array(keys, dtype=str),
+            'periods': np.array(self.periods, dtype=np.int64),
+            'history_length': np.array(self.history_length, dtype=np.int64),
+            'tz': np.array([state.tz or '' for state in states], dtype=str),
+            'last_committed': np.array([NO_CANDLE if state.last_committed is None else state.last_committed
+                                        for state in states], dtype=np.int64),
+            'history_offsets': offsets([len(state.history_index) for state in states]),
+            'history_index': concat([state.history_index for state in states], np.int64),
+            'history_close': concat([state.history_close for state in states], np.float64)
+        }
+        for period in self.periods:
+            kernels = [state.kernels[period] for state in states]
+            windows = [kernel.window_values() for kernel in kernels]
+            arrays[f'history_sma{period}'] = concat([state.history[period] for state in states], np.float64)
+            arrays[f'kernel{period}_offsets'] = offsets([len(window) for window in windows])
+            arrays[f'kernel{period}_values'] = concat(windows, np.float64)
+            arrays[f'kernel{period}_sums'] = np.array([kernel.sums() for kernel in kernels], dtype=np.float64).reshape(-1, 4)
+            arrays[f'kernel{period}_counts'] = np.array([kernel.counts() for kernel in kernels], dtype=np.int64).reshape(-1, 4)
+        return arrays
+
+    def save(self, path):
+        """
+        Persist the engine state as a numpy archive, replacing the previous one atomically.
+
+        Args:
+            path (str): Destination file
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        try:
+            # A file object keeps numpy from appending '.npz' to the name
+            with open(path + '.tmp', 'wb') as handle:
+                np.savez(handle, **self.to_arrays())
+            os.replace(path + '.tmp', path)
+        except Exception as exc:
+            logging.error(f"Failed to persist indicator state to {path}: {exc}")
+
+    @classmethod
+    def load(cls, path, periods=DEFAULT_SMA_PERIODS, history_length=DEFAULT_HISTORY_LENGTH):
+        """
+        Restore an engine saved with save(), or return an empty engine.
+
+        Args:
+            path (str): State file
+            periods (tuple): SMA periods to maintain
+            history_length (int): Number of recent rows returned with indicator values
+
+        Returns:
+            IndicatorEngine: Restored engine
+        """
+        engine = cls(periods, history_length)
+        if not os.path.exists(path):
+            return engine
+        try:
+            with np.load(path, allow_pickle=False) as archive:
+                # Discard state built for a different configuration
+                if tuple(int(period) for period in archive['periods']) != engine.periods or \
+                        int(archive['history_length']) != history_length:
+                    return engine
+                arrays = {name: archive[name] for name in archive.files}
+        except Exception as exc:
+            # Includes the JSON files written by earlier versions; the series are rebuilt
+            logging.error(f"Failed to load indicator state from {path}: {exc}. Starting fresh.")
+            return engine
+
+        history = arrays['history_offsets']
+        for row, key in enumerate(arrays['keys']):
+            state = SymbolIndicatorState(engine.periods, history_length)
+            state.tz = str(arrays['tz'][row]) or None
+            last_committed = int(arrays['last_committed'][row])
+            state.last_committed = None if last_committed == NO_CANDLE else last_committed
+            rows = slice(history[row], history[row + 1])
+            state.history_index = arrays['history_index'][rows].copy()
+            state.history_close = arrays['history_close'][rows].copy()
+            for period in engine.periods:
+                state.history[period] = arrays[f'history_sma{period}'][rows].copy()
+                window = arrays[f'kernel{period}_offsets']
+                state.kernels[period] = RollingMean.restore(
+                    period, arrays[f'kernel{period}_values'][window[row]:window[row + 1]],
+                    arrays[f'kernel{period}_sums'][row], arrays[f'kernel{period}_counts'][row])
+            engine.states[str(key)] = state
+        return engine
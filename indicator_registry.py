@@ -0,0 +1,269 @@
+import logging
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from compact_frames import compact_indicator_frame, is_compact
+from metrics import METRICS
+
+IndicatorSpec = namedtuple('IndicatorSpec', ['name', 'kind', 'window', 'source', 'plot', 'color'])
+
+INDICATOR_KINDS = ('sma', 'ema')
+DEFAULT_TIMEFRAME = 'default'
+
+# The golden-cross signals read these columns, so every timeframe computes them
+SIGNAL_INDICATORS = (
+    IndicatorSpec('SMA50', 'sma', 50, 'Close', True, None),
+    IndicatorSpec('SMA128', 'sma', 128, 'Close', True, None)
+)
+DEFAULT_DEFINITIONS = {
+    DEFAULT_TIMEFRAME: [{'name': spec.name, 'kind': spec.kind, 'window': spec.window} for spec in SIGNAL_INDICATORS]
+}
+
+def sma_kernel(values, windows):
+    """
+    Simple moving averages for several windows over a series or a whole panel.
+
+    values may be 1-D or (time x column); each window is one vectorized pandas rolling mean
+    over every column, so the averages are bit-identical to calculate_sma and to
+    IndicatorEngine's RollingMean, and a spread right at a crossover is classified the same
+    whichever path computed it. A window containing a NaN yields NaN. NaN padding on top of
+    a column is skipped, so right-aligned panels give the same values as each column alone.
+
+    Args:
+        values (numpy.ndarray): Input series
+        windows (iterable): Window lengths
+
+    Returns:
+        dict: window -> array shaped like values
+    """
+    values = np.asarray(values, dtype=np.float64)
+    flat = values.ndim == 1
+    frame = pd.DataFrame(values[:, None] if flat else values)
+    results = {}
+    for window in set(windows):
+        means = frame.rolling(window=window).mean().to_numpy()
+        results[window] = means[:, 0] if flat else means
+    return results
+
+def ema_kernel(values, windows):
+    """
+    Exponential moving averages for several windows over a 1-D series.
+
+    Each window is one Series.ewm(span=window, adjust=False, min_periods=window,
+    ignore_na=True).mean(); a NaN input leaves every average unchanged and yields NaN for
+    that row.
+
+    Returns:
+        dict: window -> array
+    """
+    series = pd.Series(np.asarray(values, dtype=np.float64))
+    missing = series.isna().to_numpy()
+    results = {}
+    for window in set(windows):
+        means = series.ewm(span=window, adjust=False, min_periods=window, ignore_na=True).mean().to_numpy()
+        means[missing] = np.nan
+        results[window] = means
+    return results
+
+KERNELS = {'sma': sma_kernel, 'ema': ema_kernel}
+
+def parse_indicator_specs(definitions):
+    """
+    Validate one timeframe's indicator declarations.
+
+    Args:
+        definitions (list): Dicts with name, kind ('sma' or 'ema'), window and optional
+            source ('Close' or 'Volume'), plot and color
+
+    Returns:
+        list: IndicatorSpec per declaration, with the signal SMAs added if missing
+    """
+    specs = []
+    for definition in definitions or []:
+        kind = str(definition.get('kind', 'sma')).lower()
+        if kind not in INDICATOR_KINDS:
+            raise ValueError(f"Unknown indicator kind '{kind}' (expected one of {', '.join(INDICATOR_KINDS)})")
+        window = int(definition['window'])
+        if window < 1:
+            raise ValueError(f"Indicator window must be positive, got {window}")
+        source = definition.get('source', 'Close')
+        name = definition.get('name') or f"{'VOL_' if source == 'Volume' else ''}{kind.upper()}{window}"
+        specs.append(IndicatorSpec(name, kind, window, source, bool(definition.get('plot', source == 'Close')),
+                                   definition.get('color')))
+    names = {spec.name for spec in specs}
+    if len(names) != len(specs):
+        raise ValueError("Indicator names must be unique within a timeframe")
+    for required in SIGNAL_INDICATORS:
+        if required.name not in names:
+            specs.append(required)
+    return specs
+
+def compute_indicator_columns(data, specs):
+    """
+    Compute every indicator for one frame with one fused kernel call per (kind, source).
+
+    Returns:
+        dict: Indicator name -> float64 array aligned with data's rows
+    """
+    groups = {}
+    for spec in specs:
+        groups.setdefault((spec.kind, spec.source), []).append(spec)
+    columns = {}
+    for (kind, source), group in groups.items():
+        results = KERNELS[kind](data[source].to_numpy(dtype=np.float64), [spec.window for spec in group])
+        for spec in group:
+            columns[spec.name] = results[spec.window]
+    return {spec.name: columns[spec.name] for spec in specs}
+
+def build_indicator_frame(data, specs):
+    """
+    Attach the indicator columns to a price frame and drop the warm-up rows.
+
+    Returns:
+        pandas.DataFrame: Price and indicator columns (compact when data is compact),
+        or None if there is not enough history for the longest window
+    """
+    longest = max(spec.window for spec in specs)
+    if len(data) < longest:
+        logging.warning(f"Insufficient data for {longest}-period indicators. Data length: {len(data)}, need at least {longest} data points.")
+        return None
+
+    indicators = compute_indicator_columns(data, specs)
+    if is_compact(data):
+        # Compact frames stay float32: one block holding only the rows that survive the warm-up
+        data_with_indicators = compact_indicator_frame(data, indicators)
+    else:
+        # Create a copy of the dataframe to avoid warnings
+        data_copy = data.copy()
+
+        # Ensure OHLC columns are float
+        for col in ['Open', 'High', 'Low', 'Close', 'Volume']:
+            if col in data_copy.columns:
+                data_copy[col] = data_copy[col].astype(float)
+        for name, values in indicators.items():
+            data_copy[name] = values
+
+        # Remove rows with NaN indicator values (due to rolling window)
+        data_with_indicators = data_copy.dropna()
+
+    logging.debug(f"Successfully added indicators. Data reduced from {len(data)} to {len(data_with_indicators)} valid rows")
+    return data_with_indicators
+
+class IndicatorRegistry:
+    """
+    The indicators declared per timeframe, plus the latest result per (symbol, interval).
+
+    A result is reused across runs while the series' last timestamp, length and last close
+    are unchanged; streaming runs release a symbol's results once it has been delivered.
+    """
+    def __init__(self, definitions=None):
+        """
+        Initialize the registry.
+
+        Args:
+            definitions (dict, optional): Timeframe (or 'default') -> list of indicator
+                declarations (see parse_indicator_specs); defaults to SMA50 and SMA128
+        """
+        definitions = definitions or DEFAULT_DEFINITIONS
+        self.specs = {timeframe: parse_indicator_specs(items) for timeframe, items in definitions.items()}
+        if DEFAULT_TIMEFRAME not in self.specs:
+            self.specs[DEFAULT_TIMEFRAME] = parse_indicator_specs(DEFAULT_DEFINITIONS[DEFAULT_TIMEFRAME])
+        self._results = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls, indicator_config):
+        """
+        Build the registry from the 'indicators' configuration section.
+        """
+        return cls((indicator_config or {}).get('definitions'))
+
+    def specs_for(self, interval):
+        """
+        Indicator specs declared for an interval (or the default set).
+        """
+        return self.specs.get(interval, self.specs[DEFAULT_TIMEFRAME])
+
+    def sma_periods(self, interval):
+        """
+        The SMA windows of an interval if it only declares SMA<window> averages of the
+        close (what IndicatorEngine maintains incrementally), otherwise None.
+        """
+        specs = self.specs_for(interval)
+        if all(spec.kind == 'sma' and spec.source == 'Close' and spec.name == f"SMA{spec.window}" for spec in specs):
+            return tuple(spec.window for spec in specs)
+        return None
+
+    def add_indicators(self, symbol, interval, data, compute=None):
+        """
+        Indicator frame for a symbol's series, reused while the series is unchanged.
+
+        Args:
+            symbol (str): Stock symbol
+            interval (str): Data interval
+            data (pandas.DataFrame): Price history
+            compute (callable, optional): Replaces the fused full pass (e.g. the incremental engine)
+
+        Returns:
+            pandas.DataFrame: As returned by build_indicator_frame
+        """
+        if data is None or data.empty:
+            return None
+        key = (symbol, interval)
+        version = (data.index[-1], len(data), float(data['Close'].iat[-1]))
+        cached = self._results.get(key)
+        if cached is not None and cached[0] == version:
+            self.hits += 1
+            METRICS.inc('indicator_cache_hits_total', interval=interval)
+            return cached[1]
+        self.misses += 1
+        METRICS.inc('indicator_cache_misses_total', interval=interval)
+        start = time.perf_counter()
+        try:
+            result = compute(data) if compute is not None else build_indicator_frame(data, self.specs_for(interval))
+        except Exception as e:
+            logging.error(f"Error adding indicators for {symbol} {interval}: {str(e)}")
+            return None
+        finally:
+            METRICS.observe('indicator_seconds', time.perf_counter() - start, symbol=symbol, interval=interval)
+        self._results[key] = (version, result)
+        return result
+
+    def evict(self, symbols):
+        """
+        Drop cached results for symbols no longer on the watchlist.
+        """
+        keep = set(symbols)
+        self._results = {key: value for key, value in self._results.items() if key[0] in keep}
+
+    def release(self, symbol):
+        """
+        Drop a symbol's cached results once it has been delivered, so the cache holds the
+        symbols in flight rather than the whole watchlist.
+
+        Args:
+            symbol (str): Stock symbol
+        """
+        # list() copies the keys in one step while analyze threads may be adding results
+        for key in [key for key in list(self._results) if key[0] == symbol]:
+            self._results.pop(key, None)
+
+def chart_overlays(data, specs, chart_config):
+    """
+    Indicator lines to draw on a chart: (column, color, panel) for each plotted spec.
+
+    SMA colors fall back to the chart's sma_<window>_color settings; volume-based
+    indicators go on a second panel below the candles.
+    """
+    palette = ['#ab47bc', '#26c6da', '#d4e157', '#ff7043', '#8d6e63']
+    overlays = []
+    for spec in specs:
+        if not spec.plot or spec.name not in data.columns:
+            continue
+        color = spec.color or chart_config.get(f"{spec.kind}_{spec.window}_color") or palette[len(overlays) % len(palette)]
+        overlays.append((spec.name, color, 1 if spec.source == 'Volume' else 0))
+    return overlays
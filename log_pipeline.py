@@ -0,0 +1,118 @@
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+DEFAULT_LOG_FILE = "plotin.log"
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_listener = None
+_installed = []
+
+class SampledDebugFilter(logging.Filter):
+    """
+    Passes every record above DEBUG and one DEBUG record in every `every`.
+
+    Per-symbol detail (downloads, indicators, charts, deliveries) is logged at DEBUG; on a
+    large watchlist the sample is enough to follow a run without writing a line per symbol
+    per stage.
+    """
+    def __init__(self, every=1):
+        super().__init__()
+        self.every = max(1, int(every))
+        self.seen = 0
+        self.dropped = 0
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        self.seen += 1
+        if (self.seen - 1) % self.every == 0:
+            return True
+        self.dropped += 1
+        return False
+
+def _level(value):
+    level = logging.getLevelName(str(value).upper()) if not isinstance(value, int) else value
+    if not isinstance(level, int):
+        logging.warning(f"Unknown log level '{value}'. Using INFO.")
+        return logging.INFO
+    return level
+
+def setup_logging(settings=None):
+    """
+    Configure the root logger from the 'logging' config section.
+
+    By default records are put on an in-memory queue by the logging thread and written to
+    the rotating log file and the console by a background listener thread, so a slow disk
+    or terminal never blocks the event loop. Calling it again replaces the previous setup,
+    along with any handlers other code put on the root logger (main() configures defaults
+    first and the configured settings once they are loaded).
+
+    Args:
+        settings (dict, optional): level, debug_sample_every, file, max_bytes, backup_count,
+            console and queued
+
+    Returns:
+        QueueListener: The background writer, or None when logging synchronously
+    """
+    global _listener
+    settings = settings or {}
+    stop_logging()
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = []
+    log_file = settings.get('file', DEFAULT_LOG_FILE)
+    if log_file:
+        handlers.append(RotatingFileHandler(log_file,
+                                            maxBytes=int(settings.get('max_bytes', DEFAULT_MAX_BYTES)),
+                                            backupCount=int(settings.get('backup_count', DEFAULT_BACKUP_COUNT)),
+                                            encoding='utf-8'))
+    if settings.get('console', True):
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    root = logging.getLogger()
+    # Any handler installed elsewhere (e.g. by basicConfig) would still write synchronously
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    root.setLevel(_level(settings.get('level', 'INFO')))
+    sampler = SampledDebugFilter(settings.get('debug_sample_every', 1))
+    if settings.get('queued', True):
+        log_queue = queue.SimpleQueue()
+        queue_handler = QueueHandler(log_queue)
+        queue_handler.addFilter(sampler)
+        _installed.append(queue_handler)
+        _listener = QueueListener(log_queue, *handlers)
+        _listener.start()
+    else:
+        for handler in handlers:
+            handler.addFilter(sampler)
+        _installed.extend(handlers)
+    for handler in _installed:
+        root.addHandler(handler)
+    return _listener
+
+def stop_logging():
+    """
+    Write out every queued record and detach the handlers setup_logging installed.
+    """
+    global _listener
+    root = logging.getLogger()
+    for handler in _installed:
+        root.removeHandler(handler)
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    for handler in _installed:
+        handler.close()
+    _installed.clear()
+
+# Records still on the queue at exit are written before the process ends
+atexit.register(stop_logging)
@@ -2,49 +2,234 @@ import logging
 import os
 import argparse
 import asyncio
-from datetime import datetime, timezone
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from config_manager import load_config
-from data_retrieval import get_multiple_stocks_data
-from technical_analysis import add_indicators, analyze_golden_cross_state
-from chart_generation import generate_chart
 from telegram_bot import create_telegram_manager
-from scheduler import create_schedule_manager_from_config
+from pipeline import InFlightWindow, LoopStallMonitor, Stage, run_pipeline
+from log_pipeline import setup_logging
+import http_pool
+from metrics import METRICS, DEFAULT_METRICS_PORT, DEFAULT_REPORT_FILENAME, start_metrics_server, write_run_report
+from scheduler import LoopJob, create_schedule_manager_from_config
+from signal_store import SignalStateStore, DEFAULT_STATE_DB_FILENAME
+from signal_history import SignalHistory, DEFAULT_HISTORY_DB_FILENAME, GROUP_COLUMNS
 from notifications import (
-    load_signal_state,
+    open_signal_state,
     save_signal_state,
     get_previous_state,
     update_state,
     should_send_notification,
     build_signal_message,
     build_alignment_message,
+    record_evaluation,
     DEFAULT_STATE_FILENAME
 )
 
 POSITIVE_STATES = {'golden', 'near'}
 
-def setup_logging():
-    """Set up logging configuration."""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler("plotin.log"),
-            logging.StreamHandler()
-        ]
-    )
-    logging.info("Starting Stock Analysis Tool")
+class RunResources:
+    """
+    The long-lived objects of a run: price cache, indicator registry and engine, signal
+    state and history, the Telegram client and the worker pools.
+    
+    A one-off run builds its own set and closes it at the end. The scheduled worker keeps one
+    set open between ticks (persistent=True), so each tick reuses the loaded state, the warm
+    Telegram connections and pools and the in-memory price history, and only does the work
+    the new candles bring.
+    """
+    def __init__(self, config, persistent=False):
+        """
+        Open the resources a configuration needs.
+        
+        Args:
+            config (dict): Configuration dictionary
+            persistent (bool): Keep the resources (and each symbol's history) between runs
+        """
+        # pandas, numpy and yfinance are loaded by the first run rather than at startup
+        # (see README "Startup")
+        from ohlcv_cache import OHLCVCache
+        from indicator_engine import IndicatorEngine, DEFAULT_INDICATOR_STATE_FILENAME
+        from indicator_registry import IndicatorRegistry, DEFAULT_TIMEFRAME
+        from data_sources import create_data_source
+        from fetch_executor import ResilientFetcher
+        
+        self.config = config
+        self.persistent = persistent
+        self.runs = 0
+        output_dir = config['output']['directory']
+        notification_config = config.get('notifications', {})
+        data_config = config.get('data', {})
+        pipeline_config = config.get('pipeline', {})
+        
+        # Timeouts, retries and the circuit breaker outlive a run in the scheduled worker
+        self.data_source = ResilientFetcher.from_config(create_data_source(data_config), config.get('fetch', {}))
+        self.ohlcv_cache = None
+        if data_config.get('cache_enabled', False):
+            streaming = pipeline_config.get('streaming', False)
+            self.ohlcv_cache = OHLCVCache(data_config.get('cache_directory') or os.path.join(output_dir, 'ohlcv_cache'),
+                                          max_pending=int(pipeline_config.get('max_in_flight', 16)) if streaming else None,
+                                          keep_in_memory=persistent)
+        elif persistent:
+            # Without the disk cache the worker still tops up each symbol's history between ticks
+            self.ohlcv_cache = OHLCVCache(None)
+        
+        self.notifications_enabled = notification_config.get('enabled', False)
+        self.state_file = notification_config.get('state_file') or os.path.join(output_dir, DEFAULT_STATE_FILENAME)
+        self.signal_state = {}
+        if self.notifications_enabled:
+            if notification_config.get('state_backend', 'sqlite') == 'sqlite':
+                state_db = notification_config.get('state_db') or os.path.join(output_dir, DEFAULT_STATE_DB_FILENAME)
+                self.signal_state = open_signal_state('sqlite', state_db, legacy_path=self.state_file)
+            else:
+                self.signal_state = open_signal_state('json', self.state_file)
+        
+        self.history = None
+        self.history_retention_days = int(notification_config.get('history_retention_days', 365))
+        if self.notifications_enabled and notification_config.get('history_enabled', True):
+            self.history = SignalHistory(history_path(config))
+        
+        indicator_config = config.get('indicators', {})
+        try:
+            self.indicator_registry = IndicatorRegistry.from_config(indicator_config)
+        except (KeyError, TypeError, ValueError) as e:
+            logging.error(f"Invalid indicators.definitions ({str(e)}). Using SMA50 and SMA128.")
+            self.indicator_registry = IndicatorRegistry()
+        self.indicator_engine = None
+        self.indicator_state_file = None
+        self.engine_periods = self.indicator_registry.sma_periods(DEFAULT_TIMEFRAME)
+        if indicator_config.get('incremental', False) and self.engine_periods:
+            self.indicator_state_file = indicator_config.get('state_file') or os.path.join(output_dir, DEFAULT_INDICATOR_STATE_FILENAME)
+            self.indicator_engine = IndicatorEngine.load(self.indicator_state_file, periods=self.engine_periods)
+        
+        self.fetch_executor = ThreadPoolExecutor(max_workers=int(pipeline_config.get('fetch_concurrency', 1)),
+                                                 thread_name_prefix='fetch')
+        # Indicators and signal scans run off the event loop, so deliveries keep going meanwhile
+        self.analyze_executor = ThreadPoolExecutor(max_workers=int(pipeline_config.get('analyze_concurrency', 1)),
+                                                   thread_name_prefix='analyze')
+        self.telegram_manager = None
+        self.chart_cache = None
+        self.render_pool = None
+        self.render_thread = None
+        self._charts_ready = False
+    
+    def telegram(self):
+        """
+        The Telegram manager, created on first use (None if it cannot be created).
+        """
+        if self.telegram_manager is None:
+            self.telegram_manager = create_telegram_manager(self.config)
+        return self.telegram_manager
+    
+    def charts(self):
+        """
+        The chart cache and render pool (either may be None), created on first use.
+        
+        Without a render pool, charts are drawn on the render thread instead.
+        """
+        if not self._charts_ready:
+            from chart_generation import ChartRenderPool, start_render_thread
+            from chart_cache import ChartCache
+            chart_config = self.config['chart']
+            if chart_config.get('cache_enabled', False):
+                self.chart_cache = ChartCache(self.config['output']['directory'])
+            render_workers = int(chart_config.get('render_workers') or 0)
+            self.render_pool = ChartRenderPool(render_workers) if render_workers > 1 else None
+            if self.render_pool is None:
+                self.render_thread = start_render_thread()
+            self._charts_ready = True
+        return self.chart_cache, self.render_pool
+    
+    def evict(self, symbols):
+        """
+        Drop cached data for symbols no longer on the watchlist.
+        """
+        self.indicator_registry.evict(symbols)
+        if self.chart_cache is not None:
+            self.chart_cache.evict(symbols)
+        if self.ohlcv_cache is not None:
+            self.ohlcv_cache.evict(symbols)
+    
+    def compute_indicators(self, symbol, timeframe, data):
+        """
+        Indicator frame for a symbol's series, through the registry's cache.
+        """
+        # The incremental engine covers timeframes that only declare the engine's close SMAs;
+        # any other set goes through the registry's fused full pass
+        compute = None
+        if self.indicator_engine is not None and self.indicator_registry.sma_periods(timeframe) == self.engine_periods:
+            compute = functools.partial(self.indicator_engine.add_indicators, symbol, timeframe)
+        return self.indicator_registry.add_indicators(symbol, timeframe, data, compute=compute)
+    
+    def release(self, symbol):
+        """
+        Drop a symbol's indicator frames once it has been delivered (streaming mode).
+        """
+        self.indicator_registry.release(symbol)
+    
+    def save(self, state_dirty):
+        """
+        Persist what a run changed; the resources stay open.
+        """
+        if self.notifications_enabled and state_dirty:
+            save_signal_state(self.signal_state, self.state_file)
+        if self.history is not None:
+            self.history.flush()
+            self.history.prune(self.history_retention_days)
+        if self.chart_cache is not None:
+            self.chart_cache.report()
+            self.chart_cache.save()
+        if self.indicator_engine is not None:
+            self.indicator_engine.save(self.indicator_state_file)
+        if self.ohlcv_cache is not None:
+            self.ohlcv_cache.flush()
+    
+    def close(self):
+        """
+        Release the database connections and worker pools.
+        """
+        self.fetch_executor.shutdown(wait=False)
+        self.analyze_executor.shutdown(wait=False)
+        if self.render_thread is not None:
+            self.render_thread.shutdown(wait=False)
+        if isinstance(self.signal_state, SignalStateStore):
+            self.signal_state.close()
+        if self.history is not None:
+            self.history.close()
+        if self.render_pool is not None:
+            self.render_pool.shutdown()
 
-async def process_stocks(config, send_to_telegram=False):
+async def process_stocks(config, send_to_telegram=False, scan_only=False, resources=None):
     """
     Process stocks according to configuration.
     
     Args:
         config (dict): Configuration dictionary
         send_to_telegram (bool): Whether to send results to Telegram
+        scan_only (bool): Evaluate signals and send text alerts without rendering charts
+        resources (RunResources, optional): Open resources to reuse (kept open afterwards);
+            by default the run opens its own and closes them at the end
         
     Returns:
         bool: True if successful, False otherwise
     """
+    if resources is not None:
+        return await _process_stocks(config, send_to_telegram, scan_only, resources)
+    # A run that opens its own resources closes them even when the pipeline raises
+    resources = RunResources(config)
+    try:
+        return await _process_stocks(config, send_to_telegram, scan_only, resources)
+    finally:
+        resources.close()
+
+async def _process_stocks(config, send_to_telegram, scan_only, resources):
+    """
+    One run of process_stocks over open resources.
+    """
+    from data_retrieval import get_multiple_stocks_data, get_daily_and_intraday_data, DEFAULT_BATCH_SIZE
+    from technical_analysis import scan_indicator_frames
+    
     # Extract configuration values
     symbols = config['stocks']
     period_days = config['time_period']
@@ -56,109 +241,214 @@ async def process_stocks(config, send_to_telegram=False):
     near_cross_threshold = float(notification_config.get('near_cross_threshold_pct', 0.75))
     cooldown_hours = float(notification_config.get('cooldown_hours', 6))
     alignment_enabled = notification_config.get('alignment_enabled', True)
-    state_file = notification_config.get('state_file') or os.path.join(output_dir, DEFAULT_STATE_FILENAME)
+    data_config = config.get('data', {})
+    batch_size = int(data_config.get('batch_size', DEFAULT_BATCH_SIZE))
+    derive_daily = data_config.get('derive_daily', False)
+    compact = data_config.get('compact', False)
+    pipeline_config = config.get('pipeline', {})
+    streaming = pipeline_config.get('streaming', False)
+    max_in_flight = int(pipeline_config.get('max_in_flight', 16))
+    
+    resources.runs += 1
+    metrics_config = config.get('metrics', {})
+    run_started_at = datetime.now(timezone.utc)
+    run_start = time.perf_counter()
+    metrics_baseline = METRICS.begin_run()
+    loop_monitor = LoopStallMonitor().start()
+    ohlcv_cache = resources.ohlcv_cache
+    data_source = resources.data_source
+    signal_state = resources.signal_state
+    history = resources.history
+    fetch_executor = resources.fetch_executor
+    compute_indicators = resources.compute_indicators
+    
+    # Charts are labelled '1d'/'4h'; the registry is keyed by the fetched intervals
+    indicator_registry = resources.indicator_registry
+    chart_indicators = {'1d': indicator_registry.specs_for('1d'), '4h': indicator_registry.specs_for(interval)}
     
-    signal_state = load_signal_state(state_file) if notifications_enabled else {}
     state_dirty = False
     
-    logging.info(f"Analyzing {len(symbols)} stocks: {', '.join(symbols)}")
+    logging.info(f"Analyzing {len(symbols)} stocks")
+    logging.debug(f"Watchlist: {', '.join(symbols)}")
     
     # Initialize Telegram manager if needed
     telegram_manager = None
     if send_to_telegram:
-        telegram_manager = create_telegram_manager(config)
+        telegram_manager = resources.telegram()
         if not telegram_manager:
             logging.error("Failed to initialize Telegram manager. Charts and alerts won't be sent.")
             send_to_telegram = False
+        else:
+            # The manager outlives a tick in the scheduled worker; its report covers this run only
+            telegram_manager.begin_run()
     
     if notifications_enabled and not send_to_telegram:
         logging.info("Notifications enabled but --send flag not provided. Alerts will be logged only.")
     
-    # Retrieve stock data - for both daily and 4h intervals
-    daily_stock_data = get_multiple_stocks_data(symbols, period_days, '1d')
-    if not daily_stock_data:
-        logging.error("Failed to retrieve any daily stock data.")
-        return False
+    only_active_signals = chart_config.get('only_active_signals', False)
     
-    hourly_stock_data = get_multiple_stocks_data(symbols, period_days, interval)
-    if not hourly_stock_data:
-        logging.error("Failed to retrieve any hourly stock data.")
-        return False
+    chart_cache, render_pool = None, None
+    if not scan_only:
+        # The plotting stack is only loaded when charts are rendered
+        from chart_generation import generate_chart
+        chart_cache, render_pool = resources.charts()
+        if chart_cache is not None:
+            chart_cache.begin_run()
+    render_workers = render_pool.workers if render_pool is not None else 0
+    resources.evict(symbols)
     
-    success_count = 0
-    # Process each stock
-    for symbol in symbols:
-        logging.info(f"Processing {symbol}")
-        timeframe_states = {}
-        
-        # Process daily data first
-        if symbol in daily_stock_data:
-            daily_data = daily_stock_data[symbol]
-            
-            # Add technical indicators
-            daily_data_with_indicators = add_indicators(daily_data)
-            if daily_data_with_indicators is not None:
-                if notifications_enabled:
-                    daily_signal = analyze_golden_cross_state(daily_data_with_indicators, near_cross_threshold)
-                    if daily_signal:
-                        timeframe_states['1d'] = daily_signal
-                
-                # Generate daily chart
-                daily_chart_path = os.path.join(output_dir, f"{symbol}_1d_chart.png")
-                daily_success = generate_chart(daily_data_with_indicators, symbol, output_dir, chart_config, interval='1d')
-                if daily_success:
-                    logging.info(f"Successfully generated daily chart for {symbol}")
-                    
-                    # Send to Telegram if requested
-                    if send_to_telegram and telegram_manager:
-                        logging.info(f"Sending {symbol} daily chart to Telegram")
-                        await telegram_manager.send_stock_analysis(
-                            symbol, 
-                            daily_chart_path, 
-                            f"Daily analysis for {symbol} using {period_days} days of data."
-                        )
-                else:
-                    logging.error(f"Failed to generate daily chart for {symbol}")
-            else:
-                logging.error(f"Failed to add indicators for {symbol} daily data. Skipping.")
+    counters = {'daily': 0, 'hourly': 0, 'success': 0}
+    
+    # In streaming mode every symbol holds a slot from the moment its batch is fetched
+    # until it has been delivered, so only max_in_flight symbols' frames are alive at once
+    window = InFlightWindow(max_in_flight) if streaming else None
+    
+    def release(batch):
+        """Free the window slots and cached frames of delivered (or failed) symbols."""
+        # Outside streaming mode the registry keeps each result so unchanged series hit next tick
+        if window is None:
+            return
+        for symbol in batch:
+            resources.release(symbol)
+        window.release(len(batch))
+    
+    async def fetch_stage(batch):
+        """Download both timeframes for a batch of symbols in a worker thread."""
+        if window is not None:
+            await window.acquire(len(batch))
+        loop = asyncio.get_running_loop()
+        fetch_start = time.perf_counter()
+        if derive_daily:
+            # One intraday download per symbol; daily bars are resampled from it
+            daily_stock_data, hourly_stock_data = await loop.run_in_executor(
+                fetch_executor,
+                functools.partial(get_daily_and_intraday_data, batch, period_days, interval,
+                                  batch_size=batch_size, downloader=data_source, cache=ohlcv_cache, compact=compact)
+            )
         else:
-            logging.error(f"No daily data available for {symbol}. Skipping.")
-            
-        # Then process 4h data
-        if symbol in hourly_stock_data:
-            hourly_data = hourly_stock_data[symbol]
-            
-            # Add technical indicators
-            hourly_data_with_indicators = add_indicators(hourly_data)
-            if hourly_data_with_indicators is not None:
-                if notifications_enabled:
-                    hourly_signal = analyze_golden_cross_state(hourly_data_with_indicators, near_cross_threshold)
-                    if hourly_signal:
-                        timeframe_states['4h'] = hourly_signal
-                
-                # Generate 4h chart
-                hourly_chart_path = os.path.join(output_dir, f"{symbol}_4h_chart.png")
-                hourly_success = generate_chart(hourly_data_with_indicators, symbol, output_dir, chart_config, interval='4h')
-                if hourly_success:
-                    logging.info(f"Successfully generated 4h chart for {symbol}")
-                    success_count += 1
-                    
-                    # Send to Telegram if requested
-                    if send_to_telegram and telegram_manager:
-                        logging.info(f"Sending {symbol} 4h chart to Telegram")
-                        await telegram_manager.send_stock_analysis(
-                            symbol, 
-                            hourly_chart_path, 
-                            f"4-hour analysis for {symbol} using {period_days} days of data."
-                        )
-                else:
-                    logging.error(f"Failed to generate 4h chart for {symbol}")
+            daily_stock_data = await loop.run_in_executor(
+                fetch_executor,
+                functools.partial(get_multiple_stocks_data, batch, period_days, '1d', batch_size=batch_size,
+                                  downloader=data_source, cache=ohlcv_cache, compact=compact)
+            )
+            hourly_stock_data = await loop.run_in_executor(
+                fetch_executor,
+                functools.partial(get_multiple_stocks_data, batch, period_days, interval, batch_size=batch_size,
+                                  downloader=data_source, cache=ohlcv_cache, compact=compact)
+            )
+        counters['daily'] += len(daily_stock_data)
+        counters['hourly'] += len(hourly_stock_data)
+        # Symbols are downloaded in bulk, so each gets an equal share of its batch's time
+        share = (time.perf_counter() - fetch_start) / len(batch)
+        for symbol in batch:
+            METRICS.record_symbol(symbol, 'fetch', share)
+        return [(batch, daily_stock_data, hourly_stock_data)]
+    
+    def analyze_batch(daily_stock_data, hourly_stock_data):
+        daily_indicators = {symbol: compute_indicators(symbol, '1d', data) for symbol, data in daily_stock_data.items()}
+        hourly_indicators = {symbol: compute_indicators(symbol, interval, data) for symbol, data in hourly_stock_data.items()}
+        daily_signals = scan_indicator_frames(daily_indicators, near_cross_threshold)
+        hourly_signals = scan_indicator_frames(hourly_indicators, near_cross_threshold)
+        return daily_indicators, hourly_indicators, daily_signals, hourly_signals
+    
+    async def analyze_stage(fetched):
+        """Add indicators, then classify the whole batch in one vectorized pass (in a worker thread)."""
+        batch, daily_stock_data, hourly_stock_data = fetched
+        daily_indicators, hourly_indicators, daily_signals, hourly_signals = await asyncio.get_running_loop().run_in_executor(
+            resources.analyze_executor, analyze_batch, daily_stock_data, hourly_stock_data
+        )
+        
+        analyzed = []
+        for symbol in batch:
+            analyzed.append({
+                'symbol': symbol,
+                'has_daily': symbol in daily_stock_data,
+                'has_hourly': symbol in hourly_stock_data,
+                'daily': daily_indicators.get(symbol),
+                'hourly': hourly_indicators.get(symbol),
+                'daily_signal': daily_signals.get(symbol),
+                'hourly_signal': hourly_signals.get(symbol),
+                'charts': []
+            })
+            if scan_only and hourly_signals.get(symbol):
+                counters['success'] += 1
+        return analyzed
+    
+    async def render_chart(symbol, timeframe, data):
+        if render_pool is not None:
+            _, chart_success = await render_pool.render(data, symbol, output_dir, chart_config, interval=timeframe,
+                                                        cache=chart_cache, indicators=chart_indicators[timeframe])
+            return chart_success
+        return await asyncio.get_running_loop().run_in_executor(
+            resources.render_thread,
+            functools.partial(generate_chart, data, symbol, output_dir, chart_config, interval=timeframe,
+                              cache=chart_cache, indicators=chart_indicators[timeframe])
+        )
+    
+    async def render_stage(item):
+        """Render the symbol's charts (both timeframes at once when a render pool is available)."""
+        symbol = item['symbol']
+        logging.debug(f"Processing {symbol}")
+        item['charts'] = []
+        
+        render_charts = True
+        if only_active_signals:
+            symbol_states = {(item['daily_signal'] or {}).get('state'), (item['hourly_signal'] or {}).get('state')}
+            render_charts = bool(symbol_states & POSITIVE_STATES)
+        if not render_charts:
+            logging.debug(f"No active signal for {symbol}. Skipping charts.")
+            if item['hourly_signal']:
+                counters['success'] += 1
+            return [item]
+        
+        timeframes = []
+        for timeframe, label, data_key, available in (('1d', 'daily', 'daily', item['has_daily']),
+                                                     ('4h', '4h', 'hourly', item['has_hourly'])):
+            if not available:
+                logging.error(f"No {label} data available for {symbol}. Skipping.")
+            elif item[data_key] is None:
+                logging.error(f"Failed to add indicators for {symbol} {label} data. Skipping.")
             else:
-                logging.error(f"Failed to add indicators for {symbol} 4h data. Skipping.")
-        else:
-            logging.error(f"No 4h data available for {symbol}. Skipping.")
+                timeframes.append((timeframe, label, item[data_key]))
+        
+        results = await asyncio.gather(*(render_chart(symbol, timeframe, data) for timeframe, _, data in timeframes))
+        for (timeframe, label, _), chart_success in zip(timeframes, results):
+            if not chart_success:
+                logging.error(f"Failed to generate {label} chart for {symbol}")
+                continue
+            logging.debug(f"Successfully generated {label} chart for {symbol}")
+            if timeframe == '4h':
+                counters['success'] += 1
+            description = 'Daily' if timeframe == '1d' else '4-hour'
+            item['charts'].append((
+                os.path.join(output_dir, f"{symbol}_{timeframe}_chart.png"),
+                f"{description} analysis for {symbol} using {period_days} days of data."
+            ))
+        return [item]
+    
+    async def deliver_stage(item):
+        """Queue the symbol's charts for Telegram and evaluate its alerts."""
+        try:
+            await deliver_symbol(item)
+        finally:
+            release([item['symbol']])
+    
+    async def deliver_symbol(item):
+        nonlocal state_dirty
+        symbol = item['symbol']
+        if item['charts'] and send_to_telegram and telegram_manager:
+            # Both timeframes go out together (one album when media groups are enabled)
+            logging.debug(f"Queueing {len(item['charts'])} {symbol} charts for Telegram")
+            telegram_manager.enqueue(symbol, telegram_manager.send_stock_analyses, symbol, item['charts'])
+        
+        timeframe_states = {}
+        if notifications_enabled:
+            if item['daily_signal']:
+                timeframe_states['1d'] = item['daily_signal']
+            if item['hourly_signal']:
+                timeframe_states['4h'] = item['hourly_signal']
         
-        if notifications_enabled and timeframe_states:
+        if timeframe_states:
             symbol_dirty = await handle_symbol_notifications(
                 symbol=symbol,
                 timeframe_states=timeframe_states,
@@ -166,12 +456,67 @@ async def process_stocks(config, send_to_telegram=False):
                 telegram_manager=telegram_manager if send_to_telegram else None,
                 near_cross_threshold=near_cross_threshold,
                 cooldown_hours=cooldown_hours,
-                alignment_enabled=alignment_enabled
+                alignment_enabled=alignment_enabled,
+                history=history
             )
             state_dirty = state_dirty or symbol_dirty
+    
+    # Fetch, analyze, render and deliver run as concurrent stages joined by bounded
+    # queues, so each symbol is sent as soon as its own charts are ready
+    queue_size = int(pipeline_config.get('queue_size', 8))
+    stages = [
+        Stage('fetch', fetch_stage, pipeline_config.get('fetch_concurrency', 1), queue_size,
+              on_failure=release),
+        Stage('analyze', analyze_stage, pipeline_config.get('analyze_concurrency', 1), queue_size,
+              on_failure=lambda fetched: release(fetched[0])),
+        Stage('render', render_stage, pipeline_config.get('render_concurrency') or max(render_workers, 1), queue_size,
+              on_failure=lambda item: release([item['symbol']])),
+        Stage('deliver', deliver_stage, pipeline_config.get('deliver_concurrency', 1), queue_size)
+    ]
+    if scan_only:
+        # Signals and text alerts only: analyzed symbols go straight to delivery
+        stages = [stage for stage in stages if stage.name != 'render']
+    fetch_size = max(min(batch_size, max_in_flight) if streaming else batch_size, 1)
+    batches = (symbols[offset:offset + fetch_size] for offset in range(0, len(symbols), fetch_size))
+    try:
+        await run_pipeline(batches, stages)
+    finally:
+        loop_report = await loop_monitor.stop()
+    for stage in stages:
+        logging.info(f"Pipeline stage {stage.report()}")
+    logging.info(f"Event loop lag: {loop_report['stalls']} stalls over {loop_report['stall_threshold_seconds'] * 1000:.0f} ms, "
+                 f"longest {loop_report['max_lag_seconds'] * 1000:.1f} ms")
+    if window is not None:
+        logging.info(f"Streaming window: at most {window.peak} of {window.limit} symbols in flight")
+    
+    success_count = counters['success']
+    if not counters['daily']:
+        logging.error("Failed to retrieve any daily stock data.")
+    if not counters['hourly']:
+        logging.error("Failed to retrieve any hourly stock data.")
             
-    if notifications_enabled and state_dirty:
-        save_signal_state(signal_state, state_file)
+    resources.save(state_dirty)
+    
+    if send_to_telegram and telegram_manager:
+        # Wait for queued charts and alerts before the run is reported as done
+        failed_deliveries = await telegram_manager.flush()
+        if failed_deliveries:
+            logging.warning(f"{failed_deliveries} Telegram deliveries failed")
+        telegram_manager.report()
+    
+    if metrics_config.get('report_enabled', True):
+        report = METRICS.run_report(
+            metrics_baseline,
+            started_at=run_started_at.isoformat(),
+            seconds=round(time.perf_counter() - run_start, 3),
+            watchlist=len(symbols),
+            succeeded=success_count,
+            scan_only=scan_only,
+            run=resources.runs,
+            pipeline=[stage.report() for stage in stages],
+            event_loop=loop_report
+        )
+        write_run_report(report, metrics_config.get('report_file') or os.path.join(output_dir, DEFAULT_REPORT_FILENAME))
     
     if success_count > 0:
         logging.info(f"Successfully processed {success_count} out of {len(symbols)} stocks")
@@ -180,15 +525,79 @@ async def process_stocks(config, send_to_telegram=False):
         logging.error("Failed to process any stocks")
         return False
 
-async def scheduled_task(config):
+def history_path(config):
+    """
+    Location of the signal history database for a configuration.
+    """
+    notification_config = config.get('notifications', {})
+    return notification_config.get('history_db') or os.path.join(config['output']['directory'],
+                                                                 DEFAULT_HISTORY_DB_FILENAME)
+
+def parse_history_time(value):
+    """
+    Parse a history bound: a relative age such as '30d' or '12h', or an ISO date/time.
+    """
+    if value is None:
+        return None
+    units = {'d': 'days', 'h': 'hours', 'm': 'minutes'}
+    if value[-1:] in units and value[:-1].isdigit():
+        return datetime.now(timezone.utc) - timedelta(**{units[value[-1]]: int(value[:-1])})
+    return datetime.fromisoformat(value)
+
+def run_history_command(config, args):
+    """
+    Print past signals or counts of them from the signal history.
+    
+    Args:
+        config (dict): Configuration dictionary
+        args (argparse.Namespace): Parsed 'history' subcommand arguments
+    """
+    path = history_path(config)
+    if not os.path.exists(path):
+        logging.error(f"No signal history at {path}")
+        return
+    history = SignalHistory(path)
+    try:
+        if args.prune is not None:
+            print(f"Deleted {history.prune(args.prune)} rows older than {args.prune} days")
+            return
+        filters = {
+            'symbol': args.symbol,
+            'timeframe': args.timeframe,
+            'state': args.state,
+            'fresh': True if args.fresh else None,
+            'notified': True if args.sent else None,
+            'start': parse_history_time(args.since),
+            'end': parse_history_time(args.until)
+        }
+        if args.count or args.group_by:
+            counts = history.count(group_by=args.group_by or (), **filters)
+            if isinstance(counts, dict):
+                for key, value in counts.items():
+                    print(f"{' '.join(str(part) for part in key)}: {value}")
+            else:
+                print(counts)
+            return
+        for row in history.query(limit=args.limit, **filters):
+            flags = ' fresh' if row['is_fresh_cross'] else ''
+            flags += ' sent' if row['notified'] else ''
+            spread = f"{row['spread_pct']:.2f}%" if row['spread_pct'] is not None else '-'
+            print(f"{row['evaluated_at']}  {row['symbol']:<8} {row['timeframe']:<9} {row['state'] or '-':<9} "
+                  f"spread {spread}{flags}")
+    finally:
+        history.close()
+
+async def scheduled_task(config, scan_only=False, resources=None):
     """
     Function to be called by the scheduler.
     
     Args:
         config (dict): Configuration dictionary
+        scan_only (bool): Skip chart rendering
+        resources (RunResources, optional): Resources kept open between ticks
     """
     logging.info("Running scheduled stock analysis task")
-    await process_stocks(config, send_to_telegram=True)
+    await process_stocks(config, send_to_telegram=True, scan_only=scan_only, resources=resources)
 
 def main():
     """
@@ -198,9 +607,27 @@ def main():
     parser = argparse.ArgumentParser(description='Stock Analysis Tool')
     parser.add_argument('--schedule', action='store_true', help='Run in scheduled mode')
     parser.add_argument('--send', action='store_true', help='Send results to Telegram')
+    parser.add_argument('--validate-daily', action='store_true',
+                        help='Compare daily bars derived from intraday data with a direct daily download and exit')
+    parser.add_argument('--scan-only', action='store_true',
+                        help='Evaluate signals and send text alerts without rendering charts')
+    subparsers = parser.add_subparsers(dest='command')
+    history_parser = subparsers.add_parser('history', help='Query past signals and alerts')
+    history_parser.add_argument('--symbol', help='Only this symbol')
+    history_parser.add_argument('--timeframe', choices=['1d', '4h', 'alignment'], help='Only this timeframe')
+    history_parser.add_argument('--state', choices=['golden', 'near', 'neutral', 'alignment'], help='Only this state')
+    history_parser.add_argument('--since', help="Start of the range: an age such as '30d' or an ISO date")
+    history_parser.add_argument('--until', help="End of the range: an age such as '1d' or an ISO date")
+    history_parser.add_argument('--fresh', action='store_true', help='Only fresh golden crosses')
+    history_parser.add_argument('--sent', action='store_true', help='Only evaluations that sent an alert')
+    history_parser.add_argument('--count', action='store_true', help='Print the number of matching rows')
+    history_parser.add_argument('--group-by', nargs='+', choices=sorted(GROUP_COLUMNS),
+                                help='Print counts grouped by these fields')
+    history_parser.add_argument('--limit', type=int, default=50, help='Rows to print (newest first)')
+    history_parser.add_argument('--prune', type=int, metavar='DAYS', help='Delete rows older than DAYS and exit')
     args = parser.parse_args()
     
-    # Set up logging
+    # Set up logging with the defaults until the configuration is loaded
     setup_logging()
     
     # Load configuration
@@ -208,49 +635,89 @@ def main():
     if not config:
         logging.error("Failed to load configuration. Exiting.")
         return
+    setup_logging(config.get('logging'))
+    http_pool.configure(config.get('http'))
+    logging.info("Starting Stock Analysis Tool")
+    
+    if args.command == 'history':
+        run_history_command(config, args)
+        return
+    
+    if args.validate_daily:
+        from data_retrieval import validate_daily_resampling
+        from data_sources import create_data_source
+        from fetch_executor import ResilientFetcher
+        downloader = ResilientFetcher.from_config(create_data_source(config['data']), config.get('fetch', {}))
+        reports = validate_daily_resampling(config['stocks'], config['time_period'], config['interval'],
+                                            downloader=downloader)
+        failed = [symbol for symbol, report in reports.items() if not report['ok']]
+        if failed:
+            logging.warning(f"Derived daily bars deviate for: {', '.join(failed)}")
+        else:
+            logging.info(f"Derived daily bars match for all {len(reports)} validated symbols")
+        return
     
     if args.schedule:
         # Run in scheduled mode
         logging.info("Starting in scheduled mode")
         
         # Create schedule manager and run scheduled tasks
-        asyncio.run(run_scheduled_mode(config, args.send))
+        asyncio.run(run_scheduled_mode(config, args.send, scan_only=args.scan_only))
     else:
         # Run once
-        asyncio.run(process_stocks(config, send_to_telegram=args.send))
+        asyncio.run(process_stocks(config, send_to_telegram=args.send, scan_only=args.scan_only))
     
     logging.info("Stock analysis completed")
 
-async def run_scheduled_mode(config, run_initial=False):
+async def run_scheduled_mode(config, run_initial=False, scan_only=False):
     """
     Run the bot in scheduled mode.
     
     Args:
         config (dict): Configuration dictionary
         run_initial (bool): Whether to run an initial analysis immediately
+        scan_only (bool): Skip chart rendering in every run
     """
-    # Create schedule manager
-    schedule_manager = create_schedule_manager_from_config(
-        config, 
-        lambda: asyncio.run(scheduled_task(config))
-    )
+    # Every tick runs on this loop with the same warm resources; the scheduler thread
+    # only hands the trigger over, and skips it while the previous run is still going
+    resources = RunResources(config, persistent=True)
+    job = LoopJob('stock analysis', functools.partial(scheduled_task, config, scan_only, resources),
+                  asyncio.get_running_loop())
+    schedule_manager = create_schedule_manager_from_config(config, job)
+    
+    metrics_server = None
+    metrics_config = config.get('metrics', {})
+    if metrics_config.get('http_enabled', False):
+        try:
+            metrics_server = await start_metrics_server(metrics_config.get('http_host', '127.0.0.1'),
+                                                        int(metrics_config.get('http_port', DEFAULT_METRICS_PORT)))
+        except OSError as e:
+            logging.error(f"Failed to start the metrics endpoint: {str(e)}")
     
     try:
         # Run a test task immediately if requested
         if run_initial:
             logging.info("Running initial analysis and sending to Telegram")
-            await process_stocks(config, send_to_telegram=True)
+            job.start()
         
         # Keep the main thread alive while scheduler runs in background
         logging.info("Scheduler is running. Press Ctrl+C to exit.")
         while True:
             await asyncio.sleep(1)
-    except KeyboardInterrupt:
+    except (KeyboardInterrupt, asyncio.CancelledError):
         logging.info("Received exit signal. Shutting down...")
+    finally:
         schedule_manager.shutdown()
+        if job.running:
+            # Let the run in progress save its state before the resources close
+            logging.info("Waiting for the current run to finish...")
+            await job.wait()
+        resources.close()
+        if metrics_server is not None:
+            metrics_server.close()
 
 async def handle_symbol_notifications(symbol, timeframe_states, signal_state, telegram_manager,
-                                      near_cross_threshold, cooldown_hours, alignment_enabled):
+                                      near_cross_threshold, cooldown_hours, alignment_enabled, history=None):
     state_dirty = False
     sent_flags = {}
     
@@ -262,7 +729,7 @@ async def handle_symbol_notifications(symbol, timeframe_states, signal_state, te
         if should_send:
             message = build_signal_message(symbol, timeframe, state_info, near_cross_threshold)
             if telegram_manager:
-                await telegram_manager.send_message(message)
+                telegram_manager.enqueue(symbol, telegram_manager.send_message, message)
             else:
                 logging.info(f"[Notification] {message}")
             new_entry['last_notified_at'] = datetime.now(timezone.utc).isoformat()
@@ -270,6 +737,9 @@ async def handle_symbol_notifications(symbol, timeframe_states, signal_state, te
             new_entry['last_notified_at'] = previous['last_notified_at']
         
         update_state(signal_state, symbol, timeframe, new_entry)
+        record_evaluation(timeframe, new_entry, should_send)
+        if history is not None:
+            history.record(symbol, timeframe, new_entry, should_send)
         sent_flags[timeframe] = should_send
         state_dirty = True
     
@@ -293,7 +763,7 @@ async def handle_symbol_notifications(symbol, timeframe_states, signal_state, te
                 if send_alignment:
                     message = build_alignment_message(symbol, '4h', fast_state, '1d', slow_state)
                     if telegram_manager:
-                        await telegram_manager.send_message(message)
+                        telegram_manager.enqueue(symbol, telegram_manager.send_message, message)
                     else:
                         logging.info(f"[Notification] {message}")
                     alignment_record['last_notified_at'] = datetime.now(timezone.utc).isoformat()
@@ -301,6 +771,9 @@ async def handle_symbol_notifications(symbol, timeframe_states, signal_state, te
                     alignment_record['last_notified_at'] = previous_alignment['last_notified_at']
                 
                 update_state(signal_state, symbol, 'alignment', alignment_record)
+                record_evaluation('alignment', alignment_record, send_alignment)
+                if history is not None:
+                    history.record(symbol, 'alignment', alignment_record, send_alignment)
                 state_dirty = True
     
     return state_dirty
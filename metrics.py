@@ -0,0 +1,323 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is unbounded
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DEFAULT_REPORT_FILENAME = "run_report.json"
+DEFAULT_METRICS_PORT = 9108
+METRIC_PREFIX = 'plotin_'
+
+# (hits counter, misses counter) behind each hit rate in the run report
+CACHE_COUNTERS = {
+    'ohlcv': ('ohlcv_cache_hits_total', 'ohlcv_cache_misses_total'),
+    'indicators': ('indicator_cache_hits_total', 'indicator_cache_misses_total'),
+    'charts': ('chart_cache_hits_total', 'chart_cache_misses_total'),
+    'telegram_file_ids': ('telegram_charts_reused_total', 'telegram_charts_uploaded_total'),
+    'http_connections': ('http_connections_reused_total', 'http_connections_opened_total')
+}
+
+class Histogram:
+    """
+    Latency distribution over fixed buckets, plus the count, sum and maximum.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def copy(self):
+        histogram = Histogram(self.buckets)
+        histogram.counts = list(self.counts)
+        histogram.count, histogram.sum, histogram.max = self.count, self.sum, self.max
+        return histogram
+
+    def minus(self, earlier):
+        """
+        Observations made since an earlier copy (the maximum is kept as is).
+        """
+        histogram = self.copy()
+        if earlier is not None:
+            histogram.counts = [now - then for now, then in zip(self.counts, earlier.counts)]
+            histogram.count -= earlier.count
+            histogram.sum -= earlier.sum
+        return histogram
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the q-quantile (the maximum for the last bucket).
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum_seconds': round(self.sum, 6),
+            'mean_seconds': round(self.sum / self.count, 6) if self.count else None,
+            'p50_seconds': round(self.quantile(0.5), 6) if self.count else None,
+            'p95_seconds': round(self.quantile(0.95), 6) if self.count else None,
+            'max_seconds': round(self.max, 6)
+        }
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items() if value is not None))
+
+def _label_text(key):
+    return ','.join(f"{name}={value}" for name, value in key)
+
+class MetricsRegistry:
+    """
+    Counters, gauges and latency histograms recorded by every module, keyed by name and labels.
+
+    Values accumulate for the life of the process (as the Prometheus endpoint expects);
+    run_report() turns the difference to a snapshot taken at the start of a run into that
+    run's report. Per-symbol timings are kept for the current run only.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.symbol_seconds = {}
+
+    def inc(self, name, value=1, **labels):
+        """
+        Add to a counter.
+        """
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """
+        Set a gauge to its current value.
+        """
+        key = _label_key(labels)
+        with self._lock:
+            self.gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name, seconds, symbol=None, **labels):
+        """
+        Record a duration in a histogram, and against the symbol if given (under the
+        metric name without its '_seconds' suffix).
+        """
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(seconds)
+        if symbol is not None:
+            self.record_symbol(symbol, name[:-len('_seconds')] if name.endswith('_seconds') else name, seconds)
+
+    def record_symbol(self, symbol, stage, seconds):
+        """
+        Add time spent on a symbol in a stage, for the per-symbol breakdown of the run.
+        """
+        with self._lock:
+            timings = self.symbol_seconds.setdefault(symbol, {})
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, name, symbol=None, **labels):
+        """
+        Time a block into a histogram.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, symbol=symbol, **labels)
+
+    def snapshot(self):
+        """
+        Copy of every counter and histogram, to diff a run against.
+        """
+        with self._lock:
+            return {
+                'counters': {name: dict(series) for name, series in self.counters.items()},
+                'gauges': {name: dict(series) for name, series in self.gauges.items()},
+                'histograms': {name: {key: histogram.copy() for key, histogram in series.items()}
+                               for name, series in self.histograms.items()}
+            }
+
+    def begin_run(self):
+        """
+        Start a run: clear the per-symbol timings and return the baseline snapshot.
+        """
+        with self._lock:
+            self.symbol_seconds = {}
+        return self.snapshot()
+
+    def run_report(self, baseline=None, **fields):
+        """
+        Everything recorded since baseline, as a JSON-serializable dict.
+
+        Args:
+            baseline (dict, optional): snapshot() taken when the run started
+            **fields: Extra top-level fields (e.g. run duration and result)
+
+        Returns:
+            dict: Counters, current gauges, histogram summaries, cache hit rates and per-symbol timings
+        """
+        baseline = baseline or {'counters': {}, 'histograms': {}}
+        current = self.snapshot()
+        with self._lock:
+            symbol_seconds = {symbol: dict(timings) for symbol, timings in self.symbol_seconds.items()}
+
+        counters = {}
+        for name, series in current['counters'].items():
+            before = baseline['counters'].get(name, {})
+            values = {key: value - before.get(key, 0) for key, value in series.items()}
+            values = {key: value for key, value in values.items() if value}
+            if values:
+                counters[name] = values
+        histograms = {}
+        for name, series in current['histograms'].items():
+            before = baseline['histograms'].get(name, {})
+            values = {key: histogram.minus(before.get(key)) for key, histogram in series.items()}
+            values = {key: histogram for key, histogram in values.items() if histogram.count}
+            if values:
+                histograms[name] = values
+
+        def total(name):
+            return sum(counters.get(name, {}).values())
+
+        hit_rates = {}
+        for cache, (hits, misses) in CACHE_COUNTERS.items():
+            lookups = total(hits) + total(misses)
+            hit_rates[cache] = round(total(hits) / lookups, 4) if lookups else None
+
+        slowest = sorted(symbol_seconds.items(), key=lambda item: sum(item[1].values()), reverse=True)
+        report = dict(fields)
+        report.update({
+            'generated_at': datetime.now(timezone.utc).isoformat(),
+            'stages': {dict(key).get('stage', 'all'): histogram.summary()
+                       for key, histogram in histograms.get('pipeline_stage_seconds', {}).items()},
+            'histograms': {name: {_label_text(key) or 'all': histogram.summary() for key, histogram in series.items()}
+                           for name, series in histograms.items()},
+            'counters': {name: {_label_text(key) or 'all': value for key, value in series.items()}
+                         for name, series in counters.items()},
+            'gauges': {name: {_label_text(key) or 'all': value for key, value in series.items()}
+                       for name, series in current['gauges'].items()},
+            'cache_hit_rates': hit_rates,
+            'slowest_symbols': [{'symbol': symbol, 'seconds': round(sum(timings.values()), 6)}
+                                for symbol, timings in slowest[:10]],
+            'symbols': {symbol: {stage: round(seconds, 6) for stage, seconds in timings.items()}
+                        for symbol, timings in symbol_seconds.items()}
+        })
+        return report
+
+    def prometheus_text(self):
+        """
+        Every metric in the Prometheus text exposition format.
+        """
+        def labels_text(key, extra=()):
+            pairs = list(key) + list(extra)
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+        current = self.snapshot()
+        lines = []
+        for name, series in sorted(current['counters'].items()):
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} counter")
+            for key, value in sorted(series.items()):
+                lines.append(f"{METRIC_PREFIX}{name}{labels_text(key)} {value}")
+        for name, series in sorted(current['gauges'].items()):
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} gauge")
+            for key, value in sorted(series.items()):
+                lines.append(f"{METRIC_PREFIX}{name}{labels_text(key)} {value}")
+        for name, series in sorted(current['histograms'].items()):
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} histogram")
+            for key, histogram in sorted(series.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{METRIC_PREFIX}{name}_bucket{labels_text(key, [('le', bound)])} {cumulative}")
+                lines.append(f"{METRIC_PREFIX}{name}_bucket{labels_text(key, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{METRIC_PREFIX}{name}_sum{labels_text(key)} {histogram.sum:.6f}")
+                lines.append(f"{METRIC_PREFIX}{name}_count{labels_text(key)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.gauges = {}
+            self.histograms = {}
+            self.symbol_seconds = {}
+
+# Shared by every module of the process
+METRICS = MetricsRegistry()
+
+def write_run_report(report, path):
+    """
+    Write a run report as JSON, replacing the previous one atomically.
+    """
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path + '.tmp', 'w') as handle:
+            json.dump(report, handle, indent=2)
+        os.replace(path + '.tmp', path)
+        logging.info(f"Run report written to {path}")
+    except Exception as e:
+        logging.error(f"Failed to write run report {path}: {str(e)}")
+
+async def start_metrics_server(host='127.0.0.1', port=DEFAULT_METRICS_PORT, registry=None):
+    """
+    Serve the registry at http://host:port/metrics on the running event loop.
+
+    Returns:
+        asyncio.AbstractServer: The listening server (close it on shutdown)
+    """
+    registry = registry or METRICS
+
+    async def handle(reader, writer):
+        try:
+            request_line = await reader.readline()
+            # Drain the headers; the endpoint takes no request body
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] in ('/metrics', '/'):
+                status, content_type, body = '200 OK', 'text/plain; version=0.0.4', registry.prometheus_text()
+            else:
+                status, content_type, body = '404 Not Found', 'text/plain', 'not found\n'
+            payload = body.encode('utf-8')
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                         f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode('latin-1') + payload)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logging.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+    return server
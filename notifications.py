@@ -2,7 +2,10 @@ import json
 import logging
 import os
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Union
+
+from metrics import METRICS
+from signal_store import SignalStateStore
 
 DEFAULT_STATE_FILENAME = "signal_state.json"
 
@@ -31,20 +34,49 @@ def load_signal_state(path: str) -> Dict[str, Any]:
         logging.error(f"Failed to load signal state from {path}: {exc}")
         return {}
 
-def save_signal_state(state: Dict[str, Any], path: str) -> None:
+def open_signal_state(backend: str, path: str, legacy_path: Optional[str] = None) -> Union[Dict[str, Any], SignalStateStore]:
+    """
+    Load the signal state for a run: a SignalStateStore for the 'sqlite' backend
+    (importing legacy_path once), otherwise the JSON document at path.
+    """
+    if backend == "sqlite":
+        try:
+            return SignalStateStore(path, legacy_json_path=legacy_path)
+        except Exception as exc:
+            logging.error(f"Failed to open signal state database {path}: {exc}. Falling back to {legacy_path}.")
+            path = legacy_path
+    return load_signal_state(path)
+
+def save_signal_state(state: Union[Dict[str, Any], SignalStateStore], path: Optional[str] = None) -> None:
+    if isinstance(state, SignalStateStore):
+        try:
+            state.commit()
+        except Exception as exc:
+            logging.error(f"Failed to commit signal state to {state.path}: {exc}")
+        return
     directory = os.path.dirname(path)
     if directory:
         os.makedirs(directory, exist_ok=True)
+    # Write a sibling file and swap it in, so a crash never leaves a truncated document
+    temp_path = f"{path}.tmp"
     try:
-        with open(path, "w") as handle:
+        with open(temp_path, "w") as handle:
             json.dump(state, handle, indent=2)
+        os.replace(temp_path, path)
     except Exception as exc:
         logging.error(f"Failed to persist signal state to {path}: {exc}")
 
-def get_previous_state(state_store: Dict[str, Any], symbol: str, timeframe: str) -> Optional[Dict[str, Any]]:
+def get_previous_state(state_store: Union[Dict[str, Any], SignalStateStore],
+                       symbol: str, timeframe: str) -> Optional[Dict[str, Any]]:
+    if isinstance(state_store, SignalStateStore):
+        return state_store.get(symbol, timeframe)
     return state_store.get(symbol, {}).get(timeframe)
 
-def update_state(state_store: Dict[str, Any], symbol: str, timeframe: str, info: Dict[str, Any]) -> None:
+def update_state(state_store: Union[Dict[str, Any], SignalStateStore],
+                 symbol: str, timeframe: str, info: Dict[str, Any]) -> None:
+    if isinstance(state_store, SignalStateStore):
+        state_store.update(symbol, timeframe, info)
+        return
     state_store.setdefault(symbol, {})[timeframe] = info
 
 def should_send_notification(previous: Optional[Dict[str, Any]],
@@ -72,6 +104,14 @@ def should_send_notification(previous: Optional[Dict[str, Any]],
     
     return False
 
+def record_evaluation(timeframe: str, state_info: Dict[str, Any], sent: bool) -> None:
+    """Count an evaluated signal, and the alert if one was sent, in the run metrics."""
+    state = state_info.get("state")
+    METRICS.inc("signal_evaluations_total", timeframe=timeframe, state=state)
+    if sent:
+        fresh = "true" if state_info.get("is_fresh_cross") else "false"
+        METRICS.inc("alerts_total", timeframe=timeframe, state=state, fresh=fresh)
+
 def format_timeframe_label(timeframe: str) -> str:
     mapping = {
         "1d": "Daily",
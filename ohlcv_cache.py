@@ -0,0 +1,200 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+TIMESTAMP_FIELD = '__ts__'
+
+class OHLCVCache:
+    """
+    On-disk store of OHLCV history, one memory-mapped NumPy file per symbol and interval.
+
+    Each entry is a structured array holding the candle timestamps (int64 nanoseconds, UTC)
+    next to the price columns with their original dtypes, plus a small JSON sidecar with the
+    index timezone and the earliest start date that has been fetched for the entry.
+
+    A long-lived process can also keep the latest frame per entry in memory, so repeated
+    runs skip the disk read; with no directory the cache lives in memory only.
+    """
+    def __init__(self, directory, max_pending=None, keep_in_memory=False):
+        """
+        Initialize the cache.
+
+        Args:
+            directory (str): Directory holding the cache files (None for a memory-only cache)
+            max_pending (int, optional): Queued writes allowed before store_async waits for the
+                oldest one (each queued write holds a copy of its frame); unbounded by default
+            keep_in_memory (bool): Serve loads from the frames stored by this process
+        """
+        self.directory = directory
+        self.max_pending = max_pending
+        self._memory = {} if keep_in_memory or directory is None else None
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ohlcv-cache')
+        self._pending = []
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, symbol, interval):
+        stem = os.path.join(self.directory, f"{symbol.replace('/', '_')}_{interval}")
+        return f"{stem}.npy", f"{stem}.json"
+
+    def load(self, symbol, interval):
+        """
+        Load the cached history for a symbol.
+
+        Args:
+            symbol (str): Stock symbol
+            interval (str): Data interval
+
+        Returns:
+            tuple: (pandas.DataFrame, pandas.Timestamp covered start) or (None, None) on a miss
+        """
+        if self._memory is not None and (symbol, interval) in self._memory:
+            return self._memory[(symbol, interval)]
+        if self.directory is None:
+            return None, None
+        array_path, meta_path = self._paths(symbol, interval)
+        if not (os.path.exists(array_path) and os.path.exists(meta_path)):
+            return None, None
+
+        try:
+            with open(meta_path, 'r') as handle:
+                meta = json.load(handle)
+            records = np.load(array_path, mmap_mode='r')
+
+            index = pd.to_datetime(np.asarray(records[TIMESTAMP_FIELD]), utc=True)
+            if meta.get('tz'):
+                index = index.tz_convert(meta['tz'])
+            else:
+                index = index.tz_localize(None)
+            index.name = meta.get('index_name')
+
+            columns = [name for name in records.dtype.names if name != TIMESTAMP_FIELD]
+            frame = pd.DataFrame({name: np.array(records[name]) for name in columns}, index=index)
+            if self._memory is not None:
+                self._memory[(symbol, interval)] = (frame, pd.Timestamp(meta['start']))
+            return frame, pd.Timestamp(meta['start'])
+        except Exception as exc:
+            logging.error(f"Failed to read cached {interval} data for {symbol}: {exc}")
+            return None, None
+
+    def store(self, symbol, interval, data, start):
+        """
+        Persist the history for a symbol, replacing the previous entry atomically.
+
+        Args:
+            symbol (str): Stock symbol
+            interval (str): Data interval
+            data (pandas.DataFrame): History with a DatetimeIndex and flat columns
+            start (datetime): Earliest date covered by the stored history
+        """
+        if self._memory is not None:
+            self._memory[(symbol, interval)] = (data, pd.Timestamp(start))
+        if self.directory is not None:
+            self._write(symbol, interval, data, start)
+
+    def _write(self, symbol, interval, data, start):
+        array_path, meta_path = self._paths(symbol, interval)
+        index = pd.DatetimeIndex(data.index)
+        tz = str(index.tz) if index.tz is not None else None
+        utc_index = index.tz_convert('UTC') if tz else index
+
+        dtype = [(TIMESTAMP_FIELD, '<i8')] + [(str(column), data[column].dtype.str) for column in data.columns]
+        records = np.empty(len(data), dtype=dtype)
+        records[TIMESTAMP_FIELD] = utc_index.asi8
+        for column in data.columns:
+            records[str(column)] = data[column].to_numpy()
+
+        meta = {
+            'tz': tz,
+            'index_name': index.name,
+            'start': pd.Timestamp(start).isoformat(),
+            'rows': len(data)
+        }
+
+        with self._lock:
+            try:
+                # Write to temporary files first so readers never see a partial entry
+                with open(array_path + '.tmp', 'wb') as handle:
+                    np.save(handle, records)
+                with open(meta_path + '.tmp', 'w') as handle:
+                    json.dump(meta, handle)
+                os.replace(array_path + '.tmp', array_path)
+                os.replace(meta_path + '.tmp', meta_path)
+            except Exception as exc:
+                logging.error(f"Failed to cache {interval} data for {symbol}: {exc}")
+
+    def store_async(self, symbol, interval, data, start):
+        """
+        Queue a store on the background writer so callers are not blocked by disk I/O.
+        """
+        data = data.copy()
+        if self._memory is not None:
+            # Later loads see this frame even before the writer has run
+            self._memory[(symbol, interval)] = (data, pd.Timestamp(start))
+        if self.directory is None:
+            return None
+        self._pending = [future for future in self._pending if not future.done()]
+        if self.max_pending and len(self._pending) >= self.max_pending:
+            self._pending.pop(0).result()
+        future = self._writer.submit(self._write, symbol, interval, data, start)
+        self._pending.append(future)
+        return future
+
+    def flush(self):
+        """
+        Wait for all queued writes to finish.
+        """
+        pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+
+    def evict(self, symbols):
+        """
+        Drop in-memory entries for symbols no longer on the watchlist.
+        """
+        if self._memory is not None:
+            keep = set(symbols)
+            self._memory = {key: value for key, value in self._memory.items() if key[0] in keep}
+
+def merge_history(cached, fresh, start=None):
+    """
+    Append freshly downloaded candles to cached history.
+
+    Overlapping candles are taken from the fresh download, since the last cached
+    candle may have been captured while it was still forming.
+
+    Args:
+        cached (pandas.DataFrame): Cached history
+        fresh (pandas.DataFrame): Newly downloaded tail (may be None or empty)
+        start (datetime, optional): Drop candles before this time, so the history does
+            not keep growing by the new candles of every run
+
+    Returns:
+        pandas.DataFrame: Merged, de-duplicated history sorted by time
+    """
+    merged = cached
+    if fresh is not None and not fresh.empty:
+        if cached.index.tz is not None and fresh.index.tz is not None:
+            fresh = fresh.tz_convert(cached.index.tz)
+        merged = pd.concat([cached, fresh[cached.columns.intersection(fresh.columns)]])
+        merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+    if start is not None:
+        merged = merged[merged.index >= align_timestamp(start, merged.index)]
+    return merged
+
+def align_timestamp(value, index):
+    """
+    Express a naive local datetime in the timezone of an index for comparisons.
+    """
+    stamp = pd.Timestamp(value)
+    if index.tz is not None and stamp.tzinfo is None:
+        return stamp.tz_localize(index.tz)
+    if index.tz is None and stamp.tzinfo is not None:
+        return stamp.tz_localize(None)
+    return stamp
@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import time
+
+from metrics import METRICS
+
+_END_OF_STREAM = object()
+
+class Stage:
+    """
+    One step of a pipeline: a coroutine handler run by a fixed number of workers.
+
+    The handler receives one item and returns an iterable of items for the next
+    stage (or None). Each stage reads from a bounded queue, so a slow stage
+    applies backpressure to the stages before it.
+    """
+    def __init__(self, name, handler, concurrency=1, queue_size=8, on_failure=None):
+        """
+        Initialize the stage.
+
+        Args:
+            name (str): Stage name used in logs and reports
+            handler (callable): Coroutine function handling one item
+            concurrency (int): Number of workers running the handler
+            queue_size (int): Capacity of the stage's input queue
+            on_failure (callable, optional): Called with the item when the handler raises
+        """
+        self.name = name
+        self.handler = handler
+        self.on_failure = on_failure
+        self.concurrency = max(1, int(concurrency))
+        self.queue_size = max(1, int(queue_size))
+        self.processed = 0
+        self.failures = 0
+        self.busy_seconds = 0.0
+
+    def report(self):
+        """
+        Summary of the work done by the stage.
+        """
+        return {
+            'stage': self.name,
+            'concurrency': self.concurrency,
+            'processed': self.processed,
+            'failures': self.failures,
+            'busy_seconds': round(self.busy_seconds, 3)
+        }
+
+class InFlightWindow:
+    """
+    Caps how many units of work (e.g. symbols) are between admission and release.
+
+    A unit is admitted before its data is fetched and released once it has left the
+    last stage, so the number of frames alive at once stays bounded no matter how
+    many items the pipeline is fed.
+    """
+    def __init__(self, limit):
+        """
+        Args:
+            limit (int): Maximum units in flight
+        """
+        self.limit = max(1, int(limit))
+        self.in_flight = 0
+        self.peak = 0
+        self._released = asyncio.Event()
+
+    async def acquire(self, count=1):
+        """
+        Wait until count more units fit in the window (a group larger than the window
+        is admitted alone).
+        """
+        while self.in_flight and self.in_flight + count > self.limit:
+            self._released.clear()
+            await self._released.wait()
+        self.in_flight += count
+        self.peak = max(self.peak, self.in_flight)
+
+    def release(self, count=1):
+        """
+        Return units to the window.
+        """
+        self.in_flight = max(0, self.in_flight - count)
+        self._released.set()
+
+class LoopStallMonitor:
+    """
+    Measures how long the event loop goes without getting back to its ready callbacks.
+
+    A probe task sleeps for `interval` and records how late it wakes up. The lag is time the
+    loop spent in code that did not yield: synchronous file and console writes, CPU work on
+    the loop thread, or waiting for a lock another thread holds.
+    """
+    def __init__(self, interval=0.01, threshold=0.05):
+        """
+        Args:
+            interval (float): Seconds between probes
+            threshold (float): Lag (seconds) that counts as a stall
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.samples = 0
+        self.lag_seconds = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.stall_seconds = 0.0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._probe())
+        return self
+
+    async def _probe(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - expected)
+            self.samples += 1
+            self.lag_seconds += lag
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                self.stalls += 1
+                self.stall_seconds += lag
+            METRICS.observe('event_loop_lag_seconds', lag)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        return self.report()
+
+    def report(self):
+        """
+        Lag totals for the run.
+        """
+        return {
+            'samples': self.samples,
+            'lag_seconds': round(self.lag_seconds, 6),
+            'max_lag_seconds': round(self.max_lag, 6),
+            'stalls': self.stalls,
+            'stall_seconds': round(self.stall_seconds, 6),
+            'stall_threshold_seconds': self.threshold
+        }
+
+async def run_pipeline(items, stages):
+    """
+    Push items through stages connected by bounded queues.
+
+    Args:
+        items (iterable): Inputs for the first stage
+        stages (list): Stage instances in processing order
+
+    Returns:
+        list: The stages, with their counters filled in
+    """
+    queues = [asyncio.Queue(maxsize=stage.queue_size) for stage in stages]
+
+    async def feed():
+        for item in items:
+            await queues[0].put(item)
+        for _ in range(stages[0].concurrency):
+            await queues[0].put(_END_OF_STREAM)
+
+    async def worker(index):
+        stage = stages[index]
+        inbox = queues[index]
+        outbox = queues[index + 1] if index + 1 < len(stages) else None
+        while True:
+            item = await inbox.get()
+            if item is _END_OF_STREAM:
+                return
+            start = time.perf_counter()
+            try:
+                outputs = await stage.handler(item)
+            except Exception as e:
+                stage.failures += 1
+                logging.error(f"Pipeline stage '{stage.name}' failed: {str(e)}")
+                if stage.on_failure is not None:
+                    stage.on_failure(item)
+                outputs = None
+            elapsed = time.perf_counter() - start
+            stage.busy_seconds += elapsed
+            METRICS.observe('pipeline_stage_seconds', elapsed, stage=stage.name)
+            stage.processed += 1
+            if outbox is not None and outputs:
+                for output in outputs:
+                    await outbox.put(output)
+
+    async def run_stage(index):
+        await asyncio.gather(*(worker(index) for _ in range(stages[index].concurrency)))
+        # Once every worker has drained its input, close the next stage's input
+        if index + 1 < len(stages):
+            for _ in range(stages[index + 1].concurrency):
+                await queues[index + 1].put(_END_OF_STREAM)
+
+    await asyncio.gather(feed(), *(run_stage(index) for index in range(len(stages))))
+    return stages
@@ -1,9 +1,77 @@
+import asyncio
 import logging
 import threading
 import time
 from datetime import datetime
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
+
+class LoopJob:
+    """
+    A scheduled job that runs a coroutine on the application's event loop.
+    
+    The scheduler thread only hands the trigger over to the loop, so every run shares the
+    loop (and whatever state the coroutine keeps warm). A trigger that fires while the
+    previous run is still going is skipped rather than started alongside it.
+    """
+    def __init__(self, name, coroutine_func, loop):
+        """
+        Initialize the job.
+        
+        Args:
+            name (str): Name used in log messages
+            coroutine_func (callable): Returns the coroutine to run for each trigger
+            loop (asyncio.AbstractEventLoop): Loop the runs are dispatched to
+        """
+        self.name = name
+        self.coroutine_func = coroutine_func
+        self.loop = loop
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.last_seconds = None
+        self._task = None
+    
+    def __call__(self):
+        """
+        Trigger a run from any thread (this is what the scheduler calls).
+        """
+        self.loop.call_soon_threadsafe(self.start)
+    
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+    
+    def start(self):
+        """
+        Start a run on the loop unless one is already in progress.
+        
+        Returns:
+            asyncio.Task: The started run, or None if the trigger was skipped
+        """
+        if self.running:
+            self.skipped += 1
+            logging.warning(f"Skipping {self.name}: the previous run is still in progress ({self.skipped} skipped)")
+            return None
+        self._task = self.loop.create_task(self._run())
+        return self._task
+    
+    async def _run(self):
+        start = time.perf_counter()
+        try:
+            await self.coroutine_func()
+        except Exception as e:
+            self.failures += 1
+            logging.error(f"Scheduled {self.name} failed: {e}")
+        finally:
+            self.runs += 1
+            self.last_seconds = time.perf_counter() - start
+            logging.info(f"Scheduled {self.name} finished in {self.last_seconds:.2f}s (run {self.runs})")
+    
+    async def wait(self):
+        """
+        Wait for the run in progress, if any.
+        """
+        if self.running:
+            await asyncio.shield(self._task)
 
 class ScheduleManager:
     """
@@ -13,6 +81,8 @@ class ScheduleManager:
         """
         Initialize the schedule manager with a background scheduler.
         """
+        # APScheduler is only loaded by --schedule runs
+        from apscheduler.schedulers.background import BackgroundScheduler
         self.scheduler = BackgroundScheduler()
         self.scheduler.start()
         self.job_map = {}  # To keep track of scheduled jobs
@@ -54,6 +124,7 @@ class ScheduleManager:
         Returns:
             bool: True if job was added successfully, False otherwise
         """
+        from apscheduler.triggers.cron import CronTrigger
         trigger = CronTrigger(
             day_of_week=day_of_week,
             hour=hour,
@@ -0,0 +1,207 @@
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+DEFAULT_HISTORY_DB_FILENAME = "signal_history.db"
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS signal_history (
+        evaluated_at INTEGER NOT NULL,
+        symbol TEXT NOT NULL,
+        timeframe TEXT NOT NULL,
+        candle_time TEXT,
+        state TEXT,
+        is_fresh_cross INTEGER NOT NULL,
+        spread_pct REAL,
+        close REAL,
+        notified INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS signal_history_time ON signal_history (evaluated_at)",
+    "CREATE INDEX IF NOT EXISTS signal_history_symbol ON signal_history (symbol, timeframe, evaluated_at)"
+)
+
+GROUP_COLUMNS = {
+    'symbol': 'symbol',
+    'timeframe': 'timeframe',
+    'state': 'state',
+    'fresh': 'is_fresh_cross',
+    'notified': 'notified',
+    'day': "date(evaluated_at, 'unixepoch')"
+}
+
+def _epoch(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+class SignalHistory:
+    """
+    Append-only record of every evaluated signal state and every sent alert.
+
+    Rows live in SQLite (WAL mode) with indexes on the evaluation time and on
+    (symbol, timeframe, time), so range queries and counts stay fast at millions of
+    rows. record() only buffers a row; flush() writes the buffer in one transaction.
+    """
+    def __init__(self, path):
+        """
+        Open (or create) the history database.
+
+        Args:
+            path (str): SQLite database file
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+        self._buffer = []
+
+    def record(self, symbol, timeframe, info, notified, evaluated_at=None):
+        """
+        Buffer one evaluation.
+
+        Args:
+            symbol (str): Stock symbol
+            timeframe (str): '1d', '4h' or 'alignment'
+            info (dict): State as returned by analyze_golden_cross_state (or an alignment record)
+            notified (bool): Whether an alert was sent for it
+            evaluated_at (datetime, optional): Defaults to now
+        """
+        row = (
+            _epoch(evaluated_at or datetime.now(timezone.utc)),
+            symbol,
+            timeframe,
+            info.get('timestamp'),
+            info.get('state'),
+            int(bool(info.get('is_fresh_cross', False))),
+            info.get('spread_pct'),
+            info.get('close'),
+            int(bool(notified))
+        )
+        with self._lock:
+            self._buffer.append(row)
+
+    def flush(self):
+        """
+        Write the buffered rows in one transaction.
+
+        Returns:
+            int: Number of rows written
+        """
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            if rows:
+                with self._conn:
+                    self._conn.executemany("INSERT INTO signal_history VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            return len(rows)
+
+    def _where(self, symbol=None, timeframe=None, start=None, end=None, state=None, fresh=None, notified=None):
+        clauses, params = [], []
+        for column, value in (('symbol', symbol), ('timeframe', timeframe), ('state', state)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        for column, value in (('is_fresh_cross', fresh), ('notified', notified)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(int(bool(value)))
+        if start is not None:
+            clauses.append("evaluated_at >= ?")
+            params.append(_epoch(start))
+        if end is not None:
+            clauses.append("evaluated_at < ?")
+            params.append(_epoch(end))
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def query(self, limit=None, **filters):
+        """
+        Rows matching the filters, newest first.
+
+        Args:
+            limit (int, optional): Maximum rows returned
+            **filters: symbol, timeframe, state, fresh, notified and a [start, end) time range
+
+        Returns:
+            list: One dict per row
+        """
+        where, params = self._where(**filters)
+        sql = ("SELECT evaluated_at, symbol, timeframe, candle_time, state, is_fresh_cross, spread_pct, close, notified "
+               f"FROM signal_history{where} ORDER BY evaluated_at DESC")
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{
+            'evaluated_at': datetime.fromtimestamp(evaluated_at, timezone.utc).isoformat(),
+            'symbol': symbol,
+            'timeframe': timeframe,
+            'timestamp': candle_time,
+            'state': state,
+            'is_fresh_cross': bool(fresh),
+            'spread_pct': spread_pct,
+            'close': close,
+            'notified': bool(notified)
+        } for evaluated_at, symbol, timeframe, candle_time, state, fresh, spread_pct, close, notified in rows]
+
+    def count(self, group_by=(), **filters):
+        """
+        Count rows matching the filters, optionally grouped.
+
+        Args:
+            group_by (iterable): Any of 'symbol', 'timeframe', 'state', 'fresh', 'notified', 'day'
+            **filters: As for query()
+
+        Returns:
+            int or dict: The count, or {group key tuple: count} when grouped
+        """
+        where, params = self._where(**filters)
+        columns = [GROUP_COLUMNS[key] for key in group_by]
+        with self._lock:
+            if not columns:
+                return self._conn.execute(f"SELECT COUNT(*) FROM signal_history{where}", params).fetchone()[0]
+            select = ", ".join(columns)
+            rows = self._conn.execute(
+                f"SELECT {select}, COUNT(*) FROM signal_history{where} GROUP BY {select} ORDER BY {select}", params
+            ).fetchall()
+        return {tuple(row[:-1]): row[-1] for row in rows}
+
+    def prune(self, retention_days):
+        """
+        Delete rows evaluated more than retention_days ago.
+
+        Returns:
+            int: Number of rows deleted
+        """
+        if not retention_days or retention_days <= 0:
+            return 0
+        cutoff = _epoch(datetime.now(timezone.utc) - timedelta(days=retention_days))
+        with self._lock, self._conn:
+            deleted = self._conn.execute("DELETE FROM signal_history WHERE evaluated_at < ?", (cutoff,)).rowcount
+        if deleted:
+            logging.info(f"Pruned {deleted} signal history rows older than {retention_days} days")
+        return deleted
+
+    def close(self):
+        """
+        Flush buffered rows and close the database.
+        """
+        self.flush()
+        with self._lock:
+            self._conn.close()
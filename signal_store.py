@@ -0,0 +1,128 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+DEFAULT_STATE_DB_FILENAME = "signal_state.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS signal_state (
+    symbol TEXT NOT NULL,
+    timeframe TEXT NOT NULL,
+    info TEXT NOT NULL,
+    PRIMARY KEY (symbol, timeframe)
+) WITHOUT ROWID
+"""
+
+class SignalStateStore:
+    """
+    Signal state kept in SQLite (WAL mode), one row per (symbol, timeframe).
+
+    Entries are read on first use and cached. update() only marks an entry as changed;
+    commit() upserts the changed rows in a single transaction, so a run's write cost
+    is proportional to the symbols it touched and a crash never leaves a half-written
+    state behind. get_previous_state/update_state/save_signal_state in notifications
+    accept a store wherever they accept the legacy dict.
+    """
+    def __init__(self, path, legacy_json_path=None):
+        """
+        Open (or create) the store.
+
+        Args:
+            path (str): SQLite database file
+            legacy_json_path (str, optional): signal_state.json imported once when the
+                database is new; the file is renamed to <name>.migrated afterwards
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+        self._entries = {}
+        self._dirty = set()
+        if legacy_json_path:
+            self._migrate(legacy_json_path)
+
+    def _migrate(self, json_path):
+        if not os.path.exists(json_path):
+            return
+        if self._conn.execute("SELECT 1 FROM signal_state LIMIT 1").fetchone():
+            return
+        try:
+            with open(json_path, "r") as handle:
+                legacy = json.load(handle)
+        except Exception as exc:
+            logging.error(f"Failed to migrate signal state from {json_path}: {exc}")
+            return
+        rows = [(symbol, timeframe, json.dumps(info))
+                for symbol, timeframes in legacy.items() for timeframe, info in timeframes.items()]
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO signal_state VALUES (?, ?, ?)", rows)
+        os.replace(json_path, f"{json_path}.migrated")
+        logging.info(f"Migrated {len(rows)} signal state entries from {json_path} to {self.path}")
+
+    def get(self, symbol, timeframe):
+        """
+        Stored state for a symbol and timeframe, or None.
+        """
+        key = (symbol, timeframe)
+        with self._lock:
+            if key not in self._entries:
+                row = self._conn.execute("SELECT info FROM signal_state WHERE symbol = ? AND timeframe = ?",
+                                         key).fetchone()
+                self._entries[key] = json.loads(row[0]) if row else None
+            return self._entries[key]
+
+    def update(self, symbol, timeframe, info):
+        """
+        Replace the state for a symbol and timeframe (persisted on commit).
+        """
+        with self._lock:
+            self._entries[(symbol, timeframe)] = info
+            self._dirty.add((symbol, timeframe))
+
+    def commit(self):
+        """
+        Upsert every entry changed since the last commit in one transaction.
+
+        Returns:
+            int: Number of rows written
+        """
+        with self._lock:
+            rows = [(symbol, timeframe, json.dumps(self._entries[(symbol, timeframe)]))
+                    for symbol, timeframe in self._dirty]
+            if not rows:
+                return 0
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO signal_state (symbol, timeframe, info) VALUES (?, ?, ?) "
+                    "ON CONFLICT (symbol, timeframe) DO UPDATE SET info = excluded.info",
+                    rows
+                )
+            self._dirty.clear()
+            return len(rows)
+
+    def to_dict(self):
+        """
+        Every stored entry (including uncommitted changes) in the legacy JSON layout.
+        """
+        with self._lock:
+            state = {}
+            for symbol, timeframe, info in self._conn.execute("SELECT symbol, timeframe, info FROM signal_state"):
+                state.setdefault(symbol, {})[timeframe] = json.loads(info)
+            for symbol, timeframe in self._dirty:
+                state.setdefault(symbol, {})[timeframe] = self._entries[(symbol, timeframe)]
+            return state
+
+    def close(self):
+        """
+        Close the database connection (uncommitted changes are discarded).
+        """
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Sweep near_cross_threshold_pct, cooldown_hours and SMA window pairs over years of history.
+
+History comes from the backtest's own store (see backtest.py: --years, --history-directory,
+--offline).
+
+Work is shared wherever a parameter does not affect it: the history panel and forward returns
+are computed once for the whole grid, every distinct SMA window once (a rolling mean per
+window), the cross masks once per SMA pair, the state codes and alert blocks once per
+(pair, threshold), and only the cooldown walk runs per combination. Each SMA pair (with its
+thresholds split across tasks when there are more workers than pairs) runs on a spawned
+process pool reading the shared arrays from memory-mapped .npy files.
+
+Usage:
+    python sweep.py --thresholds 0.25 0.5 0.75 1.0 --cooldowns 0 6 24 --pairs 50/128 50/200
+    python sweep.py --interval 1d --years 10 --horizon 20 --workers 8 --csv sweep.csv
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backtest import (GOLDEN, INVALID, NEAR, NEUTRAL, add_history_arguments, block_alerts, build_history_panel,
+                      forward_returns, history_from_args, notification_blocks, rolling_means)
+from technical_analysis import sma_cross_masks
+
+DEFAULT_THRESHOLDS = (0.25, 0.5, 0.75, 1.0, 1.5)
+DEFAULT_COOLDOWNS = (0, 6, 24, 72)
+DEFAULT_PAIRS = ((50, 128), (50, 200), (20, 50))
+DEFAULT_HORIZON = 30
+
+def _sma_path(directory, window):
+    return os.path.join(directory, f"sma_{window}.npy")
+
+def _load(directory, name):
+    return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+
+def evaluate_pair(directory, fast, slow, thresholds, cooldowns):
+    """
+    Evaluate every threshold and cooldown for one SMA pair.
+
+    Args:
+        directory (str): Directory holding the shared arrays written by sweep_parameters
+        fast, slow (int): SMA windows
+        thresholds (list): near_cross_threshold_pct values
+        cooldowns (list): cooldown_hours values
+
+    Returns:
+        list: One result dict per (threshold, cooldown)
+    """
+    sma_fast = np.load(_sma_path(directory, fast), mmap_mode='r')
+    sma_slow = np.load(_sma_path(directory, slow), mmap_mode='r')
+    seconds = _load(directory, 'seconds')
+    returns = _load(directory, 'returns')
+
+    prev_fast = np.vstack([np.full((1, sma_fast.shape[1]), np.nan), sma_fast[:-1]])
+    prev_slow = np.vstack([np.full((1, sma_slow.shape[1]), np.nan), sma_slow[:-1]])
+    # An infinite threshold leaves only the threshold test of the near rule to apply per value
+    valid, golden, converging, fresh, spread_pct = sma_cross_masks(sma_fast, sma_slow, prev_fast, prev_slow, np.inf)
+    fresh = fresh & valid
+
+    results = []
+    for threshold in thresholds:
+        codes = np.where(golden, GOLDEN, np.where(converging & (spread_pct <= threshold), NEAR, NEUTRAL)).astype(np.int8)
+        codes[~valid] = INVALID
+        blocks = notification_blocks(codes, fresh, seconds)
+        flat = blocks['flat']
+        bar_returns = returns.T.ravel()[flat]
+        bar_fresh = fresh.T.ravel()[flat]
+        for cooldown in cooldowns:
+            hits = block_alerts(blocks, cooldown)
+            result = {'fast': fast, 'slow': slow, 'threshold': threshold, 'cooldown_hours': cooldown}
+            result.update(_alert_stats(hits, blocks['state'], bar_fresh, bar_returns))
+            results.append(result)
+    return results
+
+def _alert_stats(hits, state, fresh, returns):
+    stats = {}
+    for kind, mask in (('all', hits), ('fresh', hits & fresh), ('near', hits & (state == NEAR))):
+        outcome = returns[mask]
+        outcome = outcome[~np.isnan(outcome)]
+        stats[f"{kind}_alerts"] = int(mask.sum())
+        stats[f"{kind}_hit_rate"] = float((outcome > 0).mean()) if outcome.size else np.nan
+        stats[f"{kind}_mean_return"] = float(outcome.mean()) if outcome.size else np.nan
+    return stats
+
+def sweep_parameters(stock_data, thresholds=DEFAULT_THRESHOLDS, cooldowns=DEFAULT_COOLDOWNS,
+                     sma_pairs=DEFAULT_PAIRS, horizon=DEFAULT_HORIZON, workers=None):
+    """
+    Alert counts and hit rates for every combination of the grid.
+
+    A hit is an alert whose close-to-close return over the next horizon bars is positive.
+
+    Args:
+        stock_data (dict): Symbol -> price frame with a 'Close' column
+        thresholds (iterable): near_cross_threshold_pct values
+        cooldowns (iterable): cooldown_hours values
+        sma_pairs (iterable): (fast, slow) SMA windows
+        horizon (int): Bars ahead used for hit rates and mean returns
+        workers (int, optional): Worker processes (defaults to the CPU count; 1 runs in-process)
+
+    Returns:
+        pandas.DataFrame: One row per (fast, slow, threshold, cooldown_hours)
+    """
+    thresholds, cooldowns, sma_pairs = list(thresholds), list(cooldowns), [tuple(pair) for pair in sma_pairs]
+    workers = workers or os.cpu_count() or 1
+    _, closes, seconds, _ = build_history_panel(stock_data)
+
+    directory = tempfile.mkdtemp(prefix='plotin-sweep-')
+    try:
+        np.save(os.path.join(directory, 'seconds.npy'), seconds)
+        np.save(os.path.join(directory, 'returns.npy'), forward_returns(closes, [horizon])[horizon])
+        windows = sorted({window for pair in sma_pairs for window in pair})
+        for window, values in rolling_means(closes, windows).items():
+            np.save(_sma_path(directory, window), values)
+        del closes
+
+        if workers <= 1 or len(sma_pairs) * len(thresholds) <= 1:
+            batches = [evaluate_pair(directory, fast, slow, thresholds, cooldowns) for fast, slow in sma_pairs]
+        else:
+            # One task per pair, with its thresholds split only as far as needed to occupy every worker
+            chunks = min(len(thresholds), -(-workers // len(sma_pairs)))
+            tasks = [(fast, slow, [float(value) for value in chunk]) for fast, slow in sma_pairs
+                     for chunk in np.array_split(np.asarray(thresholds, dtype=float), chunks)]
+            # Spawn rather than fork, as for the chart render pool
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                                     mp_context=multiprocessing.get_context('spawn')) as executor:
+                futures = [executor.submit(evaluate_pair, directory, fast, slow, task_thresholds, cooldowns)
+                           for fast, slow, task_thresholds in tasks]
+                batches = [future.result() for future in futures]
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    results = pd.DataFrame([result for batch in batches for result in batch])
+    return results.sort_values(['fast', 'slow', 'threshold', 'cooldown_hours']).reset_index(drop=True)
+
+def main():
+    from config_manager import load_config
+
+    def pair(value):
+        fast, slow = value.split('/')
+        return int(fast), int(slow)
+
+    parser = argparse.ArgumentParser(description='Sweep alert parameters over years of history')
+    add_history_arguments(parser)
+    parser.add_argument('--thresholds', type=float, nargs='+', default=list(DEFAULT_THRESHOLDS),
+                        help='near_cross_threshold_pct values')
+    parser.add_argument('--cooldowns', type=float, nargs='+', default=list(DEFAULT_COOLDOWNS),
+                        help='cooldown_hours values')
+    parser.add_argument('--pairs', type=pair, nargs='+', default=list(DEFAULT_PAIRS),
+                        help='SMA window pairs as FAST/SLOW')
+    parser.add_argument('--horizon', type=int, default=DEFAULT_HORIZON, help='Bars ahead for hit rates')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--csv', help='Write the results to this file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    config = load_config() or {}
+
+    start = time.perf_counter()
+    interval, stock_data = history_from_args(args, config)
+    results = sweep_parameters(stock_data, args.thresholds, args.cooldowns, args.pairs, args.horizon, args.workers)
+    combinations = len(results)
+    print(f"{len(stock_data)} symbols, {combinations} combinations in {time.perf_counter() - start:.2f}s "
+          f"(hit = positive return {args.horizon} {interval} bars later)")
+    print(results.to_string(index=False, float_format=lambda value: f"{value:.4f}"))
+    if args.csv:
+        results.to_csv(args.csv, index=False)
+        print(f"Results written to {args.csv}")
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,9 @@ import numpy as np
 import logging
 from typing import Optional, Dict, Any
 
+from indicator_registry import SIGNAL_INDICATORS, build_indicator_frame, sma_kernel
+from metrics import METRICS
+
 def calculate_sma(data, period):
     """
     Calculate Simple Moving Average (SMA) for the given period.
@@ -15,47 +18,26 @@ def calculate_sma(data, period):
         pandas.Series: SMA values
     """
     try:
-        sma = data['Close'].rolling(window=period).mean()
+        # Always average in float64, even for compact float32 prices
+        sma = data['Close'].astype(np.float64, copy=False).rolling(window=period).mean()
         return sma
     except Exception as e:
         logging.error(f"Error calculating {period}-period SMA: {str(e)}")
         return None
 
-def add_indicators(data):
+def add_indicators(data, specs=None):
     """
     Add technical indicators to stock data.
     
     Args:
         data (pandas.DataFrame): Stock price data
+        specs (list, optional): IndicatorSpec list (defaults to SMA50 and SMA128)
         
     Returns:
         pandas.DataFrame: Data with technical indicators added
     """
-    if len(data) < 128:
-        logging.warning(f"Insufficient data for 128-period SMA. Data length: {len(data)}, need at least 128 data points.")
-        return None
-    
     try:
-        # Create a copy of the dataframe to avoid warnings
-        data_copy = data.copy()
-        
-        # Ensure OHLC columns are float
-        for col in ['Open', 'High', 'Low', 'Close', 'Volume']:
-            if col in data_copy.columns:
-                data_copy[col] = data_copy[col].astype(float)
-        
-        # Add 50-period SMA
-        data_copy['SMA50'] = calculate_sma(data_copy, 50)
-        
-        # Add 128-period SMA
-        data_copy['SMA128'] = calculate_sma(data_copy, 128)
-        
-        # Remove rows with NaN indicator values (due to rolling window)
-        data_with_indicators = data_copy.dropna()
-        
-        logging.info(f"Successfully added indicators. Data reduced from {len(data)} to {len(data_with_indicators)} valid rows")
-        
-        return data_with_indicators
+        return build_indicator_frame(data, list(specs or SIGNAL_INDICATORS))
     except Exception as e:
         logging.error(f"Error adding indicators: {str(e)}")
         return None
@@ -114,3 +96,194 @@ def analyze_golden_cross_state(data: pd.DataFrame, near_cross_threshold_pct: flo
     }
     
     return result
+
+def sma_cross_masks(sma50: np.ndarray,
+                    sma128: np.ndarray,
+                    prev_sma50: np.ndarray,
+                    prev_sma128: np.ndarray,
+                    near_cross_threshold_pct: float = 0.75):
+    """
+    Element-wise golden/near/fresh-cross rules shared by the panel scan and the backtest.
+    
+    Arrays may have any (matching) shape; the prev_ arrays hold the preceding candle's SMAs.
+    
+    Returns:
+        tuple of arrays: (valid, golden, near, is_fresh_cross, spread_pct)
+    """
+    valid = ~(np.isnan(sma50) | np.isnan(sma128) | np.isnan(prev_sma50) | np.isnan(prev_sma128))
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        spread_pct = np.where(sma128 != 0, np.abs(sma50 - sma128) / sma128 * 100, np.inf)
+    
+    above = sma50 >= sma128
+    is_fresh_cross = above & (prev_sma50 < prev_sma128)
+    near = ~above & (spread_pct <= near_cross_threshold_pct) & (sma50 >= prev_sma50)
+    return valid, above, near, is_fresh_cross, spread_pct
+
+def classify_sma_panel(close: np.ndarray,
+                       sma50: np.ndarray,
+                       sma128: np.ndarray,
+                       prev_sma50: np.ndarray,
+                       prev_sma128: np.ndarray,
+                       near_cross_threshold_pct: float = 0.75) -> Dict[str, np.ndarray]:
+    """
+    Classify the SMA 50/128 relationship for many symbols at once.
+    
+    Each argument is a 1-D array with one entry per symbol holding the latest (or, for the
+    prev_ arrays, the previous) candle's values. The rules are the same as in
+    analyze_golden_cross_state, applied element-wise.
+    
+    Returns:
+        dict of arrays with keys:
+            - valid: bool, False where the SMAs are not available for both candles
+            - state: 'golden', 'near', or 'neutral'
+            - is_fresh_cross: bool
+            - spread_pct: float
+            - close, sma50, sma128: float
+            - sma128_slope: 'rising' | 'falling' | 'flat'
+    """
+    close, sma50, sma128, prev_sma50, prev_sma128 = (
+        np.asarray(values, dtype=np.float64) for values in (close, sma50, sma128, prev_sma50, prev_sma128)
+    )
+    valid, above, near, is_fresh_cross, spread_pct = sma_cross_masks(
+        sma50, sma128, prev_sma50, prev_sma128, near_cross_threshold_pct
+    )
+    
+    slope = np.full(sma128.shape, 'flat', dtype=object)
+    slope[sma128 > prev_sma128] = 'rising'
+    slope[sma128 < prev_sma128] = 'falling'
+    
+    state = np.full(sma128.shape, 'neutral', dtype=object)
+    state[above] = 'golden'
+    state[near] = 'near'
+    
+    return {
+        'valid': valid,
+        'state': state,
+        'is_fresh_cross': is_fresh_cross,
+        'spread_pct': spread_pct,
+        'close': close,
+        'sma50': sma50,
+        'sma128': sma128,
+        'sma128_slope': slope
+    }
+
+def _panel_results(symbols, timestamps, panel: Dict[str, np.ndarray]) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for i, symbol in enumerate(symbols):
+        if not panel['valid'][i]:
+            continue
+        timestamp = timestamps[i]
+        results[symbol] = {
+            'state': panel['state'][i],
+            'is_fresh_cross': bool(panel['is_fresh_cross'][i]),
+            'spread_pct': float(panel['spread_pct'][i]),
+            'close': float(panel['close'][i]),
+            'sma50': float(panel['sma50'][i]),
+            'sma128': float(panel['sma128'][i]),
+            'sma128_slope': panel['sma128_slope'][i],
+            'timestamp': timestamp.isoformat() if hasattr(timestamp, 'isoformat') else str(timestamp)
+        }
+    return results
+
+def scan_golden_cross_panel(closes: np.ndarray,
+                            near_cross_threshold_pct: float = 0.75) -> Dict[str, np.ndarray]:
+    """
+    Compute SMA 50/128 and classify every column of a (time x symbol) close panel.
+    
+    Columns are expected to be right-aligned: the last row holds each symbol's latest
+    candle, and shorter histories are padded with NaN at the top (see build_close_panel).
+    The SMAs use the same kernel as add_indicators, so the results match
+    analyze_golden_cross_state(add_indicators(...)) for every symbol.
+    
+    Returns:
+        dict of arrays as returned by classify_sma_panel
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    if closes.ndim != 2 or closes.shape[0] < 2:
+        raise ValueError("closes must be a (time x symbol) array with at least two rows")
+    
+    means = sma_kernel(closes, (50, 128))
+    sma50, sma128 = means[50], means[128]
+    
+    return classify_sma_panel(closes[-1], sma50[-1], sma128[-1], sma50[-2], sma128[-2], near_cross_threshold_pct)
+
+def build_close_panel(stock_data: Dict[str, pd.DataFrame]):
+    """
+    Stack per-symbol close series into a right-aligned (time x symbol) array.
+    
+    Args:
+        stock_data (dict): Symbol -> price frame with a 'Close' column
+        
+    Returns:
+        tuple: (list of symbols, 2-D float64 array, list of latest timestamps)
+    """
+    symbols = list(stock_data)
+    length = max((len(frame) for frame in stock_data.values()), default=0)
+    panel = np.full((length, len(symbols)), np.nan)
+    timestamps = []
+    for column, symbol in enumerate(symbols):
+        closes = stock_data[symbol]['Close'].to_numpy(dtype=np.float64)
+        if len(closes):
+            panel[length - len(closes):, column] = closes
+        timestamps.append(stock_data[symbol].index[-1] if len(closes) else None)
+    return symbols, panel, timestamps
+
+@METRICS.timer('signal_scan_seconds', mode='indicator_frames')
+def scan_indicator_frames(indicator_data: Dict[str, pd.DataFrame],
+                          near_cross_threshold_pct: float = 0.75) -> Dict[str, Dict[str, Any]]:
+    """
+    Classify the latest candles of many frames that already carry SMA50/SMA128 columns.
+    
+    Equivalent to calling analyze_golden_cross_state on each frame, but the last two rows
+    of every symbol are gathered into arrays and classified in one NumPy pass.
+    
+    Args:
+        indicator_data (dict): Symbol -> frame returned by add_indicators
+        near_cross_threshold_pct (float): Spread below which a converging pair is 'near'
+        
+    Returns:
+        dict: Symbol -> state dict (symbols with fewer than two rows are omitted)
+    """
+    symbols = [symbol for symbol, frame in indicator_data.items() if frame is not None and len(frame) >= 2]
+    if not symbols:
+        return {}
+    
+    rows = np.empty((5, len(symbols)))
+    timestamps = []
+    try:
+        for column, symbol in enumerate(symbols):
+            frame = indicator_data[symbol]
+            rows[:, column] = (
+                frame['Close'].iat[-1],
+                frame['SMA50'].iat[-1],
+                frame['SMA128'].iat[-1],
+                frame['SMA50'].iat[-2],
+                frame['SMA128'].iat[-2]
+            )
+            timestamps.append(frame.index[-1])
+    except KeyError as e:
+        logging.error(f"Missing required SMA column while scanning golden cross states: {e}")
+        return {}
+    
+    panel = classify_sma_panel(*rows, near_cross_threshold_pct=near_cross_threshold_pct)
+    METRICS.inc('signals_scanned_total', len(symbols))
+    return _panel_results(symbols, timestamps, panel)
+
+def scan_stock_data(stock_data: Dict[str, pd.DataFrame],
+                    near_cross_threshold_pct: float = 0.75) -> Dict[str, Dict[str, Any]]:
+    """
+    Classify raw price frames (no indicators yet) for many symbols in one pass.
+    
+    Args:
+        stock_data (dict): Symbol -> price frame with a 'Close' column
+        near_cross_threshold_pct (float): Spread below which a converging pair is 'near'
+        
+    Returns:
+        dict: Symbol -> state dict (symbols without enough history are omitted)
+    """
+    symbols, closes, timestamps = build_close_panel(stock_data)
+    if closes.shape[0] < 2:
+        return {}
+    panel = scan_golden_cross_panel(closes, near_cross_threshold_pct)
+    return _panel_results(symbols, timestamps, panel)
@@ -1,26 +1,209 @@
 import os
+import json
+import time
+import hashlib
 import logging
 import asyncio
-from telegram import Bot
-from telegram.error import TelegramError
+from collections import OrderedDict
+from datetime import timedelta
+
+from metrics import METRICS
+
+MEDIA_GROUP_LIMIT = 10          # Telegram accepts 2-10 items per album
+MAX_REMEMBERED_FILE_IDS = 5000
+DEFAULT_FILE_ID_FILENAME = "telegram_file_ids.json"
+
+DEFAULT_DELIVERY_SETTINGS = {
+    'max_concurrency': 4,        # Requests in flight at once
+    'global_rate_per_sec': 25,   # Bot-wide limit (Telegram allows about 30/s)
+    'chat_rate_per_sec': 1,      # Per-chat limit (Telegram allows about 1/s, 20/min in groups)
+    'chat_burst': 3,             # Requests a chat may send back-to-back before throttling
+    'max_retries': 3,            # Retries after a 429 before giving up
+    'media_groups': True         # Send a symbol's charts as one album
+}
+
+class TokenBucket:
+    """
+    Async token bucket: refills at rate tokens per second up to capacity.
+    """
+    def __init__(self, rate, capacity=1, clock=time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(max(capacity, 1))
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+    
+    def block(self, seconds):
+        """
+        Hold all acquisitions for the given time (used when Telegram returns retry_after).
+        """
+        self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+        self.tokens = 0.0
+    
+    async def acquire(self):
+        """
+        Wait until a token is available and take it.
+        """
+        async with self._lock:
+            while True:
+                now = self.clock()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def _retry_after_seconds(error):
+    delay = error.retry_after
+    if isinstance(delay, timedelta):
+        return delay.total_seconds()
+    return float(delay)
 
 class TelegramManager:
     """
     Manages communication with Telegram to send charts and notifications.
+    
+    Every API request passes through a global and a per-chat token bucket, and a 429
+    (RetryAfter) pauses the affected chat for the requested time before retrying.
+    Deliveries can also be queued with enqueue(): jobs sharing a key (e.g. a symbol)
+    run in order, different keys run concurrently, and flush() waits for all of them.
     """
-    def __init__(self, token, chat_id=None):
+    def __init__(self, token, chat_id=None, bot=None, delivery_settings=None):
         """
         Initialize the Telegram manager.
         
         Args:
             token (str): The Telegram bot token obtained from BotFather
             chat_id (str, optional): Default chat ID to send messages to
+            bot (telegram.Bot, optional): Preconfigured bot (tests pass a fake)
+            delivery_settings (dict, optional): Overrides for DEFAULT_DELIVERY_SETTINGS
         """
         self.token = token
         self.chat_id = chat_id
-        self.bot = Bot(token=token)
+        if bot is None:
+            # python-telegram-bot is only loaded when a real bot is needed
+            from telegram import Bot
+            from http_pool import telegram_request
+            # Every Bot shares the process-wide connection pool, so a new manager reuses the
+            # connections (and TLS sessions) of the previous one
+            bot = Bot(token=token, request=telegram_request())
+        self.bot = bot
         self._loop = None
+        self.file_ids = OrderedDict()  # sha256 of image bytes -> file_id of its upload
+        self.file_id_path = None
+        self._file_ids_dirty = False
+        self.stats = {
+            'requests': 0,
+            'charts_uploaded': 0,
+            'charts_reused': 0,
+            'bytes_uploaded': 0,
+            'bytes_avoided': 0
+        }
+        
+        settings = dict(DEFAULT_DELIVERY_SETTINGS)
+        settings.update(delivery_settings or {})
+        self.settings = settings
+        self._global_bucket = None
+        self._chat_buckets = {}
+        self._semaphore = None
+        self._key_tails = {}
+        self._pending = set()
         logging.info("Telegram bot initialized")
+    
+    def _ensure_async_state(self):
+        # Buckets and locks bind to the running loop, so create them lazily
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._global_bucket = TokenBucket(self.settings['global_rate_per_sec'], self.settings['global_rate_per_sec'])
+            self._chat_buckets = {}
+            self._semaphore = asyncio.Semaphore(self.settings['max_concurrency'])
+            self._key_tails = {}
+            self._pending = set()
+    
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.settings['chat_rate_per_sec'], self.settings['chat_burst'])
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+    
+    async def _call(self, method, chat_id, **kwargs):
+        """
+        Issue a Bot API request under the rate limits, retrying on 429.
+        """
+        from telegram.error import RetryAfter
+        self._ensure_async_state()
+        chat_bucket = self._chat_bucket(chat_id)
+        attempt = 0
+        while True:
+            await chat_bucket.acquire()
+            await self._global_bucket.acquire()
+            self.stats['requests'] += 1
+            METRICS.inc('telegram_requests_total', method=method)
+            try:
+                with METRICS.timer('telegram_request_seconds', method=method):
+                    return await getattr(self.bot, method)(chat_id=chat_id, **kwargs)
+            except RetryAfter as e:
+                METRICS.inc('telegram_retries_total', method=method)
+                attempt += 1
+                delay = _retry_after_seconds(e)
+                if attempt > self.settings['max_retries']:
+                    raise
+                logging.warning(f"Telegram rate limit hit for chat {chat_id}. Retrying in {delay:.1f}s (attempt {attempt})")
+                chat_bucket.block(delay)
+    
+    def enqueue(self, key, func, *args, **kwargs):
+        """
+        Queue a delivery coroutine without waiting for it.
+        
+        Args:
+            key (str): Ordering key; jobs with the same key run one after another
+            func (callable): Coroutine function performing the delivery
+            *args, **kwargs: Arguments for func
+            
+        Returns:
+            asyncio.Task: Resolves to func's result (exceptions are logged and return False)
+        """
+        self._ensure_async_state()
+        previous = self._key_tails.get(key)
+        
+        async def run():
+            if previous is not None:
+                await asyncio.gather(previous, return_exceptions=True)
+            async with self._semaphore:
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as e:
+                    logging.error(f"Queued Telegram delivery for {key} failed: {str(e)}")
+                    return False
+        
+        task = asyncio.ensure_future(run())
+        self._key_tails[key] = task
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return task
+    
+    async def flush(self):
+        """
+        Wait until every queued delivery has finished.
+        
+        Returns:
+            int: Number of queued deliveries that failed
+        """
+        failures = 0
+        while self._pending:
+            results = await asyncio.gather(*list(self._pending), return_exceptions=True)
+            failures += sum(1 for result in results if result is False or isinstance(result, Exception))
+        self._key_tails = {}
+        self.save_file_ids()
+        return failures
         
     async def send_message(self, message, chat_id=None):
         """
@@ -33,6 +216,7 @@ class TelegramManager:
         Returns:
             bool: True if successful, False otherwise
         """
+        from telegram.error import TelegramError
         target_chat_id = chat_id or self.chat_id
         if not target_chat_id:
             logging.error("No chat ID provided for message delivery")
@@ -40,8 +224,8 @@ class TelegramManager:
             
         try:
             # Send the message asynchronously
-            await self.bot.send_message(chat_id=target_chat_id, text=message)
-            logging.info(f"Message sent to Telegram chat {target_chat_id}")
+            await self._call('send_message', target_chat_id, text=message)
+            logging.debug(f"Message sent to Telegram chat {target_chat_id}")
             return True
         except TelegramError as e:
             logging.error(f"Failed to send Telegram message: {e}")
@@ -50,10 +234,47 @@ class TelegramManager:
             logging.error(f"Unexpected error sending message: {str(e)}")
             return False
     
+    def _read_chart(self, chart_path):
+        """
+        Load a chart and look up the file_id of an earlier upload of identical bytes.
+        
+        Returns:
+            tuple: (image bytes, content hash, cached file_id or None)
+        """
+        # Read the bytes up front so a rate-limited upload can be retried
+        with open(chart_path, 'rb') as chart:
+            photo = chart.read()
+        digest = hashlib.sha256(photo).hexdigest()
+        return photo, digest, self.file_ids.get(digest)
+    
+    def _remember_file_id(self, digest, message):
+        if message is not None and getattr(message, 'photo', None):
+            # The last PhotoSize is the full-resolution copy
+            self.file_ids[digest] = message.photo[-1].file_id
+            self.file_ids.move_to_end(digest)
+            while len(self.file_ids) > MAX_REMEMBERED_FILE_IDS:
+                self.file_ids.popitem(last=False)
+            self._file_ids_dirty = True
+    
+    def _count_upload(self, photo, reused):
+        if reused:
+            self.stats['charts_reused'] += 1
+            self.stats['bytes_avoided'] += len(photo)
+            METRICS.inc('telegram_charts_reused_total')
+            METRICS.inc('telegram_bytes_avoided_total', len(photo))
+        else:
+            self.stats['charts_uploaded'] += 1
+            self.stats['bytes_uploaded'] += len(photo)
+            METRICS.inc('telegram_charts_uploaded_total')
+            METRICS.inc('telegram_upload_bytes_total', len(photo))
+    
     async def send_chart(self, chart_path, caption=None, chat_id=None):
         """
         Send a chart image to a Telegram chat.
         
+        An image whose bytes were uploaded before is sent by its file_id instead of
+        being uploaded again.
+        
         Args:
             chart_path (str): Path to the chart image file
             caption (str, optional): Caption for the image
@@ -62,6 +283,7 @@ class TelegramManager:
         Returns:
             bool: True if successful, False otherwise
         """
+        from telegram.error import TelegramError
         target_chat_id = chat_id or self.chat_id
         if not target_chat_id:
             logging.error("No chat ID provided for chart delivery")
@@ -72,14 +294,28 @@ class TelegramManager:
             return False
             
         try:
-            with open(chart_path, 'rb') as chart:
-                # Send the photo asynchronously
-                await self.bot.send_photo(
-                    chat_id=target_chat_id,
-                    photo=chart,
-                    caption=caption
-                )
-            logging.info(f"Chart sent to Telegram chat {target_chat_id}")
+            photo, digest, file_id = self._read_chart(chart_path)
+            
+            if file_id:
+                try:
+                    await self._call('send_photo', target_chat_id, photo=file_id, caption=caption)
+                    self._count_upload(photo, reused=True)
+                    logging.debug(f"Chart re-sent by file_id to Telegram chat {target_chat_id}")
+                    return True
+                except TelegramError as e:
+                    logging.warning(f"Failed to re-send chart by file_id, uploading instead: {e}")
+                    self.file_ids.pop(digest, None)
+            
+            # Send the photo asynchronously
+            message = await self._call(
+                'send_photo',
+                target_chat_id,
+                photo=photo,
+                caption=caption
+            )
+            self._count_upload(photo, reused=False)
+            self._remember_file_id(digest, message)
+            logging.debug(f"Chart sent to Telegram chat {target_chat_id}")
             return True
         except TelegramError as e:
             logging.error(f"Failed to send chart to Telegram: {e}")
@@ -87,6 +323,73 @@ class TelegramManager:
         except Exception as e:
             logging.error(f"Unexpected error sending chart: {str(e)}")
             return False
+    
+    async def send_charts(self, charts, chat_id=None):
+        """
+        Send several charts as media groups (albums) of up to 10 images each.
+        
+        Args:
+            charts (list): (chart path, caption) tuples
+            chat_id (str, optional): Override the default chat ID
+            
+        Returns:
+            bool: True if every chart was delivered, False otherwise
+        """
+        target_chat_id = chat_id or self.chat_id
+        if not target_chat_id:
+            logging.error("No chat ID provided for chart delivery")
+            return False
+        
+        available = []
+        for chart_path, caption in charts:
+            if os.path.exists(chart_path):
+                available.append((chart_path, caption))
+            else:
+                logging.error(f"Chart file not found: {chart_path}")
+        
+        success = len(available) == len(charts)
+        for offset in range(0, len(available), MEDIA_GROUP_LIMIT):
+            group = available[offset:offset + MEDIA_GROUP_LIMIT]
+            if len(group) == 1:
+                # Albums need at least two items
+                success = await self.send_chart(group[0][0], group[0][1], target_chat_id) and success
+            else:
+                success = await self._send_media_group(group, target_chat_id) and success
+        return success
+    
+    async def _send_media_group(self, group, chat_id):
+        from telegram import InputMediaPhoto
+        from telegram.error import TelegramError
+        try:
+            loaded = [self._read_chart(chart_path) for chart_path, _ in group]
+            
+            for allow_reuse in (True, False):
+                reused = [bool(file_id) and allow_reuse for _, _, file_id in loaded]
+                media = [
+                    InputMediaPhoto(media=file_id if reuse else photo, caption=caption)
+                    for (photo, _, file_id), reuse, (_, caption) in zip(loaded, reused, group)
+                ]
+                try:
+                    messages = await self._call('send_media_group', chat_id, media=media)
+                except TelegramError as e:
+                    if allow_reuse and any(reused):
+                        # A stale file_id fails the whole album; upload everything instead
+                        logging.warning(f"Failed to re-send album by file_id, uploading instead: {e}")
+                        continue
+                    raise
+                for (photo, digest, _), reuse, message in zip(loaded, reused, messages or []):
+                    self._count_upload(photo, reused=reuse)
+                    if not reuse:
+                        self._remember_file_id(digest, message)
+                logging.debug(f"Album of {len(group)} charts sent to Telegram chat {chat_id}")
+                return True
+            return False
+        except TelegramError as e:
+            logging.error(f"Failed to send chart album to Telegram: {e}")
+            return False
+        except Exception as e:
+            logging.error(f"Unexpected error sending chart album: {str(e)}")
+            return False
             
     async def send_stock_analysis(self, symbol, chart_path, analysis_text=None):
         """
@@ -100,11 +403,81 @@ class TelegramManager:
         Returns:
             bool: True if successful, False otherwise
         """
+        return await self.send_chart(chart_path, self._analysis_caption(symbol, analysis_text))
+    
+    async def send_stock_analyses(self, symbol, charts):
+        """
+        Send all of a symbol's charts, as one album when media groups are enabled.
+        
+        Args:
+            symbol (str): Stock symbol
+            charts (list): (chart path, analysis text) tuples
+            
+        Returns:
+            bool: True if every chart was delivered, False otherwise
+        """
+        start = time.perf_counter()
+        captioned = [(chart_path, self._analysis_caption(symbol, text)) for chart_path, text in charts]
+        try:
+            if self.settings['media_groups']:
+                return await self.send_charts(captioned)
+            results = [await self.send_chart(chart_path, caption) for chart_path, caption in captioned]
+            return all(results)
+        finally:
+            METRICS.record_symbol(symbol, 'telegram_delivery', time.perf_counter() - start)
+    
+    @staticmethod
+    def _analysis_caption(symbol, analysis_text=None):
         caption = f"Stock Analysis: {symbol}"
         if analysis_text:
             caption += f"\n\n{analysis_text}"
-            
-        return await self.send_chart(chart_path, caption)
+        return caption
+    
+    def load_file_ids(self, path):
+        """
+        Restore the image hash -> file_id map saved by save_file_ids.
+        """
+        self.file_id_path = path
+        if not path or not os.path.exists(path):
+            return
+        try:
+            with open(path, "r") as handle:
+                self.file_ids = OrderedDict(json.load(handle))
+        except Exception as exc:
+            logging.error(f"Failed to load Telegram file_ids from {path}: {exc}")
+    
+    def save_file_ids(self):
+        """
+        Persist the image hash -> file_id map if it changed.
+        """
+        if not self.file_id_path or not self._file_ids_dirty:
+            return
+        directory = os.path.dirname(self.file_id_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        try:
+            with open(self.file_id_path, "w") as handle:
+                json.dump(self.file_ids, handle)
+            self._file_ids_dirty = False
+        except Exception as exc:
+            logging.error(f"Failed to persist Telegram file_ids to {self.file_id_path}: {exc}")
+    
+    def begin_run(self):
+        """
+        Start a run: clear the upload counters, so a long-lived manager reports each run alone.
+        """
+        self.stats = dict.fromkeys(self.stats, 0)
+    
+    def report(self):
+        """
+        Log upload counters for the run.
+        """
+        stats = self.stats
+        logging.info(
+            f"Telegram uploads: {stats['charts_uploaded']} charts / {stats['bytes_uploaded']} bytes uploaded, "
+            f"{stats['charts_reused']} charts / {stats['bytes_avoided']} bytes re-sent by file_id, "
+            f"{stats['requests']} API requests"
+        )
 
 def create_telegram_manager(config):
     """
@@ -132,4 +505,10 @@ def create_telegram_manager(config):
         logging.error("Telegram chat ID is not properly configured")
         return None
     
-    return TelegramManager(token, chat_id) 
\ No newline at end of file
+    delivery_settings = {key: config['telegram'][key] for key in DEFAULT_DELIVERY_SETTINGS if key in config['telegram']}
+    manager = TelegramManager(token, chat_id, delivery_settings=delivery_settings)
+    
+    output_dir = config.get('output', {}).get('directory')
+    if output_dir:
+        manager.load_file_ids(os.path.join(output_dir, DEFAULT_FILE_ID_FILENAME))
+    return manager 
\ No newline at end of file
@@ -0,0 +1,99 @@
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+import notifications
+from backtest import backtest_golden_cross, load_cached_history, load_history, summarize_alerts
+from test_data_retrieval import RangeDownloader
+from technical_analysis import add_indicators, analyze_golden_cross_state
+
+
+def _random_walk(seed, periods, freq='4h', start="2021-01-04 09:30"):
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, periods)))
+    index = pd.date_range(start, periods=periods, freq=freq, tz='America/New_York')
+    return pd.DataFrame({'Open': closes, 'High': closes, 'Low': closes, 'Close': closes, 'Volume': 1.0}, index=index)
+
+
+def _reference_alerts(frame, threshold, cooldown_hours):
+    """Evaluate every bar one at a time with the live functions."""
+    indicators = add_indicators(frame)
+    previous = None
+    alerts = []
+    for end in range(2, len(indicators) + 1):
+        window = indicators.iloc[:end]
+        current = analyze_golden_cross_state(window, threshold)
+        now = window.index[-1].to_pydatetime()
+        with mock.patch.object(notifications, '_utcnow', return_value=now):
+            send = notifications.should_send_notification(previous, current, cooldown_hours)
+        entry = dict(current)
+        if send:
+            entry['last_notified_at'] = now.isoformat()
+            alerts.append((window.index[-1], current['state'], current['is_fresh_cross']))
+        elif previous and previous.get('last_notified_at'):
+            entry['last_notified_at'] = previous['last_notified_at']
+        previous = entry
+    return alerts
+
+
+class BacktestTests(unittest.TestCase):
+    def setUp(self):
+        self.stock_data = {f"S{i}": _random_walk(i, 500 + 40 * i) for i in range(4)}
+
+    def _assert_matches_reference(self, threshold, cooldown_hours):
+        alerts = backtest_golden_cross(self.stock_data, threshold, cooldown_hours, horizons=(5,))
+        for symbol, frame in self.stock_data.items():
+            expected = _reference_alerts(frame, threshold, cooldown_hours)
+            rows = alerts[alerts['symbol'] == symbol]
+            actual = list(zip(rows['timestamp'], rows['state'], rows['is_fresh_cross']))
+            self.assertEqual(actual, expected, symbol)
+
+    def test_matches_per_bar_evaluation_with_cooldown(self):
+        self._assert_matches_reference(threshold=1.0, cooldown_hours=6)
+
+    def test_matches_per_bar_evaluation_with_long_cooldown(self):
+        self._assert_matches_reference(threshold=2.0, cooldown_hours=24 * 7)
+
+    def test_without_cooldown_only_state_changes_alert(self):
+        alerts = backtest_golden_cross(self.stock_data, 1.0, 0, horizons=(5,))
+        self._assert_matches_reference(threshold=1.0, cooldown_hours=0)
+        self.assertLess(len(alerts), len(backtest_golden_cross(self.stock_data, 1.0, 6, horizons=(5,))))
+
+    def test_forward_returns_and_summary(self):
+        alerts = backtest_golden_cross(self.stock_data, 1.0, 6, horizons=(5,))
+        row = alerts.iloc[0]
+        closes = self.stock_data[row['symbol']]['Close']
+        position = closes.index.get_loc(row['timestamp'])
+        if position + 5 < len(closes):
+            self.assertAlmostEqual(row['fwd_return_5'], closes.iloc[position + 5] / closes.iloc[position] - 1)
+
+        summary = summarize_alerts(alerts, horizons=(5,))
+        self.assertEqual(summary.loc['all', 'alerts'], len(alerts))
+        self.assertEqual(summary.loc['fresh', 'alerts'], int(alerts['is_fresh_cross'].sum()))
+
+
+class HistoryStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_keeps_years_of_history_and_tops_up_from_the_tail(self):
+        downloader = RangeDownloader()
+        cold = load_history(['AAA', 'BBB'], '1d', self.tmp.name, years=3, batch_size=10, downloader=downloader)
+        self.assertGreater(cold['AAA'].index[-1] - cold['AAA'].index[0], pd.Timedelta(days=3 * 365 - 2))
+
+        warm = load_history(['AAA', 'BBB'], '1d', self.tmp.name, years=3, batch_size=10, downloader=downloader)
+        self.assertEqual(len(downloader.requests), 2)
+        self.assertGreater(downloader.requests[1][1] - downloader.requests[0][1], pd.Timedelta(days=3 * 365 - 30))
+        self.assertEqual(len(warm['AAA']), len(cold['AAA']))
+
+        offline = load_cached_history(self.tmp.name, '1d')
+        self.assertEqual(set(offline), {'AAA', 'BBB'})
+        self.assertEqual(len(offline['BBB']), len(cold['BBB']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import logging
+import unittest
+
+import pandas as pd
+
+from benchmark import (StubDownloader, benchmark_logging, benchmark_startup, benchmark_universe, compare_reports,
+                       synthetic_index, synthetic_symbols, synthetic_universe)
+from data_retrieval import get_multiple_stocks_data
+
+
+class SyntheticDataTests(unittest.TestCase):
+    def test_index_follows_the_trading_calendar(self):
+        index = synthetic_index("2024-01-01", "2024-01-08", '4h')
+
+        self.assertEqual(len(index), 10)  # five weekdays, two 4h bars each
+        self.assertTrue((index.dayofweek < 5).all())
+        self.assertEqual(index[0], pd.Timestamp("2024-01-01 09:30"))
+
+    def test_stub_downloader_is_deterministic_and_matches_the_universe(self):
+        end = pd.Timestamp("2024-06-03")
+        universe = synthetic_universe(3, years=1, interval='1d', end=end)
+        downloader = StubDownloader(epoch=end - pd.DateOffset(years=1))
+
+        bulk = downloader(synthetic_symbols(3), start=end - pd.Timedelta(days=30), end=end, interval='1d',
+                          group_by='ticker')
+        single = downloader('SYN0001', start=end - pd.Timedelta(days=30), end=end, interval='1d')
+
+        pd.testing.assert_frame_equal(bulk['SYN0001'], single)
+        pd.testing.assert_frame_equal(single, universe['SYN0001'].loc[single.index])
+
+    def test_stub_downloader_plugs_into_data_retrieval(self):
+        downloader = StubDownloader(epoch="2020-01-02")
+        data = get_multiple_stocks_data(synthetic_symbols(4), 30, '4h', batch_size=2, downloader=downloader)
+
+        self.assertEqual(list(data), synthetic_symbols(4))
+        self.assertEqual(downloader.calls, 2)
+
+
+class SuiteTests(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def test_every_stage_is_reported(self):
+        results = benchmark_universe(3, years=1, chart_sample=0, measure_memory=True)
+
+        self.assertEqual([result['stage'] for result in results], [
+            'generate', 'download', 'add_indicators', 'analyze_golden_cross_state', 'scan_indicator_frames',
+            'should_send_notification', 'save_signal_state', 'signal_store_commit',
+            'generate_chart', 'telegram_delivery'
+        ])
+        for result in results:
+            self.assertEqual(result['symbols'], 3)
+            self.assertGreaterEqual(result['seconds'], 0)
+            self.assertIsNotNone(result['peak_memory_mb'])
+
+    def test_compare_flags_regressions_beyond_threshold(self):
+        baseline = {'results': [{'symbols': 50, 'stage': 'download', 'seconds': 1.0, 'peak_memory_mb': 10.0},
+                                {'symbols': 50, 'stage': 'add_indicators', 'seconds': 1.0, 'peak_memory_mb': 10.0}]}
+        current = {'results': [{'symbols': 50, 'stage': 'download', 'seconds': 1.05, 'peak_memory_mb': 10.0},
+                               {'symbols': 50, 'stage': 'add_indicators', 'seconds': 1.0, 'peak_memory_mb': 20.0},
+                               {'symbols': 50, 'stage': 'process_stocks', 'seconds': 3.0, 'peak_memory_mb': 5.0}]}
+
+        rows = {row['stage']: row for row in compare_reports(baseline, current, threshold=1.10)}
+
+        self.assertEqual(set(rows), {'download', 'add_indicators'})
+        self.assertFalse(rows['download']['regression'])
+        self.assertTrue(rows['add_indicators']['regression'])
+        self.assertAlmostEqual(rows['add_indicators']['memory_ratio'], 2.0)
+
+
+class StartupTests(unittest.TestCase):
+    def test_stages_load_only_their_own_dependencies(self):
+        results = {result['mode']: result for result in benchmark_startup(3, years=1, modes=('import', 'scan-only'))}
+
+        self.assertEqual(results['import']['heavy_modules'], [])
+        scan = results['scan-only']
+        self.assertTrue(scan['ok'])
+        self.assertEqual(scan['import_modules'], [])
+        self.assertIn('yfinance', scan['heavy_modules'])
+        self.assertNotIn('matplotlib', scan['heavy_modules'])
+        self.assertNotIn('mplfinance', scan['heavy_modules'])
+
+
+class LoggingBenchmarkTests(unittest.TestCase):
+    def test_verbose_mode_writes_per_symbol_lines(self):
+        results = {result['mode']: result
+                   for result in benchmark_logging(3, years=1, scan_only=True, modes=('sync-verbose', 'queued'))}
+
+        self.assertTrue(all(result['ok'] for result in results.values()))
+        self.assertGreater(results['sync-verbose']['log_lines'], results['queued']['log_lines'])
+        self.assertGreater(results['queued']['console_bytes'], 0)
+        self.assertGreater(results['queued']['loop_lag_seconds'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from benchmark import synthetic_ohlcv
+from chart_cache import ChartCache
+from chart_generation import ChartRenderPool, build_chart_payload, generate_chart, render_chart_payload
+from technical_analysis import add_indicators
+
+
+class ChartPayloadTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.data = add_indicators(synthetic_ohlcv(periods=400))
+    
+    def test_payload_only_carries_plotted_rows(self):
+        daily = build_chart_payload(self.data, 'AAA', self.tmp.name, interval='1d')
+        hourly = build_chart_payload(self.data, 'AAA', self.tmp.name, interval='4h')
+        self.assertEqual(len(daily['data']), 30)
+        self.assertEqual(len(hourly['data']), 180)
+        self.assertEqual(list(hourly['data'].columns),
+                         ['Open', 'High', 'Low', 'Close', 'Volume', 'SMA50', 'SMA128'])
+        self.assertTrue(hourly['filepath'].endswith('AAA_4h_chart.png'))
+    
+    def test_render_payload_writes_png(self):
+        payload = build_chart_payload(self.data, 'AAA', self.tmp.name, interval='4h')
+        path, success = render_chart_payload(payload)
+        self.assertTrue(success)
+        self.assertTrue(os.path.getsize(path) > 0)
+    
+    def test_render_pool_returns_paths_to_event_loop(self):
+        pool = ChartRenderPool(workers=2)
+        self.addCleanup(pool.shutdown)
+        
+        async def render_all():
+            return await asyncio.gather(*(
+                pool.render(self.data, symbol, self.tmp.name, interval='1d') for symbol in ('AAA', 'BBB', 'CCC')
+            ))
+        
+        results = asyncio.run(render_all())
+        self.assertTrue(all(success for _, success in results))
+        self.assertEqual(sorted(os.path.basename(path) for path, _ in results),
+                         ['AAA_1d_chart.png', 'BBB_1d_chart.png', 'CCC_1d_chart.png'])
+
+
+class ChartCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.data = add_indicators(synthetic_ohlcv(periods=400))
+    
+    def _generate(self, cache, data=None, chart_config=None):
+        with mock.patch('chart_generation.plot_chart', side_effect=lambda *args: open(args[2], 'wb').close()) as plot:
+            self.assertTrue(generate_chart(data if data is not None else self.data, 'AAA', self.tmp.name,
+                                           chart_config, interval='1d', cache=cache))
+        return plot.call_count
+    
+    def test_unchanged_chart_is_not_rendered_again(self):
+        cache = ChartCache(self.tmp.name)
+        self.assertEqual(self._generate(cache), 1)
+        cache.save()
+        
+        reloaded = ChartCache(self.tmp.name)
+        self.assertEqual(self._generate(reloaded), 0)
+        self.assertEqual((reloaded.hits, reloaded.misses), (1, 0))
+    
+    def test_new_candle_or_style_change_invalidates_entry(self):
+        cache = ChartCache(self.tmp.name)
+        self._generate(cache)
+        
+        self.assertEqual(self._generate(cache, data=self.data.iloc[:-1]), 1)
+        self.assertEqual(self._generate(cache, data=self.data.iloc[:-1], chart_config={
+            'up_color': 'teal', 'down_color': 'red', 'sma_50_color': 'blue', 'sma_128_color': 'orange'
+        }), 1)
+    
+    def test_evict_removes_symbols_no_longer_watched(self):
+        cache = ChartCache(self.tmp.name)
+        self._generate(cache)
+        chart = os.path.join(self.tmp.name, 'AAA_1d_chart.png')
+        self.assertTrue(os.path.exists(chart))
+        
+        self.assertEqual(cache.evict(['BBB']), ['AAA'])
+        self.assertFalse(os.path.exists(chart))
+        self.assertEqual(cache.entries, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
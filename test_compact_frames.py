@@ -0,0 +1,65 @@
+import logging
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from chart_generation import build_plot_frame
+from compact_frames import compact_ohlcv, is_compact
+from indicator_engine import IndicatorEngine
+from technical_analysis import add_indicators, scan_indicator_frames
+
+
+def _history(periods=400, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2024-01-02 09:30", periods=periods, freq="4h", tz="America/New_York")
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, periods)))
+    return pd.DataFrame({
+        'Open': closes * 0.999,
+        'High': closes * 1.01,
+        'Low': closes * 0.99,
+        'Close': closes,
+        'Adj Close': closes,
+        'Volume': rng.integers(1_000, 3_000_000_000, periods)
+    }, index=index)
+
+
+class CompactFrameTests(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def test_compact_frame_is_one_float32_block_of_ohlcv(self):
+        compact = compact_ohlcv(_history())
+
+        self.assertTrue(is_compact(compact))
+        self.assertEqual(list(compact.columns), ['Open', 'High', 'Low', 'Close', 'Volume'])
+        self.assertEqual(compact._mgr.nblocks, 1)
+        self.assertIs(compact_ohlcv(compact), compact)
+
+    def test_indicators_match_the_float64_path(self):
+        history = _history()
+        full = add_indicators(history)
+        compact = add_indicators(compact_ohlcv(history))
+
+        self.assertTrue(is_compact(compact))
+        self.assertEqual(compact._mgr.nblocks, 1)
+        self.assertTrue(compact.index.equals(full.index))
+        for column in ('Close', 'SMA50', 'SMA128'):
+            np.testing.assert_allclose(compact[column], full[column], rtol=1e-6)
+        self.assertEqual(scan_indicator_frames({'AAA': compact}, 0.75)['AAA']['state'],
+                         scan_indicator_frames({'AAA': full}, 0.75)['AAA']['state'])
+
+    def test_incremental_engine_keeps_frames_compact(self):
+        indicators = IndicatorEngine().add_indicators('AAA', '4h', compact_ohlcv(_history()))
+
+        self.assertTrue(is_compact(indicators))
+        self.assertEqual(len(indicators), 180)
+        plot_frame = build_plot_frame(indicators, '4h')
+        self.assertEqual(set(plot_frame.dtypes), {np.dtype(np.float64)})
+
+
+if __name__ == '__main__':
+    unittest.main()
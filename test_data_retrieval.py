@@ -0,0 +1,256 @@
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+from data_retrieval import (get_daily_and_intraday_data, get_history_window, get_multiple_stocks_data,
+                            resample_ohlcv, split_batch_frame, validate_resampled)
+from ohlcv_cache import OHLCVCache, align_timestamp
+
+FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def _single_frame(periods=5, start=100.0):
+    index = pd.date_range("2024-01-01", periods=periods, freq="D")
+    values = np.arange(periods, dtype=float) + start
+    return pd.DataFrame({field: values for field in FIELDS}, index=index)
+
+
+class StubDownloader:
+    """Stands in for yf.download and records every call."""
+    def __init__(self, empty_in_batch=()):
+        self.calls = []
+        self.empty_in_batch = set(empty_in_batch)
+    
+    def __call__(self, tickers, **kwargs):
+        self.calls.append(tickers)
+        if isinstance(tickers, str):
+            return _single_frame()
+        frames = {}
+        for offset, ticker in enumerate(tickers):
+            frame = _single_frame(start=100.0 * (offset + 1))
+            if ticker in self.empty_in_batch:
+                frame[:] = np.nan
+            frames[ticker] = frame
+        return pd.concat(frames, axis=1)
+
+
+class BatchedRetrievalTests(unittest.TestCase):
+    def test_batches_symbols_into_bulk_downloads(self):
+        downloader = StubDownloader()
+        symbols = [f"SYM{i}" for i in range(7)]
+        result = get_multiple_stocks_data(symbols, 30, '1d', batch_size=3, downloader=downloader)
+        
+        self.assertEqual(list(result), symbols)
+        self.assertEqual(len(downloader.calls), 3)
+        self.assertEqual(list(result['SYM1'].columns), FIELDS)
+        self.assertEqual(result['SYM1']['Close'].iloc[0], 200.0)
+    
+    def test_retries_only_empty_tickers_individually(self):
+        downloader = StubDownloader(empty_in_batch={'BBB'})
+        result = get_multiple_stocks_data(['AAA', 'BBB', 'CCC'], 30, '4h', batch_size=10, downloader=downloader)
+        
+        self.assertEqual(set(result), {'AAA', 'BBB', 'CCC'})
+        self.assertEqual(downloader.calls, [['AAA', 'BBB', 'CCC'], 'BBB'])
+    
+    def test_unbatched_mode_downloads_per_symbol(self):
+        downloader = StubDownloader()
+        result = get_multiple_stocks_data(['AAA', 'BBB'], 30, '4h', downloader=downloader)
+        self.assertEqual(downloader.calls, ['AAA', 'BBB'])
+        self.assertEqual(set(result), {'AAA', 'BBB'})
+    
+    def test_split_handles_field_first_columns(self):
+        data = pd.concat({'AAA': _single_frame(), 'BBB': _single_frame()}, axis=1).swaplevel(axis=1)
+        frames = split_batch_frame(data, ['AAA', 'BBB'])
+        self.assertEqual(set(frames), {'AAA', 'BBB'})
+        self.assertEqual(list(frames['AAA'].columns), FIELDS)
+
+
+class RangeDownloader:
+    """Returns deterministic daily bars for the requested date range."""
+    def __init__(self):
+        self.requests = []
+    
+    def __call__(self, tickers, start=None, end=None, **kwargs):
+        self.requests.append((tickers, pd.Timestamp(start)))
+        index = pd.date_range(pd.Timestamp(start).normalize(), pd.Timestamp(end), freq="D", tz="America/New_York")
+        values = index.dayofyear.to_numpy(dtype=float)
+        frame = pd.DataFrame({field: values for field in FIELDS}, index=index)
+        frame['Volume'] = frame['Volume'].astype('int64')
+        if isinstance(tickers, str):
+            return frame
+        return pd.concat({ticker: frame for ticker in tickers}, axis=1)
+
+
+class OHLCVCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+    
+    def test_round_trip_preserves_index_and_dtypes(self):
+        cache = OHLCVCache(self.tmp.name)
+        frame = RangeDownloader()('AAA', start="2024-01-01", end="2024-02-01")
+        cache.store('AAA', '1d', frame, pd.Timestamp("2024-01-01"))
+        
+        loaded, covered_start = cache.load('AAA', '1d')
+        pd.testing.assert_frame_equal(loaded, frame, check_freq=False)
+        self.assertEqual(covered_start, pd.Timestamp("2024-01-01"))
+    
+    def test_warm_cache_fetches_only_the_tail(self):
+        cache = OHLCVCache(self.tmp.name)
+        downloader = RangeDownloader()
+        
+        cold = get_multiple_stocks_data(['AAA', 'BBB'], 30, '1d', batch_size=10, downloader=downloader, cache=cache)
+        cache.flush()
+        first_start = downloader.requests[0][1]
+        
+        warm = get_multiple_stocks_data(['AAA', 'BBB'], 30, '1d', batch_size=10, downloader=downloader, cache=cache)
+        cache.flush()
+        tail_start = downloader.requests[1][1]
+        
+        self.assertEqual(len(downloader.requests), 2)
+        self.assertGreater(tail_start - first_start, pd.Timedelta(days=200))
+        for symbol in ('AAA', 'BBB'):
+            self.assertFalse(warm[symbol].index.duplicated().any())
+            self.assertEqual(warm[symbol].index[-1], cold[symbol].index[-1])
+            self.assertEqual(len(warm[symbol]), len(cold[symbol]))
+    
+    def test_each_symbol_is_refreshed_from_its_own_tail(self):
+        cache = OHLCVCache(self.tmp.name)
+        downloader = RangeDownloader()
+        get_multiple_stocks_data(['AAA', 'BBB', 'CCC'], 30, '1d', batch_size=10, downloader=downloader, cache=cache)
+        cache.flush()
+        # BBB was last refreshed a month ago
+        stale, covered_start = cache.load('BBB', '1d')
+        cache.store('BBB', '1d', stale.iloc[:-30], covered_start)
+        
+        downloader.requests.clear()
+        warm = get_multiple_stocks_data(['AAA', 'BBB', 'CCC'], 30, '1d', batch_size=10, downloader=downloader, cache=cache)
+        cache.flush()
+        
+        self.assertEqual(len(downloader.requests), 2)
+        (stale_group, stale_start), (recent_group, recent_start) = downloader.requests
+        self.assertEqual((stale_group, recent_group), ('BBB', ['AAA', 'CCC']))
+        self.assertEqual((recent_start - stale_start).days, 30)
+        self.assertEqual(warm['BBB'].index[-1], warm['AAA'].index[-1])
+    
+    def test_merged_history_is_trimmed_to_the_window(self):
+        cache = OHLCVCache(self.tmp.name)
+        downloader = RangeDownloader()
+        start, end = get_history_window(30, '1d')
+        old = downloader('AAA', start=start - pd.Timedelta(days=400), end=end - pd.Timedelta(days=5))
+        cache.store('AAA', '1d', old, start - pd.Timedelta(days=400))
+        
+        warm = get_multiple_stocks_data(['AAA'], 30, '1d', downloader=downloader, cache=cache)
+        cache.flush()
+        stored, covered_start = cache.load('AAA', '1d')
+        
+        self.assertEqual(len(stored), len(warm['AAA']))
+        self.assertGreaterEqual(stored.index[0], align_timestamp(start, stored.index))
+        # The window of the refreshing call, a moment after ours
+        self.assertLess(abs(covered_start - pd.Timestamp(start)), pd.Timedelta(minutes=1))
+
+
+
+def _hourly_session_frame(start, days):
+    """Regular-session 1h bars (09:30-15:30 New York) for consecutive weekdays."""
+    sessions = pd.bdate_range(start, periods=days)
+    index = pd.DatetimeIndex([session + pd.Timedelta(hours=9, minutes=30 + 60 * bar)
+                              for session in sessions for bar in range(7)]).tz_localize("America/New_York")
+    values = np.arange(len(index), dtype=float) + 1
+    return pd.DataFrame({'Open': values, 'High': values + 1, 'Low': values - 0.5, 'Close': values + 0.5,
+                         'Volume': np.ones(len(index))}, index=index)
+
+
+class SessionDownloader:
+    """Serves 4h bars (09:30 and 13:30 sessions) and the matching daily bars.
+
+    Each symbol's prices are a function of the session date and bar only, so the daily
+    bars can be built independently of resample_ohlcv. intraday_days limits how far back
+    the intraday history goes, like Yahoo's per-interval limits.
+    """
+    def __init__(self, intraday_days=None):
+        self.intraday_days = intraday_days
+        self.requests = []
+
+    @staticmethod
+    def _price(session, bar):
+        return 100 + (session.toordinal() % 97) + bar * 0.25
+
+    def _frame(self, start, end, interval):
+        sessions = pd.bdate_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize())
+        sessions = sessions[sessions < pd.Timestamp(end)]
+        if interval == '1d':
+            rows = [(self._price(d, 0), self._price(d, 1) + 1, self._price(d, 0) - 1, self._price(d, 1), 20.0)
+                    for d in sessions]
+            return pd.DataFrame(rows, columns=FIELDS, index=pd.DatetimeIndex(sessions, name='Date'))
+        if self.intraday_days is not None:
+            sessions = sessions[sessions >= pd.Timestamp(end).normalize() - pd.Timedelta(days=self.intraday_days)]
+        rows, stamps = [], []
+        for session in sessions:
+            for bar, clock in enumerate(('09:30', '13:30')):
+                high = self._price(session, 1) + 1 if bar else self._price(session, 0)
+                low = self._price(session, 0) - 1 if not bar else self._price(session, 1)
+                rows.append((self._price(session, bar), high, low, self._price(session, bar), 10.0))
+                stamps.append(pd.Timestamp(f"{session.date()} {clock}"))
+        return pd.DataFrame(rows, columns=FIELDS,
+                            index=pd.DatetimeIndex(stamps, name='Datetime').tz_localize("America/New_York"))
+
+    def __call__(self, tickers, start=None, end=None, interval='1d', **kwargs):
+        self.requests.append((tickers, interval, pd.Timestamp(start), pd.Timestamp(end)))
+        if isinstance(tickers, str):
+            return self._frame(start, end, interval)
+        return pd.concat({ticker: self._frame(start, end, interval) for ticker in tickers}, axis=1)
+
+
+class ResamplingTests(unittest.TestCase):
+    def test_daily_bars_follow_exchange_sessions_across_dst(self):
+        # US clocks changed on 2024-03-10, between the two sessions
+        hourly = _hourly_session_frame("2024-03-08", 2)
+        daily = resample_ohlcv(hourly, '1d')
+
+        self.assertEqual(list(daily.index), [pd.Timestamp("2024-03-08"), pd.Timestamp("2024-03-11")])
+        self.assertEqual(daily.index.name, 'Date')
+        self.assertEqual(daily.iloc[0].tolist(), [1.0, 8.0, 0.5, 7.5, 7.0])
+        self.assertEqual(daily.iloc[1].tolist(), [8.0, 15.0, 7.5, 14.5, 7.0])
+
+    def test_intraday_target_is_anchored_at_session_open(self):
+        four_hour = resample_ohlcv(_hourly_session_frame("2024-03-08", 2), '4h')
+
+        self.assertEqual([stamp.strftime('%m-%d %H:%M') for stamp in four_hour.index],
+                         ['03-08 09:30', '03-08 13:30', '03-11 09:30', '03-11 13:30'])
+        self.assertEqual(four_hour['Volume'].tolist(), [4.0, 3.0, 4.0, 3.0])
+
+    def test_daily_series_comes_from_the_single_intraday_download(self):
+        downloader = SessionDownloader()
+        daily, intraday = get_daily_and_intraday_data(['AAA', 'BBB'], 30, '4h', batch_size=10, downloader=downloader)
+
+        self.assertEqual([request[1] for request in downloader.requests], ['4h'])
+        daily_start, end = get_history_window(30, '1d')
+        direct = downloader('AAA', start=daily_start, end=end, interval='1d')
+        report = validate_resampled(daily['AAA'], direct, tolerance_pct=0.0, columns=FIELDS[:4])
+        self.assertTrue(report['ok'], report)
+        self.assertLessEqual(len(report['missing_from_resampled']), 1)
+
+        intraday_start, _ = get_history_window(30, '4h')
+        self.assertGreaterEqual(intraday['AAA'].index[0].tz_localize(None), pd.Timestamp(intraday_start))
+
+    def test_short_intraday_history_is_topped_up_with_older_daily_bars(self):
+        downloader = SessionDownloader(intraday_days=60)
+        daily, _ = get_daily_and_intraday_data(['AAA'], 30, '4h', downloader=downloader)
+
+        daily_requests = [request for request in downloader.requests if request[1] == '1d']
+        self.assertEqual(len(daily_requests), 1)
+        self.assertLess(daily_requests[0][3] - daily_requests[0][2], pd.Timedelta(days=200))
+
+        series = daily['AAA']
+        self.assertFalse(series.index.duplicated().any())
+        self.assertTrue(series.index.is_monotonic_increasing)
+        daily_start, end = get_history_window(30, '1d')
+        direct = downloader('AAA', start=daily_start, end=end, interval='1d')
+        self.assertTrue(validate_resampled(series, direct, tolerance_pct=0.0)['ok'])
+        self.assertLessEqual(len(direct.index.difference(series.index)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import logging
+import tempfile
+import time
+import unittest
+
+import pandas as pd
+
+from benchmark import StubDownloader, synthetic_symbols
+from data_retrieval import get_multiple_stocks_data, get_stock_data
+from data_sources import (DataSource, HTTPSource, RecordingSource, ReplaySource, StandInServer, YFinanceSource,
+                          create_data_source, decode_frames, encode_frames)
+from metrics import METRICS
+
+
+class FrameCodecTests(unittest.TestCase):
+    def test_round_trip_keeps_timezones_and_dtypes(self):
+        index = pd.date_range("2024-03-08 09:30", periods=4, freq='4h', tz='America/New_York', name='Datetime')
+        intraday = pd.DataFrame({'Close': [1.0, 2.0, 3.0, 4.0], 'Volume': [10, 20, 30, 40]}, index=index)
+        daily = pd.DataFrame({'Close': [5.0, 6.0]}, index=pd.date_range("2024-03-08", periods=2, freq='D'))
+
+        frames = decode_frames(encode_frames({'AAA': intraday, 'BBB': daily}))
+
+        pd.testing.assert_frame_equal(frames['AAA'], intraday, check_freq=False)
+        pd.testing.assert_frame_equal(frames['BBB'], daily, check_freq=False)
+
+
+class RecordReplayTests(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.end = pd.Timestamp.now().normalize()
+        self.upstream = StubDownloader(epoch=self.end - pd.DateOffset(years=2))
+        self.symbols = synthetic_symbols(4)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def test_replay_serves_recorded_responses_offline(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            recorder = RecordingSource(self.upstream, tmp)
+            recorded = get_multiple_stocks_data(self.symbols, 365, '4h', batch_size=2, downloader=recorder)
+            self.assertEqual(recorder.recorded, 4)
+
+            replay = ReplaySource(tmp)
+            replayed = get_multiple_stocks_data(self.symbols, 365, '4h', batch_size=2, downloader=replay)
+            single = get_stock_data(self.symbols[0], 30, '4h', downloader=replay)
+
+        self.assertEqual(set(replayed), set(self.symbols))
+        for symbol in self.symbols:
+            pd.testing.assert_frame_equal(replayed[symbol], recorded[symbol], check_freq=False)
+        self.assertEqual(single.index[-1], recorded[self.symbols[0]].index[-1])
+        self.assertLess(len(single), len(recorded[self.symbols[0]]))
+        self.assertEqual(replay.misses, 0)
+
+    def test_unrecorded_symbols_are_missing(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertIsNone(get_stock_data('NOPE', 30, '4h', downloader=ReplaySource(tmp)))
+
+    def test_sources_must_implement_fetch(self):
+        class Incomplete(DataSource):
+            name = 'incomplete'
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+    def test_config_selects_the_source(self):
+        self.assertIsInstance(create_data_source({}), YFinanceSource)
+        with tempfile.TemporaryDirectory() as tmp:
+            source = create_data_source({'source': 'replay', 'replay_directory': tmp, 'record_directory': tmp})
+        self.assertIsInstance(source, RecordingSource)
+        self.assertIsInstance(source.source, ReplaySource)
+        self.assertIsInstance(create_data_source({'source': 'http', 'source_url': 'http://localhost:1/'}), HTTPSource)
+
+
+class StandInServerTests(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.end = pd.Timestamp.now().normalize()
+        self.upstream = StubDownloader(epoch=self.end - pd.DateOffset(years=2))
+        self.symbols = synthetic_symbols(6)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def test_serves_the_same_history_as_the_source(self):
+        direct = get_multiple_stocks_data(self.symbols, 365, '4h', batch_size=3, downloader=self.upstream)
+        with StandInServer(self.upstream, latency=0.05) as server:
+            start = time.perf_counter()
+            served = get_multiple_stocks_data(self.symbols, 365, '4h', batch_size=3, downloader=HTTPSource(server.url))
+            seconds = time.perf_counter() - start
+
+        self.assertEqual(server.requests, 2)
+        self.assertGreaterEqual(seconds, 0.1)
+        for symbol in self.symbols:
+            pd.testing.assert_frame_equal(served[symbol], direct[symbol], check_freq=False)
+
+    def test_failures_are_seeded_and_counted(self):
+        def run():
+            with StandInServer(self.upstream, failure_rate=0.5, seed=7) as server:
+                get_multiple_stocks_data(self.symbols, 30, '4h', batch_size=1, downloader=HTTPSource(server.url))
+            return server.failures
+
+        errors_before = sum(METRICS.snapshot()['counters'].get('fetch_errors_total', {}).values())
+        failures = run()
+        errors = sum(METRICS.snapshot()['counters'].get('fetch_errors_total', {}).values()) - errors_before
+
+        self.assertGreater(failures, 0)
+        self.assertEqual(errors, failures)
+        self.assertEqual(run(), failures)
+
+    def test_hanging_request_times_out(self):
+        with StandInServer(self.upstream, hang_rate=1.0, hang_seconds=1.0) as server:
+            start = time.perf_counter()
+            data = get_stock_data(self.symbols[0], 30, '4h', downloader=HTTPSource(server.url, timeout=0.2))
+            seconds = time.perf_counter() - start
+
+        self.assertIsNone(data)
+        self.assertLess(seconds, 0.9)
+
+
+if __name__ == '__main__':
+    unittest.main()
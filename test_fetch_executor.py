@@ -0,0 +1,206 @@
+import logging
+import threading
+import time
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from benchmark import StubDownloader, synthetic_symbols
+from data_retrieval import get_multiple_stocks_data
+from data_sources import EmptyDownloadError, HTTPSource, StandInServer, YFinanceSource
+from fetch_executor import AdaptiveLimit, CircuitBreaker, CircuitOpenError, FetchTimeout, ResilientFetcher
+from metrics import METRICS
+
+
+def attempts(source):
+    counters = METRICS.snapshot()['counters'].get('fetch_attempts_total', {})
+    return {dict(key)['outcome']: value for key, value in counters.items() if dict(key)['source'] == source}
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def test_opens_then_lets_one_trial_through(self):
+        now = [0.0]
+        breaker = CircuitBreaker('test-breaker', failure_threshold=2, reset_seconds=10, clock=lambda: now[0])
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertTrue(breaker.is_open)
+        self.assertFalse(breaker.allow())
+
+        now[0] = 11.0
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        now[0] = 22.0
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+
+class AdaptiveLimitTests(unittest.TestCase):
+    def test_additive_increase_multiplicative_decrease(self):
+        limit = AdaptiveLimit('test-limit', initial=2, maximum=8, latency_target=1.0)
+        for _ in range(6):
+            self.assertTrue(limit.acquire())
+            limit.release(0.1, ok=True)
+        self.assertGreaterEqual(int(limit.limit), 4)
+
+        grown = limit.limit
+        limit.acquire()
+        limit.release(2.0, ok=True)
+        self.assertAlmostEqual(limit.limit, grown / 2)
+        limit.acquire()
+        limit.release(0.1, ok=False)
+        self.assertAlmostEqual(limit.limit, max(1.0, grown / 4))
+
+    def test_waits_for_a_free_slot(self):
+        limit = AdaptiveLimit('test-limit', initial=1, maximum=1)
+        self.assertTrue(limit.acquire())
+        self.assertFalse(limit.acquire(timeout=0.05))
+        threading.Timer(0.05, limit.release, args=(0.01, True)).start()
+        self.assertTrue(limit.acquire(timeout=1.0))
+
+
+class ResilientFetcherTests(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def test_retries_errors_with_backoff(self):
+        calls = []
+
+        def flaky(tickers, **kwargs):
+            calls.append(tickers)
+            if len(calls) < 3:
+                raise ConnectionError("reset")
+            return 'data'
+
+        before = attempts('flaky')
+        fetcher = ResilientFetcher(flaky, name='flaky', retries=3, backoff_base=0.01, seed=1)
+        self.assertEqual(fetcher('AAA', interval='1d'), 'data')
+        after = attempts('flaky')
+
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(after.get('error', 0) - before.get('error', 0), 2)
+        self.assertEqual(after.get('ok', 0) - before.get('ok', 0), 1)
+
+    def test_hanging_request_is_abandoned_at_its_timeout(self):
+        def hang(tickers, **kwargs):
+            time.sleep(2)
+
+        fetcher = ResilientFetcher(hang, name='hang', timeout=0.1, retries=1, backoff_base=0.01)
+        start = time.perf_counter()
+        with self.assertRaises(FetchTimeout):
+            fetcher('AAA')
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+    def test_timed_out_request_is_never_overlapped(self):
+        state = {'calls': 0, 'running': 0, 'peak': 0}
+        lock = threading.Lock()
+
+        def slow_first(tickers, **kwargs):
+            with lock:
+                state['calls'] += 1
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+                first = state['calls'] == 1
+            try:
+                time.sleep(1.0 if first else 0.05)
+                return 'data'
+            finally:
+                with lock:
+                    state['running'] -= 1
+
+        # A plain function is not thread-safe, like yfinance
+        fetcher = ResilientFetcher(slow_first, name='slow-first', timeout=0.2, retries=2, backoff_base=0.01)
+        self.assertEqual(fetcher.max_concurrency, 1)
+        with self.assertRaises(FetchTimeout):
+            fetcher('AAA')
+        self.assertEqual(state['calls'], 1)
+        # The next download waits for the abandoned request to return
+        self.assertEqual(fetcher('BBB'), 'data')
+
+        self.assertEqual(state['calls'], 2)
+        self.assertEqual(state['peak'], 1)
+        self.assertEqual(fetcher.limit.in_flight, 0)
+
+    def test_open_circuit_fails_fast(self):
+        def down(tickers, **kwargs):
+            raise ConnectionError("refused")
+
+        fetcher = ResilientFetcher(down, name='down', retries=0, breaker_threshold=2)
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                fetcher('AAA')
+        self.assertTrue(fetcher.circuit_open)
+        with self.assertRaises(CircuitOpenError):
+            fetcher('AAA')
+
+    def test_failed_yfinance_download_is_retried_and_opens_the_circuit(self):
+        calls = []
+
+        def failed_download(tickers, **kwargs):
+            # yf.download logs each ticker's exception and returns empty columns
+            calls.append(tickers)
+            logging.getLogger('yfinance').error("['AAA']: ConnectionError('reset')")
+            return pd.DataFrame()
+
+        before = attempts('yfinance')
+        fetcher = ResilientFetcher(YFinanceSource(), retries=2, backoff_base=0.01, breaker_threshold=3, seed=1)
+        with mock.patch('yfinance.download', failed_download):
+            with self.assertRaises(EmptyDownloadError):
+                fetcher(['AAA'], interval='1d')
+            self.assertTrue(fetcher.circuit_open)
+            with self.assertRaises(CircuitOpenError):
+                fetcher(['AAA'], interval='1d')
+        after = attempts('yfinance')
+
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(after.get('error', 0) - before.get('error', 0), 3)
+        self.assertEqual(after.get('rejected', 0) - before.get('rejected', 0), 1)
+
+    def test_yfinance_requests_never_overlap(self):
+        self.assertEqual(ResilientFetcher(YFinanceSource(), max_concurrency=8).max_concurrency, 1)
+        self.assertEqual(ResilientFetcher(HTTPSource('http://127.0.0.1:1'), max_concurrency=8).max_concurrency, 8)
+
+
+class FetchLayerTests(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        end = pd.Timestamp.now().normalize()
+        self.upstream = StubDownloader(epoch=end - pd.DateOffset(years=1))
+        self.symbols = synthetic_symbols(30)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def test_hangs_and_failures_do_not_stretch_the_run(self):
+        with StandInServer(self.upstream, failure_rate=0.1, hang_rate=0.1, hang_seconds=3.0, seed=3) as server:
+            fetcher = ResilientFetcher(HTTPSource(server.url), timeout=0.3, retries=4, backoff_base=0.02,
+                                       breaker_threshold=1000, seed=3)
+            start = time.perf_counter()
+            frames = get_multiple_stocks_data(self.symbols, 30, '4h', batch_size=1, downloader=fetcher)
+            seconds = time.perf_counter() - start
+
+        self.assertGreater(server.hangs, 0)
+        self.assertEqual(set(frames), set(self.symbols))
+        self.assertLess(seconds, 3.0)
+        self.assertGreater(fetcher.limit.peak, 1)
+
+    def test_open_circuit_skips_the_remaining_symbols(self):
+        with StandInServer(self.upstream, failure_rate=1.0) as server:
+            fetcher = ResilientFetcher(HTTPSource(server.url), retries=0, breaker_threshold=3, max_concurrency=1)
+            frames = get_multiple_stocks_data(self.symbols, 30, '4h', batch_size=1, downloader=fetcher)
+
+        self.assertEqual(frames, {})
+        self.assertEqual(server.requests, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
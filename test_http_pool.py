@@ -0,0 +1,96 @@
+import asyncio
+import importlib.util
+import logging
+import threading
+import unittest
+
+import pandas as pd
+
+import http_pool
+from benchmark import StubDownloader, synthetic_symbols
+from data_retrieval import get_multiple_stocks_data
+from data_sources import HTTPSource, StandInServer
+from fetch_executor import ResilientFetcher
+from metrics import METRICS
+from telegram_bot import TelegramManager
+
+
+class ConnectionPoolTests(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        http_pool.configure()
+        METRICS.reset()
+        self.end = pd.Timestamp.now().normalize()
+        self.upstream = StubDownloader(epoch=self.end - pd.DateOffset(years=1))
+        self.symbols = synthetic_symbols(4)
+
+    def tearDown(self):
+        http_pool.configure()
+        logging.disable(logging.NOTSET)
+
+    def connection_counts(self, client):
+        counters = METRICS.run_report()['counters']
+        return {name: counters.get(f'http_{name}_total', {}).get(f'client={client},host=127.0.0.1', 0)
+                for name in ('requests', 'connections_opened', 'connections_reused')}
+
+    def test_fetch_threads_share_one_connection(self):
+        with StandInServer(self.upstream) as server:
+            # Every attempt runs on its own thread
+            source = ResilientFetcher(HTTPSource(server.url), max_concurrency=1)
+            data = get_multiple_stocks_data(self.symbols, 30, '4h', batch_size=1, downloader=source)
+
+        self.assertEqual(set(data), set(self.symbols))
+        self.assertEqual(server.requests, 4)
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(self.connection_counts('http'),
+                         {'requests': 4, 'connections_opened': 1, 'connections_reused': 3})
+        self.assertEqual(METRICS.run_report()['cache_hit_rates']['http_connections'], 0.75)
+
+    def test_zero_keepalive_opens_a_connection_per_request(self):
+        http_pool.configure({'keepalive_seconds': 0})
+        with StandInServer(self.upstream) as server:
+            get_multiple_stocks_data(self.symbols, 30, '4h', batch_size=1, downloader=HTTPSource(server.url))
+
+        self.assertEqual(server.connections, 4)
+        self.assertEqual(self.connection_counts('http')['connections_reused'], 0)
+
+    @unittest.skipUnless(importlib.util.find_spec('curl_cffi'), "curl_cffi is not installed")
+    def test_yfinance_session_reuses_connections_across_threads(self):
+        session = http_pool.yfinance_session()
+        self.assertIs(http_pool.yfinance_session(), session)
+        with StandInServer(self.upstream) as server:
+            statuses = []
+            for symbol in self.symbols:
+                worker = threading.Thread(target=lambda: statuses.append(
+                    session.get(f"{server.url}/download?symbols={symbol}").status_code))
+                worker.start()
+                worker.join()
+
+        self.assertEqual(statuses, [200] * 4)
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(self.connection_counts('yfinance'),
+                         {'requests': 4, 'connections_opened': 1, 'connections_reused': 3})
+
+    def test_telegram_bots_share_the_pooled_request(self):
+        first = TelegramManager('123:abc', chat_id='1')
+        second = TelegramManager('123:abc', chat_id='1')
+        request = http_pool.telegram_request()
+        self.assertIs(first.bot.request, request)
+        self.assertIs(second.bot.request, request)
+        self.assertEqual(request.http_version, '2' if http_pool.http2_available() else '1.1')
+
+        with StandInServer(self.upstream) as server:
+            async def run():
+                await request.initialize()
+                return [(await request.do_request(f"{server.url}/status", 'GET'))[0] for _ in range(3)]
+
+            statuses = asyncio.run(run())
+
+        self.assertEqual(statuses, [404] * 3)
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(self.connection_counts('telegram'),
+                         {'requests': 3, 'connections_opened': 1, 'connections_reused': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
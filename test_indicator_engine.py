@@ -0,0 +1,104 @@
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+from indicator_engine import IndicatorEngine, RollingMean
+from technical_analysis import add_indicators, calculate_sma
+
+
+def _build_ohlcv(periods=400, seed=7):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2024-01-02 09:30", periods=periods, freq="4h", tz="America/New_York")
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, periods)))
+    return pd.DataFrame({
+        'Open': closes,
+        'High': closes * 1.01,
+        'Low': closes * 0.99,
+        'Close': closes,
+        'Volume': rng.integers(100_000, 1_000_000, periods)
+    }, index=index)
+
+
+class RollingMeanTests(unittest.TestCase):
+    def test_matches_pandas_rolling_mean_exactly(self):
+        data = _build_ohlcv()
+        data.iloc[60, data.columns.get_loc('Close')] = np.nan
+        for period in (50, 128):
+            kernel = RollingMean(period)
+            values = np.array([kernel.update(value) for value in data['Close']])
+            np.testing.assert_array_equal(values, calculate_sma(data, period).to_numpy())
+
+
+class IndicatorEngineTests(unittest.TestCase):
+    def test_incremental_update_matches_full_recomputation(self):
+        data = _build_ohlcv()
+        engine = IndicatorEngine()
+        engine.add_indicators('AAA', '4h', data.iloc[:300])
+        
+        # Next run: the window start moves forward and the last candle has been revised
+        update = data.iloc[40:].copy()
+        update.iloc[-1, update.columns.get_loc('Close')] *= 1.02
+        result = engine.add_indicators('AAA', '4h', update)
+        
+        expected = add_indicators(pd.concat([data.iloc[:-1], update.iloc[-1:]]))
+        pd.testing.assert_frame_equal(result, expected.iloc[-len(result):])
+        self.assertEqual(len(result), 180)
+    
+    def test_state_does_not_hold_on_to_the_fetched_history(self):
+        engine = IndicatorEngine()
+        engine.add_indicators('AAA', '4h', _build_ohlcv(periods=2000))
+        state = engine.states['AAA|4h']
+        for array in (state.history_index, state.history_close, *state.history.values()):
+            self.assertEqual(len(array), 180)
+            self.assertIsNone(array.base)
+    
+    def test_state_round_trips_through_disk(self):
+        data = _build_ohlcv()
+        engine = IndicatorEngine()
+        engine.add_indicators('AAA', '4h', data.iloc[:350])
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'indicator_state.npz')
+            engine.save(path)
+            self.assertEqual(os.listdir(tmp), ['indicator_state.npz'])
+            with np.load(path, allow_pickle=False) as archive:
+                self.assertEqual(list(archive['keys']), ['AAA|4h'])
+                self.assertEqual(archive['history_index'].dtype, np.int64)
+            restored = IndicatorEngine.load(path)
+        
+        result = restored.add_indicators('AAA', '4h', data)
+        pd.testing.assert_frame_equal(result, add_indicators(data).iloc[-180:])
+    
+    def test_legacy_json_state_is_rebuilt(self):
+        data = _build_ohlcv()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'indicator_state.json')
+            with open(path, 'w') as handle:
+                json.dump({'AAA|4h': {}}, handle)
+            engine = IndicatorEngine.load(path)
+        
+        self.assertEqual(engine.states, {})
+        pd.testing.assert_frame_equal(engine.add_indicators('AAA', '4h', data), add_indicators(data).iloc[-180:])
+    
+    def test_rewritten_past_closes_rebuild_the_state(self):
+        data = _build_ohlcv()
+        engine = IndicatorEngine()
+        engine.add_indicators('AAA', '4h', data.iloc[:300])
+        
+        # A 2:1 split adjustment rewrites every past close
+        adjusted = data.copy()
+        adjusted[['Open', 'High', 'Low', 'Close']] /= 2
+        result = engine.add_indicators('AAA', '4h', adjusted)
+        
+        pd.testing.assert_frame_equal(result, add_indicators(adjusted).iloc[-180:])
+    
+    def test_insufficient_history_returns_none(self):
+        engine = IndicatorEngine()
+        self.assertIsNone(engine.add_indicators('AAA', '4h', _build_ohlcv(periods=100)))
+
+
+if __name__ == '__main__':
+    unittest.main()
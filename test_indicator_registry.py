@@ -0,0 +1,115 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from benchmark import synthetic_ohlcv
+from chart_generation import build_chart_payload, render_chart_payload
+from indicator_engine import IndicatorEngine
+from indicator_registry import IndicatorRegistry, chart_overlays, ema_kernel, parse_indicator_specs, sma_kernel
+
+DEFINITIONS = {
+    'default': [{'name': 'SMA50', 'kind': 'sma', 'window': 50}, {'name': 'SMA128', 'kind': 'sma', 'window': 128}],
+    '1d': [
+        {'name': 'SMA200', 'kind': 'sma', 'window': 200, 'color': '#ef5350'},
+        {'name': 'EMA21', 'kind': 'ema', 'window': 21},
+        {'name': 'EMA50', 'kind': 'ema', 'window': 50},
+        {'name': 'VOL_SMA20', 'kind': 'sma', 'window': 20, 'source': 'Volume', 'plot': True}
+    ]
+}
+
+
+class KernelTests(unittest.TestCase):
+    def setUp(self):
+        self.closes = synthetic_ohlcv(periods=600)['Close']
+
+    def test_sma_kernel_matches_rolling_mean_for_every_window(self):
+        closes = self.closes.copy()
+        closes.iloc[300] = np.nan
+        means = sma_kernel(closes.to_numpy(), (20, 50, 128))
+        for window, values in means.items():
+            expected = closes.rolling(window=window).mean().to_numpy()
+            np.testing.assert_array_equal(values, expected)
+
+    def test_right_aligned_panel_columns_match_single_series(self):
+        short = self.closes.to_numpy()[200:]
+        panel = np.full((600, 2), np.nan)
+        panel[:, 0] = self.closes.to_numpy()
+        panel[200:, 1] = short
+        np.testing.assert_array_equal(sma_kernel(panel, (50,))[50][200:, 1], sma_kernel(short, (50,))[50])
+
+    def test_ema_kernel_matches_pandas_ewm(self):
+        means = ema_kernel(self.closes.to_numpy(), (21, 50))
+        for window, values in means.items():
+            expected = self.closes.ewm(span=window, adjust=False, min_periods=window).mean().to_numpy()
+            np.testing.assert_allclose(values, expected, rtol=1e-12, equal_nan=True)
+
+
+class IndicatorRegistryTests(unittest.TestCase):
+    def setUp(self):
+        self.registry = IndicatorRegistry(DEFINITIONS)
+        self.data = synthetic_ohlcv(periods=400)
+
+    def test_timeframe_declarations_keep_the_signal_smas(self):
+        names = [spec.name for spec in self.registry.specs_for('1d')]
+        self.assertEqual(names, ['SMA200', 'EMA21', 'EMA50', 'VOL_SMA20', 'SMA50', 'SMA128'])
+        self.assertEqual([spec.name for spec in self.registry.specs_for('4h')], ['SMA50', 'SMA128'])
+        self.assertEqual(self.registry.sma_periods('4h'), (50, 128))
+        self.assertIsNone(self.registry.sma_periods('1d'))
+        with self.assertRaises(ValueError):
+            parse_indicator_specs([{'kind': 'wma', 'window': 10}])
+
+    def test_declared_indicators_are_added_after_the_longest_warm_up(self):
+        frame = self.registry.add_indicators('AAA', '1d', self.data)
+        self.assertEqual(len(frame), len(self.data) - 199)
+        expected = self.data['Volume'].rolling(20).mean().iloc[199:].to_numpy()
+        np.testing.assert_allclose(frame['VOL_SMA20'].to_numpy(), expected, rtol=1e-12)
+        self.assertIsNone(self.registry.add_indicators('BBB', '1d', self.data.iloc[:150]))
+
+    def test_results_are_reused_until_the_series_changes(self):
+        first = self.registry.add_indicators('AAA', '4h', self.data)
+        self.assertIs(self.registry.add_indicators('AAA', '4h', self.data.copy()), first)
+        self.assertEqual((self.registry.hits, self.registry.misses), (1, 1))
+
+        revised = self.data.copy()
+        revised.iloc[-1, revised.columns.get_loc('Close')] *= 1.01
+        self.assertIsNot(self.registry.add_indicators('AAA', '4h', revised), first)
+        self.assertEqual(self.registry.misses, 2)
+
+        self.registry.evict(['BBB'])
+        self.registry.add_indicators('AAA', '4h', revised)
+        self.assertEqual(self.registry.misses, 3)
+
+        # Delivered symbols give their frames back
+        self.registry.release('AAA')
+        self.registry.add_indicators('AAA', '4h', revised)
+        self.assertEqual(self.registry.misses, 4)
+
+    def test_full_pass_is_identical_to_the_incremental_engine(self):
+        full = self.registry.add_indicators('AAA', '4h', self.data)
+        incremental = IndicatorEngine().add_indicators('AAA', '4h', self.data)
+        for column, window in (('SMA50', 50), ('SMA128', 128)):
+            expected = self.data['Close'].rolling(window).mean().loc[full.index].to_numpy()
+            np.testing.assert_array_equal(full[column].to_numpy(), expected)
+            np.testing.assert_array_equal(full[column].loc[incremental.index].to_numpy(), incremental[column].to_numpy())
+
+    def test_chart_draws_every_plotted_indicator(self):
+        frame = self.registry.add_indicators('AAA', '1d', self.data)
+        chart_config = {'up_color': 'green', 'down_color': 'red', 'sma_50_color': 'blue', 'sma_128_color': 'orange'}
+        overlays = chart_overlays(frame, self.registry.specs_for('1d'), chart_config)
+        self.assertIn(('SMA200', '#ef5350', 0), overlays)
+        self.assertIn(('SMA50', 'blue', 0), overlays)
+        self.assertIn(('VOL_SMA20', overlays[3][1], 1), overlays)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            payload = build_chart_payload(frame, 'AAA', tmp, chart_config, interval='1d',
+                                          indicators=self.registry.specs_for('1d'))
+            self.assertEqual(list(payload['data'].columns)[5:], [column for column, _, _ in overlays])
+            path, success = render_chart_payload(payload)
+            self.assertTrue(success)
+            self.assertTrue(os.path.getsize(path) > 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
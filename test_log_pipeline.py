@@ -0,0 +1,96 @@
+import glob
+import logging
+import os
+import tempfile
+import threading
+import unittest
+from logging.handlers import QueueHandler
+
+from log_pipeline import SampledDebugFilter, setup_logging, stop_logging
+
+
+def record(level, message='message'):
+    return logging.LogRecord('test', level, __file__, 1, message, None, None)
+
+
+class SampledDebugFilterTests(unittest.TestCase):
+    def test_keeps_one_debug_record_in_every_n(self):
+        sampler = SampledDebugFilter(every=5)
+        kept = [sampler.filter(record(logging.DEBUG)) for _ in range(20)]
+
+        self.assertEqual(kept.count(True), 4)
+        self.assertTrue(kept[0])
+        self.assertEqual(sampler.dropped, 16)
+        self.assertTrue(all(sampler.filter(record(logging.INFO)) for _ in range(10)))
+
+
+class SetupLoggingTests(unittest.TestCase):
+    def setUp(self):
+        self.root = logging.getLogger()
+        self.saved = (self.root.level, list(self.root.handlers))
+        self.tmp = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.tmp.name, 'plotin.log')
+
+    def tearDown(self):
+        stop_logging()
+        level, handlers = self.saved
+        self.root.setLevel(level)
+        for handler in handlers:
+            self.root.addHandler(handler)
+        self.tmp.cleanup()
+
+    def read_log(self):
+        with open(self.log_file) as handle:
+            return handle.read()
+
+    def test_records_are_written_by_the_listener_thread(self):
+        written_by = []
+        listener = setup_logging({'file': self.log_file, 'console': False})
+        file_handler = listener.handlers[0]
+        emit = file_handler.emit
+        file_handler.emit = lambda rec: (written_by.append(threading.current_thread()), emit(rec))
+
+        self.assertEqual([type(handler) for handler in self.root.handlers], [QueueHandler])
+        logging.info("queued line")
+        logging.debug("dropped below INFO")
+        stop_logging()
+
+        self.assertIn("INFO - queued line", self.read_log())
+        self.assertNotIn("dropped below INFO", self.read_log())
+        self.assertEqual(len(written_by), 1)
+        self.assertIsNot(written_by[0], threading.current_thread())
+
+    def test_debug_level_is_sampled(self):
+        setup_logging({'file': self.log_file, 'console': False, 'level': 'DEBUG', 'debug_sample_every': 10})
+        for index in range(100):
+            logging.debug(f"symbol {index:03d} detail")
+        logging.info("run finished")
+        stop_logging()
+
+        lines = self.read_log().splitlines()
+        self.assertEqual(sum('DEBUG - symbol' in line for line in lines), 10)
+        self.assertIn("symbol 000 detail", lines[0])
+        self.assertIn("INFO - run finished", lines[-1])
+
+    def test_file_rotates_at_max_bytes(self):
+        setup_logging({'file': self.log_file, 'console': False, 'max_bytes': 2000, 'backup_count': 2})
+        for index in range(60):
+            logging.warning(f"warning {index:03d} " + 'x' * 40)
+        stop_logging()
+
+        self.assertEqual(len(glob.glob(self.log_file + '.*')), 2)
+        self.assertLessEqual(os.path.getsize(self.log_file), 2000)
+        self.assertIn("warning 059", self.read_log())
+
+    def test_sync_mode_replaces_previous_handlers(self):
+        setup_logging({'file': self.log_file, 'console': False})
+        self.root.addHandler(logging.StreamHandler())
+        self.assertIsNone(setup_logging({'file': self.log_file, 'console': False, 'queued': False}))
+
+        self.assertEqual([type(handler).__name__ for handler in self.root.handlers], ['RotatingFileHandler'])
+        logging.error("written directly")
+        self.assertIn("ERROR - written directly", self.read_log())
+
+
+if __name__ == '__main__':
+    unittest.main()
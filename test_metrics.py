@@ -0,0 +1,114 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from benchmark import FakeTelegramBot, StubDownloader, run_pipeline_benchmark, synthetic_symbols
+from metrics import METRICS, Histogram, MetricsRegistry, start_metrics_server
+
+
+class HistogramTests(unittest.TestCase):
+    def test_buckets_and_quantiles(self):
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.05, 0.5, 3.0):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(histogram.quantile(0.5), 0.1)
+        self.assertEqual(histogram.quantile(1.0), 3.0)
+        self.assertAlmostEqual(histogram.summary()['sum_seconds'], 3.6)
+
+
+class RegistryTests(unittest.TestCase):
+    def test_run_report_only_covers_the_run(self):
+        registry = MetricsRegistry()
+        registry.inc('chart_cache_hits_total', 3, interval='4h')
+        registry.observe('fetch_seconds', 0.2, interval='4h')
+        baseline = registry.begin_run()
+
+        registry.inc('chart_cache_hits_total', interval='4h')
+        registry.inc('chart_cache_misses_total', 3, interval='4h')
+        registry.observe('pipeline_stage_seconds', 0.5, stage='render')
+        registry.observe('chart_render_seconds', 0.4, symbol='AAA', interval='4h')
+        registry.record_symbol('AAA', 'fetch', 0.1)
+        report = registry.run_report(baseline, run=2)
+
+        self.assertEqual(report['run'], 2)
+        self.assertEqual(report['counters']['chart_cache_hits_total'], {'interval=4h': 1})
+        self.assertNotIn('fetch_seconds', report['histograms'])
+        self.assertEqual(report['stages']['render']['count'], 1)
+        self.assertEqual(report['cache_hit_rates']['charts'], 0.25)
+        self.assertIsNone(report['cache_hit_rates']['ohlcv'])
+        self.assertEqual(report['symbols'], {'AAA': {'chart_render': 0.4, 'fetch': 0.1}})
+        json.dumps(report)
+
+    def test_prometheus_exposition(self):
+        registry = MetricsRegistry()
+        registry.inc('alerts_total', 2, state='golden')
+        registry.observe('fetch_seconds', 0.02, interval='1d')
+        registry.set('fetch_concurrency_limit', 4, source='http')
+        text = registry.prometheus_text()
+
+        self.assertIn('# TYPE plotin_alerts_total counter\nplotin_alerts_total{state="golden"} 2', text)
+        self.assertIn('plotin_fetch_seconds_bucket{interval="1d",le="0.01"} 0', text)
+        self.assertIn('plotin_fetch_seconds_bucket{interval="1d",le="0.025"} 1', text)
+        self.assertIn('plotin_fetch_seconds_bucket{interval="1d",le="+Inf"} 1', text)
+        self.assertIn('plotin_fetch_seconds_count{interval="1d"} 1', text)
+        self.assertIn('# TYPE plotin_fetch_concurrency_limit gauge\nplotin_fetch_concurrency_limit{source="http"} 4', text)
+
+    def test_endpoint_serves_metrics(self):
+        registry = MetricsRegistry()
+        registry.inc('alerts_total', state='near')
+
+        async def fetch(path):
+            server = await start_metrics_server('127.0.0.1', 0, registry=registry)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+                await writer.drain()
+                response = await reader.read()
+                writer.close()
+                return response.decode()
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        response = asyncio.run(fetch('/metrics'))
+        self.assertTrue(response.startswith('HTTP/1.1 200 OK'))
+        self.assertIn('plotin_alerts_total{state="near"} 1', response)
+        self.assertTrue(asyncio.run(fetch('/other')).startswith('HTTP/1.1 404'))
+
+
+class RunReportTests(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def test_process_stocks_writes_a_run_report(self):
+        end = pd.Timestamp.now().normalize()
+        with tempfile.TemporaryDirectory() as tmp:
+            ok = run_pipeline_benchmark(synthetic_symbols(3), tmp, StubDownloader(epoch=end - pd.DateOffset(years=2)),
+                                        FakeTelegramBot(), overrides={'time_period': 365})
+            with open(os.path.join(tmp, 'run_report.json')) as handle:
+                report = json.load(handle)
+
+        self.assertTrue(ok)
+        self.assertEqual(set(report['stages']), {'fetch', 'analyze', 'render', 'deliver'})
+        self.assertEqual(report['watchlist'], 3)
+        self.assertEqual(set(report['symbols']), set(synthetic_symbols(3)))
+        self.assertIn('chart_render', report['symbols']['SYN0000'])
+        self.assertGreater(sum(report['counters']['fetch_bytes_total'].values()), 0)
+        self.assertGreater(sum(report['counters']['telegram_upload_bytes_total'].values()), 0)
+        self.assertEqual(report['cache_hit_rates']['indicators'], 0.0)
+        self.assertIn('pipeline_stage_seconds', METRICS.prometheus_text())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+import chart_generation
+from benchmark import FakeTelegramBot, StubDownloader, run_pipeline_benchmark, synthetic_symbols
+from pipeline import InFlightWindow, LoopStallMonitor, Stage, run_pipeline
+
+
+class RunPipelineTests(unittest.TestCase):
+    def test_items_flow_through_every_stage(self):
+        delivered = []
+
+        async def split(batch):
+            return list(batch)
+
+        async def double(value):
+            return [value * 2]
+
+        async def collect(value):
+            delivered.append(value)
+
+        stages = [Stage('split', split), Stage('double', double, concurrency=3), Stage('collect', collect)]
+        asyncio.run(run_pipeline([[1, 2], [3], [4, 5]], stages))
+
+        self.assertEqual(sorted(delivered), [2, 4, 6, 8, 10])
+        self.assertEqual([stage.processed for stage in stages], [3, 5, 5])
+
+    def test_slow_stage_applies_backpressure(self):
+        produced = []
+        in_queue = []
+
+        async def produce(value):
+            produced.append(value)
+            return [value]
+
+        async def slow_consume(value):
+            # Items produced but not yet consumed never exceed the queue capacity plus the one in hand
+            in_queue.append(len(produced) - value - 1)
+            await asyncio.sleep(0.001)
+
+        stages = [Stage('produce', produce), Stage('consume', slow_consume, queue_size=2)]
+        asyncio.run(run_pipeline(range(20), stages))
+
+        self.assertEqual(len(produced), 20)
+        self.assertLessEqual(max(in_queue), 3)
+
+    def test_failures_are_counted_and_do_not_stop_the_run(self):
+        delivered = []
+
+        async def flaky(value):
+            if value == 2:
+                raise ValueError("boom")
+            return [value]
+
+        async def collect(value):
+            delivered.append(value)
+
+        stages = [Stage('flaky', flaky, concurrency=2), Stage('collect', collect)]
+        asyncio.run(run_pipeline(range(5), stages))
+
+        self.assertEqual(sorted(delivered), [0, 1, 3, 4])
+        self.assertEqual(stages[0].failures, 1)
+        self.assertEqual(stages[0].report()['processed'], 5)
+
+    def test_window_bounds_symbols_between_fetch_and_delivery(self):
+        window = InFlightWindow(4)
+        delivered = []
+        samples = []
+
+        async def fetch(batch):
+            await window.acquire(len(batch))
+            return list(batch)
+
+        async def render(symbol):
+            samples.append(window.in_flight)
+            await asyncio.sleep(0.001)
+            if symbol == 'S5':
+                raise RuntimeError("render failed")
+            return [symbol]
+
+        async def deliver(symbol):
+            delivered.append(symbol)
+            window.release()
+
+        batches = ([f"S{i}", f"S{i + 1}"] for i in range(0, 40, 2))
+        stages = [Stage('fetch', fetch), Stage('render', render, concurrency=2, on_failure=lambda item: window.release()),
+                  Stage('deliver', deliver)]
+        asyncio.run(run_pipeline(batches, stages))
+
+        self.assertEqual(len(delivered), 39)
+        self.assertLessEqual(window.peak, 4)
+        self.assertLessEqual(max(samples), 4)
+        self.assertEqual(window.in_flight, 0)
+
+    def test_oversized_group_is_admitted_alone(self):
+        window = InFlightWindow(2)
+
+        async def run():
+            await window.acquire(5)
+            blocked = asyncio.ensure_future(window.acquire(1))
+            await asyncio.sleep(0)
+            self.assertFalse(blocked.done())
+            window.release(5)
+            await blocked
+
+        asyncio.run(run())
+        self.assertEqual(window.in_flight, 1)
+
+
+class LoopStallMonitorTests(unittest.TestCase):
+    def test_blocking_call_on_the_loop_is_a_stall(self):
+        async def run():
+            monitor = LoopStallMonitor(interval=0.005, threshold=0.05).start()
+            await asyncio.sleep(0.03)
+            time.sleep(0.15)
+            await asyncio.sleep(0.03)
+            return await monitor.stop()
+
+        report = asyncio.run(run())
+        self.assertEqual(report['stalls'], 1)
+        self.assertGreaterEqual(report['max_lag_seconds'], 0.1)
+        self.assertGreater(report['samples'], 2)
+
+
+class ProcessStocksTests(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def test_deliveries_progress_while_a_chart_renders(self):
+        first, second = synthetic_symbols(2)
+        events = []
+        sent = threading.Event()
+        render = chart_generation.generate_chart
+
+        class RecordingBot(FakeTelegramBot):
+            async def send_media_group(self, **kwargs):
+                # The upload takes longer than handing the next symbol to the renderer
+                messages = await super().send_media_group(**kwargs)
+                events.append('sent')
+                sent.set()
+                return messages
+
+        def slow_render(data, symbol, *args, **kwargs):
+            if symbol == second and 'render started' not in events:
+                # Hold the render until the first symbol's charts have reached Telegram
+                events.append('render started')
+                events.append('sent during render' if sent.wait(timeout=3.0) else 'render timed out')
+            return render(data, symbol, *args, **kwargs)
+
+        end = pd.Timestamp.now().normalize()
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(chart_generation, 'generate_chart', slow_render):
+            ok = run_pipeline_benchmark([first, second], tmp, StubDownloader(epoch=end - pd.DateOffset(years=1)),
+                                        RecordingBot(latency=0.2), overrides={'data': {'batch_size': 2}})
+
+        self.assertTrue(ok)
+        self.assertEqual(events[:3], ['render started', 'sent', 'sent during render'])
+        self.assertEqual(events.count('sent'), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+import main as plotin_main
+from benchmark import FakeTelegramBot, StubDownloader, _benchmark_config, _fake_telegram_manager, synthetic_symbols
+from scheduler import LoopJob
+
+
+class LoopJobTests(unittest.TestCase):
+    def test_trigger_during_a_run_is_skipped(self):
+        async def scenario():
+            release = asyncio.Event()
+            started = []
+
+            async def work():
+                started.append(threading.get_ident())
+                await release.wait()
+
+            job = LoopJob('test', work, asyncio.get_running_loop())
+            # Triggers arrive from the scheduler's thread
+            trigger = threading.Thread(target=job)
+            trigger.start()
+            trigger.join()
+            await asyncio.sleep(0.01)
+            self.assertTrue(job.running)
+
+            second = threading.Thread(target=job)
+            second.start()
+            second.join()
+            await asyncio.sleep(0.01)
+            release.set()
+            await job.wait()
+            self.assertIsNotNone(job.start())
+            await job.wait()
+            return job, started
+
+        job, started = asyncio.run(scenario())
+        self.assertEqual((job.runs, job.skipped, job.failures), (2, 1, 0))
+        self.assertEqual(started, [threading.get_ident()] * 2)
+
+    def test_failed_run_does_not_block_the_next(self):
+        async def scenario():
+            async def fail():
+                raise RuntimeError("boom")
+
+            job = LoopJob('test', fail, asyncio.get_running_loop())
+            job.start()
+            await job.wait()
+            job.start()
+            await job.wait()
+            return job
+
+        job = asyncio.run(scenario())
+        self.assertEqual((job.runs, job.failures, job.skipped), (2, 2, 0))
+
+
+class WarmWorkerTests(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def test_ticks_reuse_state_and_only_fetch_new_candles(self):
+        end = pd.Timestamp.now().normalize()
+        downloader = StubDownloader(epoch=end - pd.DateOffset(years=2))
+        bot = FakeTelegramBot()
+        with tempfile.TemporaryDirectory() as tmp:
+            config = _benchmark_config(synthetic_symbols(3), tmp, overrides={'time_period': 365})
+            with mock.patch('yfinance.download', downloader), \
+                    mock.patch.object(plotin_main, 'create_telegram_manager',
+                                      side_effect=lambda _config: _fake_telegram_manager(bot)) as create:
+                async def ticks():
+                    resources = plotin_main.RunResources(config, persistent=True)
+                    try:
+                        state = resources.signal_state
+                        await plotin_main.scheduled_task(config, scan_only=True, resources=resources)
+                        cold_rows, downloader.rows_served = downloader.rows_served, 0
+                        await plotin_main.scheduled_task(config, scan_only=True, resources=resources)
+                        self.assertIs(resources.signal_state, state)
+                        return cold_rows, downloader.rows_served, resources
+                    finally:
+                        resources.close()
+
+                cold_rows, warm_rows, resources = asyncio.run(ticks())
+
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(resources.runs, 2)
+        self.assertLess(warm_rows * 20, cold_rows)
+        # The second tick finds every series unchanged, so no indicators are recomputed
+        self.assertEqual(len(resources.indicator_engine.states), 6)
+        self.assertEqual((resources.indicator_registry.hits, resources.indicator_registry.misses), (6, 6))
+
+    def test_each_tick_reports_only_its_own_chart_and_upload_counts(self):
+        end = pd.Timestamp.now().normalize()
+        downloader = StubDownloader(epoch=end - pd.DateOffset(years=1))
+        with tempfile.TemporaryDirectory() as tmp:
+            config = _benchmark_config(synthetic_symbols(2), tmp)
+            with mock.patch('yfinance.download', downloader), \
+                    mock.patch.object(plotin_main, 'create_telegram_manager',
+                                      side_effect=lambda _config: _fake_telegram_manager(FakeTelegramBot())):
+                async def ticks():
+                    resources = plotin_main.RunResources(config, persistent=True)
+                    try:
+                        counts = []
+                        for _ in range(2):
+                            await plotin_main.scheduled_task(config, resources=resources)
+                            chart_cache, _ = resources.charts()
+                            counts.append(((chart_cache.hits, chart_cache.misses), dict(resources.telegram_manager.stats)))
+                        return counts
+                    finally:
+                        resources.close()
+
+                (first_charts, first_uploads), (second_charts, second_uploads) = asyncio.run(ticks())
+
+        # Two symbols, two timeframes: four charts per tick
+        self.assertEqual(first_charts, (0, 4))
+        self.assertEqual(second_charts, (4, 0))
+        self.assertEqual(first_uploads['charts_uploaded'], 4)
+        self.assertEqual((second_uploads['charts_uploaded'], second_uploads['charts_reused']), (0, 4))
+
+    def test_run_closes_its_own_resources_when_the_pipeline_fails(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            config = _benchmark_config(synthetic_symbols(2), tmp)
+            with mock.patch.object(plotin_main, 'run_pipeline', side_effect=RuntimeError('boom')), \
+                    mock.patch.object(plotin_main.RunResources, 'close', autospec=True) as close:
+                with self.assertRaises(RuntimeError):
+                    asyncio.run(plotin_main.process_stocks(config, scan_only=True))
+
+        self.assertEqual(close.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from signal_history import SignalHistory
+
+
+class SignalHistoryTests(unittest.TestCase):
+    def setUp(self):
+        self.history = SignalHistory(os.path.join(tempfile.mkdtemp(), 'signal_history.db'))
+        self.now = datetime.now(timezone.utc)
+
+    def tearDown(self):
+        self.history.close()
+
+    def _record(self, symbol, timeframe, state, days_ago, fresh=False, notified=False):
+        info = {'state': state, 'is_fresh_cross': fresh, 'spread_pct': 0.5, 'close': 100.0,
+                'timestamp': '2024-01-01T00:00:00+00:00'}
+        self.history.record(symbol, timeframe, info, notified, evaluated_at=self.now - timedelta(days=days_ago))
+
+    def test_rows_are_written_on_flush_and_queried_newest_first(self):
+        self._record('AAPL', '4h', 'near', days_ago=3)
+        self._record('AAPL', '4h', 'golden', days_ago=1, fresh=True, notified=True)
+        self.assertEqual(self.history.count(), 0)
+        self.assertEqual(self.history.flush(), 2)
+
+        rows = self.history.query(symbol='AAPL')
+        self.assertEqual([row['state'] for row in rows], ['golden', 'near'])
+        self.assertTrue(rows[0]['is_fresh_cross'] and rows[0]['notified'])
+        self.assertEqual(rows[0]['timestamp'], '2024-01-01T00:00:00+00:00')
+
+    def test_counts_by_range_and_group(self):
+        self._record('AAPL', '4h', 'golden', days_ago=40, fresh=True, notified=True)
+        self._record('AAPL', '4h', 'golden', days_ago=10, fresh=True, notified=True)
+        self._record('MSFT', '1d', 'golden', days_ago=5, fresh=True, notified=True)
+        self._record('MSFT', '1d', 'near', days_ago=2, notified=False)
+        self.history.flush()
+
+        last_month = self.now - timedelta(days=30)
+        self.assertEqual(self.history.count(start=last_month, fresh=True, notified=True), 2)
+        self.assertEqual(self.history.count(group_by=['symbol'], start=last_month),
+                         {('AAPL',): 1, ('MSFT',): 2})
+        self.assertEqual(self.history.count(group_by=['timeframe', 'state']),
+                         {('1d', 'golden'): 1, ('1d', 'near'): 1, ('4h', 'golden'): 2})
+        self.assertEqual(len(self.history.query(end=self.now - timedelta(days=7))), 2)
+
+    def test_prune_drops_rows_past_retention(self):
+        self._record('AAPL', '4h', 'golden', days_ago=400)
+        self._record('AAPL', '4h', 'golden', days_ago=1)
+        self.history.flush()
+
+        self.assertEqual(self.history.prune(365), 1)
+        self.assertEqual(self.history.count(), 1)
+        self.assertEqual(self.history.prune(0), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import json
+import os
+import tempfile
+import unittest
+
+from notifications import get_previous_state, open_signal_state, save_signal_state, update_state
+from signal_store import SignalStateStore
+
+
+class SignalStateStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.directory, 'signal_state.db')
+        self.json_path = os.path.join(self.directory, 'signal_state.json')
+
+    def test_commit_writes_only_changed_entries(self):
+        store = SignalStateStore(self.db_path)
+        update_state(store, 'AAPL', '4h', {'state': 'golden'})
+        update_state(store, 'MSFT', '1d', {'state': 'near'})
+        self.assertEqual(store.commit(), 2)
+        self.assertEqual(store.commit(), 0)
+        update_state(store, 'AAPL', '4h', {'state': 'neutral'})
+        self.assertEqual(store.commit(), 1)
+        store.close()
+
+        reopened = SignalStateStore(self.db_path)
+        self.assertEqual(get_previous_state(reopened, 'AAPL', '4h'), {'state': 'neutral'})
+        self.assertEqual(get_previous_state(reopened, 'MSFT', '1d'), {'state': 'near'})
+        self.assertIsNone(get_previous_state(reopened, 'MSFT', '4h'))
+        reopened.close()
+
+    def test_uncommitted_changes_are_not_persisted(self):
+        store = SignalStateStore(self.db_path)
+        update_state(store, 'AAPL', '4h', {'state': 'golden'})
+        store.close()
+
+        reopened = SignalStateStore(self.db_path)
+        self.assertIsNone(get_previous_state(reopened, 'AAPL', '4h'))
+        reopened.close()
+
+    def test_legacy_json_is_migrated_once(self):
+        legacy = {'AAPL': {'4h': {'state': 'golden', 'last_notified_at': '2024-01-01T00:00:00+00:00'}},
+                  'MSFT': {'1d': {'state': 'near'}, 'alignment': {'state': 'alignment'}}}
+        with open(self.json_path, 'w') as handle:
+            json.dump(legacy, handle)
+
+        store = open_signal_state('sqlite', self.db_path, legacy_path=self.json_path)
+        self.assertEqual(store.to_dict(), legacy)
+        self.assertFalse(os.path.exists(self.json_path))
+        self.assertTrue(os.path.exists(f"{self.json_path}.migrated"))
+        store.close()
+
+        # A stale JSON file does not overwrite a database that already holds state
+        with open(self.json_path, 'w') as handle:
+            json.dump({'TSLA': {'4h': {'state': 'golden'}}}, handle)
+        store = open_signal_state('sqlite', self.db_path, legacy_path=self.json_path)
+        self.assertEqual(store.to_dict(), legacy)
+        store.close()
+
+    def test_json_backend_save_replaces_file_atomically(self):
+        state = open_signal_state('json', self.json_path)
+        update_state(state, 'AAPL', '4h', {'state': 'golden'})
+        save_signal_state(state, self.json_path)
+
+        self.assertEqual(open_signal_state('json', self.json_path), {'AAPL': {'4h': {'state': 'golden'}}})
+        self.assertFalse(os.path.exists(f"{self.json_path}.tmp"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,14 @@
 import unittest
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta, timezone
 
-from technical_analysis import analyze_golden_cross_state
+from technical_analysis import (
+    add_indicators,
+    analyze_golden_cross_state,
+    scan_indicator_frames,
+    scan_stock_data
+)
 from notifications import should_send_notification
 
 
@@ -56,5 +62,33 @@ class SignalAnalysisTests(unittest.TestCase):
         self.assertTrue(should_send_notification(previous, current, cooldown_hours=12))
 
 
+class PanelScanTests(unittest.TestCase):
+    def _random_prices(self, seed, periods):
+        rng = np.random.default_rng(seed)
+        closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, periods)))
+        index = pd.date_range("2023-01-02", periods=periods, freq="D")
+        return pd.DataFrame({'Open': closes, 'High': closes, 'Low': closes,
+                             'Close': closes, 'Volume': 1.0}, index=index)
+    
+    def test_indicator_frame_scan_matches_per_symbol_analysis(self):
+        frames = {
+            'FRESH': _build_df([95, 105], [100, 100], [100, 106]),
+            'NEAR': _build_df([100, 101], [102, 102], [101, 102]),
+            'FLAT': _build_df([90, 89], [100, 100], [91, 88])
+        }
+        expected = {symbol: analyze_golden_cross_state(frame, 1.5) for symbol, frame in frames.items()}
+        self.assertEqual(scan_indicator_frames(frames, 1.5), expected)
+    
+    def test_close_panel_scan_matches_add_indicators_path(self):
+        stock_data = {f"S{i}": self._random_prices(i, 120 + 15 * i) for i in range(12)}
+        expected = {}
+        for symbol, frame in stock_data.items():
+            with_indicators = add_indicators(frame)
+            state = analyze_golden_cross_state(with_indicators, 2.0) if with_indicators is not None else None
+            if state:
+                expected[symbol] = state
+        self.assertEqual(scan_stock_data(stock_data, 2.0), expected)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from backtest import backtest_golden_cross
+from sweep import sweep_parameters
+
+
+def _random_walk(seed, periods):
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, periods)))
+    index = pd.date_range("2021-01-04 09:30", periods=periods, freq='4h', tz='America/New_York')
+    return pd.DataFrame({'Open': closes, 'High': closes, 'Low': closes, 'Close': closes, 'Volume': 1.0}, index=index)
+
+
+class SweepTests(unittest.TestCase):
+    def setUp(self):
+        self.stock_data = {f"S{i}": _random_walk(i, 600 + 50 * i) for i in range(5)}
+
+    def _check_against_backtest(self, results):
+        self.assertEqual(len(results), 2 * 2 * 2)
+        for row in results.itertuples():
+            alerts = backtest_golden_cross(self.stock_data, row.threshold, row.cooldown_hours,
+                                           windows=(row.fast, row.slow), horizons=(10,))
+            self.assertEqual(row.all_alerts, len(alerts))
+            self.assertEqual(row.fresh_alerts, int(alerts['is_fresh_cross'].sum()))
+            self.assertEqual(row.near_alerts, int((alerts['state'] == 'near').sum()))
+            returns = alerts['fwd_return_10'].dropna()
+            self.assertAlmostEqual(row.all_hit_rate, (returns > 0).mean())
+            self.assertAlmostEqual(row.all_mean_return, returns.mean())
+
+    def test_in_process_sweep_matches_individual_backtests(self):
+        results = sweep_parameters(self.stock_data, thresholds=[0.5, 1.5], cooldowns=[0, 12],
+                                   sma_pairs=[(50, 128), (20, 50)], horizon=10, workers=1)
+        self._check_against_backtest(results)
+
+    def test_pool_sweep_matches_in_process_sweep(self):
+        grid = dict(thresholds=[0.5, 1.5], cooldowns=[0, 12], sma_pairs=[(50, 128), (20, 50)], horizon=10)
+        pd.testing.assert_frame_equal(sweep_parameters(self.stock_data, workers=2, **grid),
+                                      sweep_parameters(self.stock_data, workers=1, **grid))
+
+
+if __name__ == '__main__':
+    unittest.main()
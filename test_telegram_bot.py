@@ -0,0 +1,203 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from datetime import timedelta
+
+from telegram.error import RetryAfter
+
+from telegram_bot import TelegramManager, TokenBucket
+
+
+class FakePhotoSize:
+    def __init__(self, file_id):
+        self.file_id = file_id
+
+
+class FakeMessage:
+    def __init__(self, file_id=None):
+        self.photo = (FakePhotoSize(f"{file_id}-small"), FakePhotoSize(file_id)) if file_id else ()
+
+
+class FakeBot:
+    """Local stand-in for telegram.Bot with configurable latency and 429 responses."""
+    def __init__(self, latency=0.0, rate_limited_calls=(), retry_after=0.05):
+        self.latency = latency
+        self.rate_limited_calls = set(rate_limited_calls)
+        self.retry_after = retry_after
+        self.calls = []
+        self.sent = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+    
+    async def _request(self, method, **kwargs):
+        call_number = len(self.calls)
+        self.calls.append((method, kwargs, time.monotonic()))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            latency = self.latency(kwargs) if callable(self.latency) else self.latency
+            await asyncio.sleep(latency)
+            if call_number in self.rate_limited_calls:
+                raise RetryAfter(timedelta(seconds=self.retry_after))
+            self.sent.append((method, kwargs))
+            return FakeMessage(f"file-{call_number}" if method == 'send_photo' else None)
+        finally:
+            self.in_flight -= 1
+    
+    async def send_message(self, **kwargs):
+        return await self._request('send_message', **kwargs)
+    
+    async def send_photo(self, **kwargs):
+        return await self._request('send_photo', **kwargs)
+    
+    async def send_media_group(self, **kwargs):
+        call_number = len(self.calls)
+        await self._request('send_media_group', **kwargs)
+        return [FakeMessage(f"file-{call_number}-{i}") for i in range(len(kwargs['media']))]
+
+
+def _write_chart(directory, name, content):
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as handle:
+        handle.write(content)
+    return path
+
+
+def _manager(bot, **settings):
+    delivery = {'global_rate_per_sec': 1000, 'chat_rate_per_sec': 1000, 'chat_burst': 1000}
+    delivery.update(settings)
+    return TelegramManager('TOKEN', 'chat', bot=bot, delivery_settings=delivery)
+
+
+class TokenBucketTests(unittest.TestCase):
+    def test_acquisitions_beyond_burst_are_spaced_by_rate(self):
+        async def run():
+            bucket = TokenBucket(rate=20, capacity=2)
+            start = time.monotonic()
+            for _ in range(6):
+                await bucket.acquire()
+            return time.monotonic() - start
+        
+        elapsed = asyncio.run(run())
+        self.assertGreaterEqual(elapsed, 0.19)
+
+
+class DeliveryQueueTests(unittest.TestCase):
+    def test_same_key_keeps_order_while_keys_run_concurrently(self):
+        # Earlier messages are slower, so only the queue keeps them in order
+        bot = FakeBot(latency=lambda kwargs: 0.05 if kwargs['text'].endswith('0') else 0.01)
+        manager = _manager(bot, max_concurrency=4)
+        
+        async def run():
+            for symbol in ('AAA', 'BBB', 'CCC'):
+                for i in range(3):
+                    manager.enqueue(symbol, manager.send_message, f"{symbol}-{i}")
+            return await manager.flush()
+        
+        self.assertEqual(asyncio.run(run()), 0)
+        for symbol in ('AAA', 'BBB', 'CCC'):
+            texts = [kwargs['text'] for _, kwargs in bot.sent if kwargs['text'].startswith(symbol)]
+            self.assertEqual(texts, [f"{symbol}-{i}" for i in range(3)])
+        self.assertGreater(bot.max_in_flight, 1)
+        self.assertLessEqual(bot.max_in_flight, 4)
+    
+    def test_retry_after_is_honoured(self):
+        bot = FakeBot(rate_limited_calls={0}, retry_after=0.2)
+        manager = _manager(bot)
+        
+        async def run():
+            manager.enqueue('AAA', manager.send_message, 'hello')
+            return await manager.flush()
+        
+        self.assertEqual(asyncio.run(run()), 0)
+        self.assertEqual(len(bot.calls), 2)
+        self.assertGreaterEqual(bot.calls[1][2] - bot.calls[0][2], 0.2)
+        self.assertEqual(bot.sent[0][1]['text'], 'hello')
+    
+    def test_gives_up_after_max_retries(self):
+        bot = FakeBot(rate_limited_calls={0, 1, 2}, retry_after=0.01)
+        manager = _manager(bot, max_retries=2)
+        
+        async def run():
+            manager.enqueue('AAA', manager.send_message, 'hello')
+            return await manager.flush()
+        
+        self.assertEqual(asyncio.run(run()), 1)
+        self.assertEqual(len(bot.calls), 3)
+    
+    def test_chart_upload_records_file_id_and_resends_by_reference(self):
+        bot = FakeBot()
+        manager = _manager(bot)
+        with tempfile.TemporaryDirectory() as tmp:
+            chart = _write_chart(tmp, 'AAA_1d_chart.png', b'png-bytes')
+            
+            async def run():
+                await manager.send_stock_analysis('AAA', chart)
+                await manager.send_stock_analysis('AAA', chart)
+            
+            asyncio.run(run())
+        self.assertEqual(bot.sent[0][1]['photo'], b'png-bytes')
+        self.assertEqual(bot.sent[1][1]['photo'], 'file-0')
+        self.assertEqual(manager.stats['bytes_uploaded'], len(b'png-bytes'))
+        self.assertEqual(manager.stats['bytes_avoided'], len(b'png-bytes'))
+
+
+class MediaGroupTests(unittest.TestCase):
+    def test_symbol_charts_go_out_as_one_album_and_are_reused(self):
+        bot = FakeBot()
+        manager = _manager(bot)
+        with tempfile.TemporaryDirectory() as tmp:
+            daily = _write_chart(tmp, 'AAA_1d_chart.png', b'daily')
+            hourly = _write_chart(tmp, 'AAA_4h_chart.png', b'hourly')
+            charts = [(daily, 'Daily'), (hourly, '4-hour')]
+            
+            async def run():
+                first = await manager.send_stock_analyses('AAA', charts)
+                # The 4h chart changes, the daily one does not
+                _write_chart(tmp, 'AAA_4h_chart.png', b'hourly-v2')
+                second = await manager.send_stock_analyses('AAA', charts)
+                return first, second
+            
+            self.assertEqual(asyncio.run(run()), (True, True))
+        
+        self.assertEqual([method for method, _ in bot.sent], ['send_media_group', 'send_media_group'])
+        first_media = bot.sent[0][1]['media']
+        second_media = bot.sent[1][1]['media']
+        self.assertEqual(first_media[0].caption, 'Stock Analysis: AAA\n\nDaily')
+        self.assertEqual(second_media[0].media, 'file-0-0')
+        self.assertNotIsInstance(second_media[1].media, str)
+        self.assertEqual(manager.stats['charts_uploaded'], 3)
+        self.assertEqual(manager.stats['charts_reused'], 1)
+        self.assertEqual(manager.stats['bytes_avoided'], len(b'daily'))
+    
+    def test_more_than_ten_charts_are_split_into_albums(self):
+        bot = FakeBot()
+        manager = _manager(bot)
+        with tempfile.TemporaryDirectory() as tmp:
+            charts = [(_write_chart(tmp, f"S{i}.png", f"chart-{i}".encode()), None) for i in range(11)]
+            self.assertTrue(asyncio.run(manager.send_charts(charts)))
+        self.assertEqual([method for method, _ in bot.sent], ['send_media_group', 'send_photo'])
+        self.assertEqual(len(bot.sent[0][1]['media']), 10)
+    
+    def test_file_ids_persist_between_managers(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            chart = _write_chart(tmp, 'AAA_1d_chart.png', b'png-bytes')
+            store = os.path.join(tmp, 'telegram_file_ids.json')
+            
+            first = _manager(FakeBot())
+            first.load_file_ids(store)
+            async def upload():
+                first.enqueue('AAA', first.send_chart, chart)
+                await first.flush()
+            asyncio.run(upload())
+            
+            bot = FakeBot()
+            second = _manager(bot)
+            second.load_file_ids(store)
+            asyncio.run(second.send_chart(chart))
+        self.assertEqual(bot.sent[0][1]['photo'], 'file-0')
+
+if __name__ == '__main__':
+    unittest.main()